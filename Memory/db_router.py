@@ -0,0 +1,80 @@
+"""
+Primary/replica database routing.
+
+Reads go to a random alias from REPLICA_DATABASES and writes to ``default``.
+Once a request writes, or opens a transaction, its remaining reads stay on
+the primary; PrimaryPinMiddleware then sets a short-lived cookie so the same
+client keeps reading from the primary for REPLICA_PIN_SECONDS after its last
+write, long enough for the replicas to catch up with what it wrote.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+PRIMARY = 'default'
+PIN_COOKIE = 'db_pin_primary'
+
+# A context variable rather than a thread local, so async views (which hop
+# between the event loop and sync_to_async threads) keep the same pin.
+_pinned = ContextVar('db_pinned_to_primary', default=False)
+# Whether this request wrote, as opposed to arriving already pinned
+_wrote = ContextVar('db_wrote', default=False)
+
+
+def pin_to_primary():
+    _pinned.set(True)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        if not replicas or _pinned.get() or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Everything this context reads from now on must see the write
+        pin_to_primary()
+        _wrote.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data, so rows from any alias may be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication, not migrations
+        return db == PRIMARY
+
+
+@sync_and_async_middleware
+def PrimaryPinMiddleware(get_response):
+    def start(request):
+        return _pinned.set(PIN_COOKIE in request.COOKIES), _wrote.set(False)
+
+    def finish(request, response, tokens):
+        wrote = _wrote.get()
+        _pinned.reset(tokens[0])
+        _wrote.reset(tokens[1])
+        # Every write restarts the pin, so a client that keeps writing keeps it
+        if wrote and settings.REPLICA_DATABASES:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            tokens = start(request)
+            return finish(request, await get_response(request), tokens)
+    else:
+        def middleware(request):
+            tokens = start(request)
+            return finish(request, get_response(request), tokens)
+    return middleware
@@ -0,0 +1,238 @@
+"""
+Per-request performance instrumentation.
+
+InstrumentationMiddleware times every request and, per route, counts the
+queries it ran, the time spent in the database and in serializer ``.data``,
+and the bytes it returned. Each response carries a ``Server-Timing`` header
+with that request's numbers, and the aggregates are served in Prometheus text
+format by metrics_view.
+
+Aggregates live in process memory, so each worker reports its own totals;
+scrape every worker (or run one per container) to see the whole service.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework import serializers
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializer_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+
+# A context variable so queries run from sync_to_async threads are still
+# charged to the async request that awaited them.
+_current = ContextVar('request_stats', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - started
+        stats.queries += 1
+
+
+def _install_wrapper(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _timed_data(prop):
+    fget = prop.fget
+
+    def data(self):
+        stats = _current.get()
+        if stats is None:
+            return fget(self)
+        # ListSerializer/Serializer.data call BaseSerializer.data through
+        # super(); only the outermost call is timed.
+        stats.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            stats.serializer_depth -= 1
+            if not stats.serializer_depth:
+                stats.serializer_time += time.perf_counter() - started
+
+    data._instrumented = True
+    return property(data)
+
+
+def install():
+    """Hook query and serializer timing in. Safe to call more than once."""
+    connection_created.connect(_install_wrapper, dispatch_uid='instrumentation')
+    # Connections opened before the hook was registered (this thread's only)
+    for connection in connections.all(initialized_only=True):
+        _install_wrapper(connection)
+    for cls in (serializers.BaseSerializer, serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.__dict__['data'].fget, '_instrumented', False):
+            cls.data = _timed_data(cls.__dict__['data'])
+
+
+class Series:
+    __slots__ = ('buckets', 'count', 'duration', 'queries', 'db_time', 'serializer_time', 'response_bytes', 'statuses')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.response_bytes = 0
+        self.statuses = {}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def reset(self):
+        with self.lock:
+            self.series = {}
+
+    def observe(self, route, method, status, duration, stats, response_bytes):
+        bucket = bisect_left(LATENCY_BUCKETS, duration)
+        with self.lock:
+            series = self.series.get((route, method))
+            if series is None:
+                series = self.series[(route, method)] = Series()
+            series.buckets[bucket] += 1
+            series.count += 1
+            series.duration += duration
+            series.queries += stats.queries
+            series.db_time += stats.db_time
+            series.serializer_time += stats.serializer_time
+            series.response_bytes += response_bytes
+            series.statuses[status] = series.statuses.get(status, 0) + 1
+
+    def render(self):
+        """The aggregates in the Prometheus text exposition format."""
+        with self.lock:
+            snapshot = sorted(
+                (key, series.buckets[:], series.count, series.duration, series.queries, series.db_time,
+                 series.serializer_time, series.response_bytes, sorted(series.statuses.items()))
+                for key, series in self.series.items()
+            )
+
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by route.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (route, method), buckets, count, duration, *_ in snapshot:
+            labels = f'route="{route}",method="{method}"'
+            cumulative = 0
+            for bound, observed in zip(LATENCY_BUCKETS, buckets):
+                cumulative += observed
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {duration}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {count}')
+
+        counters = (
+            ('http_responses_total', 'Responses by route and status code.', None),
+            ('http_db_queries_total', 'Database queries run by route.', 4),
+            ('http_db_duration_seconds_total', 'Time spent in the database by route.', 5),
+            ('http_serializer_duration_seconds_total', 'Time spent serializing by route.', 6),
+            ('http_response_bytes_total', 'Response body bytes by route (streams only when sized).', 7),
+        )
+        for name, help_text, index in counters:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for row in snapshot:
+                route, method = row[0]
+                labels = f'route="{route}",method="{method}"'
+                if index is None:
+                    for status, total in row[8]:
+                        lines.append(f'{name}{{{labels},status="{status}"}} {total}')
+                else:
+                    lines.append(f'{name}{{{labels}}} {row[index]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def route_name(request):
+    """A bounded label for the route: the view class or function name."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    view = getattr(match.func, 'view_class', match.func)
+    return getattr(view, '__name__', match.view_name or 'unknown')
+
+
+@sync_and_async_middleware
+def InstrumentationMiddleware(get_response):
+    install()
+
+    def start():
+        return _current.set(RequestStats()), time.perf_counter()
+
+    def finish(request, response, token, started):
+        duration = time.perf_counter() - started
+        stats = _current.get()
+        _current.reset(token)
+
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        response['Server-Timing'] = (
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+            f'ser;dur={stats.serializer_time * 1000:.1f}, '
+            f'total;dur={duration * 1000:.1f}'
+        )
+        registry.observe(route_name(request), request.method, response.status_code, duration, stats, size)
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token, started = start()
+            return finish(request, await get_response(request), token, started)
+    else:
+        def middleware(request):
+            token, started = start()
+            return finish(request, get_response(request), token, started)
+    return middleware
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Open to anyone sending ``Authorization: Bearer
+    <METRICS_TOKEN>`` when a token is set, and to METRICS_ALLOWED_IPS unless
+    the app sits behind a reverse proxy, where REMOTE_ADDR is always the proxy.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    authorized = bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+    behind_proxy = settings.BEHIND_PROXY or bool(settings.MEDIA_SENDFILE_HEADER)
+    if not authorized and (behind_proxy or request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
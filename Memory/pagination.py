@@ -0,0 +1,97 @@
+import base64
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination over ``ordering``, which must end in a unique field.
+
+    The cursor carries the ordering values of the last row seen, so every page
+    is a range scan on a matching index instead of an OFFSET that grows with
+    depth. Subclasses only set ``ordering`` and the page size limits.
+    """
+    ordering = ('-id',)
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 100
+    max_page_size = 500
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([obj async for obj in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        # Fetch one extra row to know whether there is a next page.
+        return queryset[:self.page_size + 1]
+
+    def after(self, position):
+        """Rows past ``position``: equal on a prefix of the ordering, then beyond it."""
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            equal = {field.attname: value for field, value in zip(self.fields[:index], position)}
+            condition |= Q(**equal, **{f'{self.fields[index].attname}__{lookup}': position[index]})
+        return condition
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            decoded = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            values = decoded.split('|', len(self.fields) - 1)
+            if len(values) != len(self.fields):
+                raise ValueError(decoded)
+            position = [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (TypeError, ValueError, UnicodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, instance):
+        raw = '|'.join(field.value_to_string(instance) for field in self.fields)
+        encoded = base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
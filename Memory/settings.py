@@ -53,12 +53,16 @@ INSTALLED_APPS = [
     'account',
     'album',
     'media',
+    'jobs',
+    'search',
 ]
 
 MIDDLEWARE = [
+    'Memory.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'Memory.db_router.PrimaryPinMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -106,6 +110,56 @@ DATABASES = {
     }
 }
 
+# Read replicas, routed by Memory.db_router. Locally, stand-in replicas can be
+# SQLite copies of the primary, refreshed with e.g.
+#   sqlite3 db.sqlite3 ".backup replica1.sqlite3"
+# and enabled with DATABASE_REPLICAS=replica1.sqlite3,replica2.sqlite3
+REPLICA_DATABASES = []
+for index, name in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / name.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['Memory.db_router.PrimaryReplicaRouter']
+# How long a client that just wrote keeps reading from the primary
+REPLICA_PIN_SECONDS = 5
+
+# Who may scrape /metrics: these client addresses, or any client presenting
+# METRICS_TOKEN as a bearer token. Behind a reverse proxy every request comes
+# from the proxy's address, so there (BEHIND_PROXY, implied by
+# MEDIA_SENDFILE_HEADER) the addresses are ignored and only the token is accepted.
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+BEHIND_PROXY = os.environ.get('BEHIND_PROXY', '').lower() in ('1', 'true', 'yes')
+
+# Caches
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Media listings, sharelinks and authenticated users are cached here. The
+# backend must be shared by every worker so invalidations reach all of them:
+# REDIS_URL selects Redis, shared across hosts; without it the cache is kept in
+# files under CACHE_DIR, shared by the worker processes of one host.
+REDIS_URL = os.environ.get('REDIS_URL')
+CACHE_DIR = os.environ.get('CACHE_DIR', BASE_DIR / 'cache')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -125,6 +179,12 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Admission control for password hashing (login and registration): at most
+# PASSWORD_HASH_CONCURRENCY hashes run at once per process, and a request that
+# waits longer than PASSWORD_HASH_WAIT seconds for a slot gets a 503.
+PASSWORD_HASH_CONCURRENCY = max(1, (os.cpu_count() or 2) // 2)
+PASSWORD_HASH_WAIT = 2
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
@@ -147,6 +207,35 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_ROOT = os.path.join(BASE_DIR,'media')
 MEDIA_URL = '/media/'
 
+# Let the front proxy send media bytes: None, 'X-Accel-Redirect' (nginx) or 'X-Sendfile' (Apache/lighttpd).
+# With X-Accel-Redirect the proxy must map MEDIA_ACCEL_REDIRECT_PREFIX to MEDIA_ROOT as an internal location.
+MEDIA_SENDFILE_HEADER = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Partial files for resumable sharelink uploads; kept outside MEDIA_ROOT so they are never served
+CHUNKED_UPLOAD_DIR = os.path.join(BASE_DIR, 'chunked_uploads')
+
+# Finished jobs are deleted by the recurring jobs.prune job once they are
+# JOB_RETENTION seconds old; it runs every JOB_PRUNE_INTERVAL seconds
+JOB_RETENTION = 7 * 24 * 3600
+JOB_PRUNE_INTERVAL = 3600
+
+# Seconds an upload session may go without a chunk before the recurring
+# media.expire_uploads job deletes it and its part file, and between runs
+UPLOAD_SESSION_TTL = 24 * 3600
+UPLOAD_EXPIRY_INTERVAL = 3600
+
+# Bytes each user may store across their albums, unless their storage_quota says otherwise
+STORAGE_QUOTA_BYTES = 5 * 1024 ** 3
+
+# Deleted albums are purged ALBUM_PURGE_BATCH_SIZE media at a time, at most
+# ALBUM_PURGE_BATCHES batches per album.purge job before it queues the next
+ALBUM_PURGE_BATCH_SIZE = 200
+ALBUM_PURGE_BATCHES = 10
+
+# Processes rendering thumbnails and other image derivatives; 0 renders inline
+DERIVATIVE_WORKERS = 2
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -163,6 +252,14 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Refresh token blacklist filter (account.blacklist): how stale it may get
+# before picking up tokens blacklisted by other processes, and how often it
+# is rebuilt to drop expired tokens
+TOKEN_BLACKLIST_SYNC_INTERVAL = 1
+TOKEN_BLACKLIST_REBUILD_INTERVAL = 300
+# Seconds between runs of the recurring account.prune_tokens job
+TOKEN_PRUNE_INTERVAL = 3600
+
 # Additional CORS settings that might help
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_METHODS = [
@@ -0,0 +1,18 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    Test case mixin for query budgets: fail when a call runs more queries
+    than allowed, listing the SQL it ran.
+    """
+
+    def assertMaxQueries(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            response = func(*args, **kwargs)
+        self.assertLessEqual(
+            len(ctx.captured_queries), budget,
+            '\n'.join(query['sql'] for query in ctx.captured_queries),
+        )
+        return response
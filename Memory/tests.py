@@ -0,0 +1,138 @@
+import contextvars
+import io
+import tempfile
+
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from account.models import CustomUser
+from album.models import Album
+from Memory.db_router import PIN_COOKIE, PrimaryReplicaRouter
+from Memory.instrumentation import registry
+
+# Create your tests here.
+
+REPLICAS = ['replica1', 'replica2']
+
+
+@override_settings(REPLICA_DATABASES=REPLICAS)
+class PrimaryReplicaRouterTest(SimpleTestCase):
+    databases = {'default'}
+
+    def route(self, steps):
+        # A fresh context stands in for a new request with no pin yet
+        return contextvars.Context().run(steps, PrimaryReplicaRouter())
+
+    def test_reads_go_to_replicas_until_a_write(self):
+        def steps(router):
+            before = router.db_for_read(Album)
+            router.db_for_write(Album)
+            return before, router.db_for_read(Album)
+
+        before, after = self.route(steps)
+        self.assertIn(before, REPLICAS)
+        self.assertEqual(after, 'default')
+        # The pin does not leak into other requests
+        self.assertIn(self.route(lambda router: router.db_for_read(Album)), REPLICAS)
+
+    def test_transactions_read_from_primary(self):
+        def steps(router):
+            with transaction.atomic():
+                return router.db_for_read(Album)
+
+        self.assertEqual(self.route(steps), 'default')
+
+    def test_only_primary_is_migrated(self):
+        router = PrimaryReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'album'))
+        self.assertFalse(router.allow_migrate('replica1', 'album'))
+
+
+# Every read resolves to the one test database, but the pin cookie logic runs as configured
+@override_settings(REPLICA_DATABASES=['default'])
+class PrimaryPinMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+
+    def setUp(self):
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_write_pins_client_to_primary(self):
+        response = self.client.get('/albums/')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), 'white').save(buffer, format='PNG')
+        cover = SimpleUploadedFile('cover.png', buffer.getvalue(), content_type='image/png')
+        with self.settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())):
+            response = self.client.post('/albums/create/', {'title': 'New', 'cover_image': cover}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+
+        # Reads while pinned leave the cookie alone; another write renews it
+        response = self.client.get('/albums/')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        cover = SimpleUploadedFile('cover.png', buffer.getvalue(), content_type='image/png')
+        with self.settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())):
+            response = self.client.post('/albums/create/', {'title': 'Newer', 'cover_image': cover}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+
+
+class InstrumentationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        Album.objects.create(owner=cls.user, title='Trip', cover_image='cover.png')
+
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_server_timing_header(self):
+        response = self.client.get('/albums/')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries", ser;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertNotIn('desc="0 queries"', timing)
+
+    def test_metrics_aggregate_per_route(self):
+        self.client.get('/albums/')
+        self.client.get('/albums/')
+        self.client.get('/albums/0/')
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_request_duration_seconds_count{route="AlbumListView",method="GET"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{route="AlbumListView",method="GET",le="+Inf"} 2', body)
+        self.assertIn('http_responses_total{route="AlbumDetailView",method="GET",status="404"} 1', body)
+        self.assertRegex(body, r'http_db_queries_total\{route="AlbumListView",method="GET"\} [1-9]')
+        self.assertRegex(body, r'http_response_bytes_total\{route="AlbumListView",method="GET"\} [1-9]')
+
+    @override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN='scrape-secret')
+    def test_metrics_access(self):
+        client = APIClient()
+        self.assertEqual(client.get('/metrics').status_code, 403)
+        client.credentials(HTTP_AUTHORIZATION='Bearer scrape-secret')
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'], METRICS_TOKEN='scrape-secret')
+    def test_metrics_behind_proxy_need_token(self):
+        client = APIClient(REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(client.get('/metrics').status_code, 200)
+        for proxied in ({'BEHIND_PROXY': True}, {'MEDIA_SENDFILE_HEADER': 'X-Accel-Redirect'}):
+            with self.settings(**proxied):
+                self.assertEqual(client.get('/metrics').status_code, 403)
+                response = client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+                self.assertEqual(response.status_code, 200)
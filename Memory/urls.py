@@ -19,13 +19,16 @@ from django.urls import path, include
 from rest_framework.authtoken.views import obtain_auth_token
 from django.conf import settings
 from django.conf.urls.static import static
+from Memory.instrumentation import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('user/', include('account.urls')),
     path('', include('album.urls')),
     path('', include('media.urls')),
+    path('', include('search.urls')),
     path('api-token-auth/', obtain_auth_token),
+    path('metrics', metrics_view),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,39 @@
+from django.http import Http404, JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+from account.authentication import authenticate_async
+
+
+class AsyncAPIView(View):
+    """
+    Base for native async endpoints served alongside the DRF views.
+
+    DRF's APIView dispatches synchronously, so under ASGI every request to it
+    holds a thread. Subclasses define ``async def`` handlers and get a DRF
+    Request (parsed data, query_params), the JWT user resolved without
+    leaving the event loop when cached, and DRF style JSON errors. Methods not
+    in ``public_methods`` require an authenticated user.
+    """
+    public_methods = ()
+    parser_classes = [JSONParser, FormParser, MultiPartParser]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token authenticated like the DRF views, so CSRF does not apply
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, parsers=[parser() for parser in self.parser_classes], authenticators=())
+        self.request = request
+        try:
+            request.user = await authenticate_async(request._request)
+            if request.method not in self.public_methods and not request.user.is_authenticated:
+                return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return JsonResponse({'detail': exc.detail}, status=exc.status_code)
+        except Http404:
+            return JsonResponse({'detail': 'Not found.'}, status=404)
@@ -0,0 +1,98 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from account.models import CustomUser
+
+USER_CACHE_TTL = 60  # seconds; well under the access token lifetime
+# Kept out of the cache: the password hash (only its digest is cached, for the
+# revoked-token check) and the storage counters, which change on every upload.
+# They stay deferred on the cached user and load from the database if read.
+UNCACHED_FIELDS = ('password', 'storage_used', 'storage_reserved')
+USER_FIELDS = tuple(
+    field.attname for field in CustomUser._meta.concrete_fields if field.attname not in UNCACHED_FIELDS
+)
+
+
+def _cache_key(user_id):
+    # Per user rather than per (user, iat), so that one delete on save drops
+    # the entry every token of that user reads
+    return f'jwt-user:{user_id}'
+
+
+def invalidate_user(user_id):
+    """
+    Drop the cached row of a user. CACHES is shared by every worker, so this
+    reaches all of them. Saving or deleting a user does this through a signal;
+    bulk updates of ``is_active`` or ``password`` that bypass save() must call
+    it themselves.
+    """
+    cache.delete(_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps user rows in the shared cache for a short
+    while, so repeat requests do not query the user table. The active and
+    revoked-token checks still run on every request, against the cached row.
+    """
+
+    @staticmethod
+    def cache_key(validated_token):
+        return _cache_key(validated_token.get(api_settings.USER_ID_CLAIM))
+
+    def check_user(self, user, validated_token, password_digest):
+        # The checks JWTAuthentication.get_user() makes after its lookup
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_digest:
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
+
+    def cached_user(self, cached, validated_token):
+        if cached is None:
+            return None
+        values, password_digest = cached
+        # A fresh instance per request; cached rows are never shared
+        user = CustomUser.from_db(router.db_for_read(CustomUser), USER_FIELDS, values)
+        return self.check_user(user, validated_token, password_digest)
+
+    def get_user(self, validated_token):
+        user = self.cached_user(cache.get(self.cache_key(validated_token)), validated_token)
+        if user is not None:
+            return user
+
+        # Not cached: the parent looks the user up and runs the same checks
+        user = super().get_user(validated_token)
+        values = tuple(getattr(user, attname) for attname in USER_FIELDS)
+        cache.set(self.cache_key(validated_token), (values, get_md5_hash_password(user.password)), USER_CACHE_TTL)
+        return user
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for async views. Only a cache miss leaves the event
+        loop, to look the user up through the ORM.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user = self.cached_user(await cache.aget(self.cache_key(validated_token)), validated_token)
+        if user is None:
+            user = await sync_to_async(self.get_user)(validated_token)
+        return user, validated_token
+
+
+async def authenticate_async(request):
+    """The JWT user of a plain Django request, or AnonymousUser without a token."""
+    result = await CachedJWTAuthentication().aauthenticate(request)
+    return result[0] if result is not None else AnonymousUser()
@@ -0,0 +1,125 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings; membership may be a false positive, never a false negative."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1024)
+        self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class BlacklistFilter:
+    """
+    In-process Bloom filter of blacklisted refresh token ids (jti).
+
+    Built from the unexpired part of the blacklist, then topped up with rows
+    blacklisted since the last seen id at most every
+    TOKEN_BLACKLIST_SYNC_INTERVAL seconds, and rebuilt (dropping expired
+    tokens and resizing) every TOKEN_BLACKLIST_REBUILD_INTERVAL seconds.
+    Tokens blacklisted by this process are added straight away, so only a
+    token rotated by another process can be missed, and only until the next
+    sync.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.high_water = 0
+        self.built_at = self.synced_at = 0.0
+
+    def reset(self):
+        with self.lock:
+            self.bloom = None
+
+    def add(self, jti):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def might_contain(self, jti):
+        now = time.monotonic()
+        with self.lock:
+            if self.bloom is None or now - self.built_at >= settings.TOKEN_BLACKLIST_REBUILD_INTERVAL:
+                self._rebuild(now)
+            elif now - self.synced_at >= settings.TOKEN_BLACKLIST_SYNC_INTERVAL:
+                self._sync(now)
+            return jti in self.bloom
+
+    def _rebuild(self, now):
+        live = BlacklistedToken.objects.filter(token__expires_at__gt=aware_utcnow())
+        # Room to grow until the next rebuild before the false positive rate climbs
+        bloom = BloomFilter(live.count() * 2)
+        high_water = 0
+        for pk, jti in live.values_list('id', 'token__jti').iterator(chunk_size=5000):
+            bloom.add(jti)
+            high_water = max(high_water, pk)
+        self.bloom, self.high_water = bloom, high_water
+        self.built_at = self.synced_at = now
+
+    def _sync(self, now):
+        for pk, jti in BlacklistedToken.objects.filter(id__gt=self.high_water).values_list('id', 'token__jti'):
+            self.bloom.add(jti)
+            self.high_water = max(self.high_water, pk)
+        self.synced_at = now
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class FilteredRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        # A negative from the filter is definitive, so most refreshes skip the query
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+
+def prune_expired_tokens(chunk_size=1000, pause=0.0):
+    """
+    Delete expired outstanding tokens and their blacklist entries, chunk_size
+    at a time, each chunk in its own short transaction. Returns how many
+    outstanding tokens were deleted.
+    """
+    cutoff = aware_utcnow()
+    deleted = 0
+    while True:
+        # The oldest ids expire first, so the scan in id order finds them at the front
+        pks = list(
+            OutstandingToken.objects.filter(expires_at__lte=cutoff)
+            .order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=pks).delete()
+            OutstandingToken.objects.filter(id__in=pks).delete()
+        deleted += len(pks)
+        if pause:
+            # Let other writers in between chunks
+            time.sleep(pause)
@@ -0,0 +1,43 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+
+_semaphore = None
+_semaphore_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """Every password hashing slot stayed taken for PASSWORD_HASH_WAIT seconds."""
+
+
+def _get_semaphore():
+    global _semaphore
+    with _semaphore_lock:
+        if _semaphore is None:
+            _semaphore = threading.BoundedSemaphore(settings.PASSWORD_HASH_CONCURRENCY)
+        return _semaphore
+
+
+@contextmanager
+def hashing_slot():
+    """
+    Admission control for password hashing. Holding a slot bounds how many
+    threads in this process burn CPU on PBKDF2 at once, so a login burst
+    queues briefly and then sheds load instead of starving other requests.
+    """
+    semaphore = _get_semaphore()
+    if not semaphore.acquire(timeout=settings.PASSWORD_HASH_WAIT):
+        raise HashingBusy()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def init_hashing_worker(settings_module):
+    """ProcessPoolExecutor initializer for processes that hash passwords in bulk."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
@@ -0,0 +1,168 @@
+import csv
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from account.hashing import init_hashing_worker
+from account.models import CustomUser
+from account.serializers import EMAIL_REGEX, PASSWORD_REGEX
+
+USERNAME_MAX_LENGTH = CustomUser._meta.get_field('username').max_length
+
+
+def read_rows(path, fmt):
+    """Yield (line number, row dict or None, parse error) without loading the whole file."""
+    with open(path, newline='', encoding='utf-8') as handle:
+        if fmt == 'csv':
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row, None
+            return
+        for line_num, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_num, None, f'Invalid JSON: {exc}'
+                continue
+            if not isinstance(row, dict):
+                yield line_num, None, 'Expected a JSON object'
+                continue
+            yield line_num, row, None
+
+
+def validate_row(row):
+    """Same rules as RegisterSerializer, minus the uniqueness checks done per batch."""
+    # JSON Lines rows can carry any JSON type; CSV values are always strings
+    for field in ('username', 'email', 'password'):
+        if row.get(field) is not None and not isinstance(row[field], str):
+            return f'{field} must be a string'
+    username = (row.get('username') or '').strip()
+    email = (row.get('email') or '').strip()
+    password = row.get('password') or ''
+    if not username or not email or not password:
+        return 'username, email and password are required'
+    if len(username) > USERNAME_MAX_LENGTH:
+        return f'Username is longer than {USERNAME_MAX_LENGTH} characters'
+    if re.fullmatch(EMAIL_REGEX, email) is None:
+        return 'Enter a correct email address'
+    if re.fullmatch(PASSWORD_REGEX, password) is None:
+        return 'Password does not meet the password criteria'
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Bulk import users from a CSV or JSON Lines file with username, email and password'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or a .jsonl file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format; guessed from the file extension by default')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows checked and inserted per batch')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes hashing passwords; 0 hashes in this process')
+        parser.add_argument('--errors', help='Write rejected rows as JSON Lines here instead of stderr')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        self.errors = open(options['errors'], 'w', encoding='utf-8') if options['errors'] else sys.stderr
+        self.created = self.failed = 0
+        self.workers = options['workers']
+        pool = None
+        if options['workers'] > 0:
+            # Spawned workers only import hashing code; forking would copy the DB connection
+            pool = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=get_context('spawn'),
+                initializer=init_hashing_worker,
+                initargs=(os.environ['DJANGO_SETTINGS_MODULE'],),
+            )
+        try:
+            rows = read_rows(path, fmt)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                self.import_batch(batch, pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if self.errors is not sys.stderr:
+                self.errors.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Created {self.created} users, rejected {self.failed} rows'))
+
+    def reject(self, line, row, error):
+        self.failed += 1
+        username = row.get('username') if row else None
+        self.errors.write(json.dumps({'line': line, 'username': username, 'error': error}) + '\n')
+
+    def import_batch(self, batch, pool):
+        candidates = []
+        for line, row, error in batch:
+            error = error or validate_row(row)
+            if error:
+                self.reject(line, row, error)
+            else:
+                candidates.append((line, row))
+
+        # Two IN queries per batch instead of an exists() per row
+        usernames = {row['username'].strip() for _, row in candidates}
+        emails = {row['email'].strip() for _, row in candidates}
+        taken_usernames = set(CustomUser.objects.filter(username__in=usernames).values_list('username', flat=True))
+        taken_emails = set(CustomUser.objects.filter(email__in=emails).values_list('email', flat=True))
+
+        accepted = []
+        for line, row in candidates:
+            username, email = row['username'].strip(), row['email'].strip()
+            if username in taken_usernames:
+                self.reject(line, row, 'This username is already taken')
+            elif email in taken_emails:
+                self.reject(line, row, 'This email is already registered')
+            else:
+                # Later rows of the same file collide with this one too
+                taken_usernames.add(username)
+                taken_emails.add(email)
+                accepted.append((line, row))
+        if not accepted:
+            return
+
+        passwords = [row['password'] for _, row in accepted]
+        if pool is not None:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            hashes = list(pool.map(make_password, passwords, chunksize=chunksize))
+        else:
+            hashes = [make_password(password) for password in passwords]
+
+        users = [
+            CustomUser(username=row['username'].strip(), email=row['email'].strip(), password=password)
+            for (_, row), password in zip(accepted, hashes)
+        ]
+        try:
+            with transaction.atomic():
+                CustomUser.objects.bulk_create(users)
+            self.created += len(users)
+        except IntegrityError:
+            # Someone registered one of these names meanwhile: isolate the offending rows
+            for (line, row), user in zip(accepted, users):
+                try:
+                    with transaction.atomic():
+                        user.save()
+                    self.created += 1
+                except IntegrityError as exc:
+                    self.reject(line, row, str(exc))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from account.blacklist import prune_expired_tokens
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted refresh tokens in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Tokens deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between chunks')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Queue a recurring prune job for runjobs instead of pruning now')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        if options['schedule']:
+            if Job.objects.filter(task='account.prune_tokens', status='queued').exists():
+                self.stdout.write('A prune job is already queued')
+                return
+            Job.objects.enqueue('account.prune_tokens', {'chunk_size': options['chunk_size']})
+            self.stdout.write(self.style.SUCCESS('Queued a recurring prune job'))
+            return
+        deleted = prune_expired_tokens(options['chunk_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired tokens'))
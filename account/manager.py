@@ -1,4 +1,11 @@
+from django.apps import apps
+from django.conf import settings
 from django.contrib.auth.models import BaseUserManager
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+# Written only through the manager's UPDATEs, never by CustomUser.save()
+STORAGE_FIELDS = ('storage_used', 'storage_reserved')
 
 
 class CustomUserManager(BaseUserManager):
@@ -22,4 +29,60 @@ class CustomUserManager(BaseUserManager):
             raise ValueError(_('Superuser must have is_superuser=True.'))
         return self.create_user(username, email, password, **extra_fields)
 
+    def storage_left(self, user_id):
+        """
+        Bytes the user may still store. A primary key lookup of the running
+        totals, so the check costs the same however many files they have.
+        """
+        used, reserved, quota = self.filter(pk=user_id).values_list(
+            'storage_used', 'storage_reserved', 'storage_quota',
+        ).get()
+        return (settings.STORAGE_QUOTA_BYTES if quota is None else quota) - used - reserved
+
+    def reserve_storage(self, user_id, size):
+        """
+        Hold ``size`` bytes of the user's quota for an upload in progress, in
+        one conditional UPDATE, so concurrent uploads cannot all pass a check
+        against the same total. Returns False, holding nothing, if the bytes
+        do not fit. ``user_id`` may be a subquery.
+        """
+        if size <= 0:
+            return True
+        quota = Coalesce('storage_quota', Value(settings.STORAGE_QUOTA_BYTES))
+        return bool(
+            self.filter(pk=user_id)
+            .alias(left=quota - F('storage_used') - F('storage_reserved'))
+            .filter(left__gte=size)
+            .update(storage_reserved=F('storage_reserved') + size)
+        )
+
+    def release_storage(self, user_id, size):
+        """Give back bytes held by reserve_storage(), once stored or abandoned."""
+        if size > 0:
+            self.filter(pk=user_id).update(storage_reserved=Greatest(F('storage_reserved') - size, Value(0)))
 
+    def reconcile_storage(self, user_ids, save=True):
+        """
+        Recompute ``storage_used`` for the given users from their media, and
+        ``storage_reserved`` from their open upload sessions, and rewrite them
+        where they drifted (unless ``save`` is false). Bytes held by direct
+        uploads still in flight are not counted, so run it when quiet.
+        Returns the drifted users, corrected.
+        """
+        totals = {}
+        for field, model in zip(STORAGE_FIELDS, ('Media', 'UploadSession')):
+            totals[field] = dict(
+                apps.get_model('media', model).objects.filter(album__owner_id__in=user_ids).order_by()
+                .values('album__owner_id').annotate(total=Sum('size'))
+                .values_list('album__owner_id', 'total')
+            )
+        drifted = []
+        for user in self.filter(pk__in=user_ids).only('pk', *totals):
+            actual = {field: total.get(user.pk) or 0 for field, total in totals.items()}
+            if any(getattr(user, field) != value for field, value in actual.items()):
+                for field, value in actual.items():
+                    setattr(user, field, value)
+                drifted.append(user)
+        if save:
+            self.bulk_update(drifted, list(totals))
+        return drifted
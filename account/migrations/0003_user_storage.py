@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_user_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='storage_quota',
+            field=models.BigIntegerField(blank=True, help_text='Bytes allowed; empty means STORAGE_QUOTA_BYTES', null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='storage_used',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0003_user_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='storage_reserved',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,9 +1,10 @@
 import uuid
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.utils.translation import gettext_lazy as _
-from account.manager import CustomUserManager
+from account.manager import STORAGE_FIELDS, CustomUserManager
 
 class CustomUser(AbstractBaseUser, PermissionsMixin):
     username = models.CharField(max_length=20, unique=True)
@@ -14,10 +15,38 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Running total of the bytes in the user's albums, kept by AlbumManager
+    storage_used = models.BigIntegerField(default=0, editable=False)
+    # Bytes held for uploads still in progress (see CustomUserManager.reserve_storage)
+    storage_reserved = models.BigIntegerField(default=0, editable=False)
+    storage_quota = models.BigIntegerField(null=True, blank=True,
+                                           help_text='Bytes allowed; empty means STORAGE_QUOTA_BYTES')
+
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email']
 
     objects = CustomUserManager()
 
+    class Meta:
+        indexes = [
+            # Range filters in the admin user listing and export
+            models.Index(fields=['created_at'], name='account_user_created_idx'),
+        ]
+
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+    def save(self, *args, **kwargs):
+        # The storage counters only move through CustomUserManager's UPDATEs;
+        # saving an instance loaded earlier must not write them back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in STORAGE_FIELDS and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def storage_limit(self):
+        return settings.STORAGE_QUOTA_BYTES if self.storage_quota is None else self.storage_quota
\ No newline at end of file
@@ -0,0 +1,10 @@
+from Memory.pagination import KeysetPagination
+
+
+class UserKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination over the primary key, oldest account first. Each page
+    resumes after the last id seen, so deep pages cost the same as the first.
+    """
+    ordering = ('id',)
+    max_page_size = 1000
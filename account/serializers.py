@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from .models import CustomUser
-from django.contrib.auth.hashers import make_password, check_password
+from django.contrib.auth.hashers import make_password
+from .hashing import hashing_slot
+from .blacklist import FilteredRefreshToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 import re
 password_criteria = [
 "At least one uppercase letter",
@@ -9,6 +12,8 @@ password_criteria = [
 "At least one special character",
 "Minimum length of eight characters"
 ]
+EMAIL_REGEX = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b'
+PASSWORD_REGEX = r'^(?=.*?[A-Z])(?=.*?[a-z])(?=.*?[0-9])(?=.*?[#?!@$%^&*-]).{8,}$'
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -21,9 +26,6 @@ class RegisterSerializer(serializers.ModelSerializer):
         exclude = ['created_at', 'updated_at', 'user_permissions', 'groups']
     
     def validate(self, attrs):
-        email_regex = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b'
-        password_regex = r'^(?=.*?[A-Z])(?=.*?[a-z])(?=.*?[0-9])(?=.*?[#?!@$%^&*-]).{8,}$'
-
         # Use .get() to safely access attributes
         username = attrs.get('username')
         email = attrs.get('email')
@@ -41,13 +43,14 @@ class RegisterSerializer(serializers.ModelSerializer):
         if CustomUser.objects.filter(username=username).exists():
             raise serializers.ValidationError("This username is already taken 🥲")
         
-        if re.fullmatch(email_regex, email) is None:
+        if re.fullmatch(EMAIL_REGEX, email) is None:
             raise serializers.ValidationError("Enter a correct email address")
 
-        if re.fullmatch(password_regex, password) is None:
+        if re.fullmatch(PASSWORD_REGEX, password) is None:
             raise serializers.ValidationError({'password':password_criteria})
 
-        attrs['password'] = make_password(password)
+        with hashing_slot():
+            attrs['password'] = make_password(password)
 
         return attrs
 
@@ -75,10 +78,18 @@ class LoginSerializer(serializers.Serializer):
         except CustomUser.DoesNotExist:
             raise serializers.ValidationError("User not found")
         
-        if not check_password(password, user.password):
+        # The only hash of the request. user.check_password also re-hashes and
+        # saves the password when it was stored with an outdated hasher.
+        with hashing_slot():
+            password_valid = user.check_password(password)
+        if not password_valid:
             raise serializers.ValidationError("Incorrect password")
         
         # Add the user to the validated data
         attrs['user'] = user
         return attrs
 
+
+class RefreshSerializer(TokenRefreshSerializer):
+    # Consults the in-memory blacklist filter before querying the blacklist
+    token_class = FilteredRefreshToken
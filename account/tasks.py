@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from account.blacklist import prune_expired_tokens
+from jobs.models import Job
+from jobs.registry import task
+
+
+@task('account.prune_tokens')
+def prune_tokens(chunk_size=1000, reschedule=True):
+    prune_expired_tokens(chunk_size)
+    if reschedule and not Job.objects.filter(task='account.prune_tokens', status='queued').exists():
+        Job.objects.enqueue(
+            'account.prune_tokens',
+            {'chunk_size': chunk_size},
+            run_after=timezone.now() + timedelta(seconds=settings.TOKEN_PRUNE_INTERVAL),
+        )
@@ -1,3 +1,237 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from account.blacklist import blacklist_filter
+from account.models import CustomUser
+from Memory.testing import QueryBudgetMixin
 
 # Create your tests here.
+
+USER_COUNT = 200
+
+
+class AccountQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """
+    Seeds a large user table and fails if the account endpoints exceed a fixed
+    number of queries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('member', 'member@example.com', 'Passw0rd!')
+        cls.admin = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'Passw0rd!')
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'user{i}', email=f'user{i}@example.com', password='!')
+            for i in range(USER_COUNT)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        blacklist_filter.reset()
+        self.client = APIClient()
+
+    def test_register(self):
+        data = {'username': 'newbie', 'email': 'newbie@example.com', 'password': 'Passw0rd!'}
+        response = self.assertMaxQueries(4, self.client.post, '/user/register/', data)
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_user_list(self):
+        self.client.force_login(self.admin)
+        response = self.assertMaxQueries(3, self.client.get, '/user/register/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['data']), 100)
+
+        # Walking the cursor visits every user once, at the same cost per page
+        seen = [user['id'] for user in response.data['data']]
+        while response.data['next']:
+            response = self.assertMaxQueries(3, self.client.get, response.data['next'])
+            seen += [user['id'] for user in response.data['data']]
+        self.assertEqual(len(set(seen)), USER_COUNT + 2)
+
+    def test_user_list_filters(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/user/register/', {'is_staff': 'true'})
+        self.assertEqual([user['username'] for user in response.data['data']], ['admin'])
+
+        response = self.client.get('/user/register/', {'created_after': '2999-01-01'})
+        self.assertEqual(response.data['data'], [])
+
+        response = self.client.get('/user/register/', {'is_active': 'maybe'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_user_export(self):
+        self.client.force_login(self.admin)
+        response = self.assertMaxQueries(3, self.client.get, '/user/export/', {'is_staff': 'false'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), USER_COUNT + 1)
+        self.assertNotIn('password', rows[0])
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/user/export/').status_code, 403)
+
+    def test_login(self):
+        data = {'username': 'member', 'password': 'Passw0rd!'}
+        response = self.assertMaxQueries(2, self.client.post, '/user/login/', data)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_login_upgrades_outdated_hash(self):
+        self.user.password = make_password('Passw0rd!', hasher='md5')
+        self.user.save()
+        data = {'username': 'member', 'password': 'Passw0rd!'}
+        response = self.client.post('/user/login/', data)
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+    def test_refresh_token(self):
+        refresh = str(RefreshToken.for_user(self.user))
+        blacklist_filter.might_contain('warm-up')
+        # The blacklist filter answers for a token that was never rotated
+        response = self.assertMaxQueries(12, self.client.post, '/user/refresh-token/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 200, response.data)
+
+        # Replaying the rotated token hits the filter and then the blacklist
+        response = self.client.post('/user/refresh-token/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=0)
+    def test_refresh_token_blacklisted_elsewhere(self):
+        refresh = RefreshToken.for_user(self.user)
+        blacklist_filter.might_contain('warm-up')
+        # bulk_create skips post_save, like a token blacklisted by another process
+        outstanding = OutstandingToken.objects.get(jti=refresh['jti'])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=outstanding)])
+        response = self.client.post('/user/refresh-token/', {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_prune_expired_tokens(self):
+        past = timezone.now() - timedelta(days=2)
+        expired = OutstandingToken.objects.bulk_create([
+            OutstandingToken(user=self.user, jti=f'expired-{i}', token='-', expires_at=past)
+            for i in range(5)
+        ])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in expired[:3]])
+        live = RefreshToken.for_user(self.user)
+        call_command('prunetokens', chunk_size=2, stdout=StringIO())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+    def test_user_info(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.assertMaxQueries(1, self.client.get, '/user/user-info/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_info_cached(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.client.get('/user/user-info/')
+
+        # A repeat request with the same token resolves the user from the cache
+        response = self.assertMaxQueries(0, self.client.get, '/user/user-info/')
+        self.assertEqual(response.status_code, 200)
+
+        # The entry lives in the shared cache, without the password hash, and saving the user drops it
+        values, _ = cache.get(f'jwt-user:{self.user.pk}')
+        self.assertNotIn(self.user.password, values)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(cache.get(f'jwt-user:{self.user.pk}'))
+        response = self.client.get('/user/user-info/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_user_info_cached_rejects_revoked_token(self):
+        with mock.patch.object(api_settings, 'CHECK_REVOKE_TOKEN', True):
+            token = RefreshToken.for_user(self.user).access_token
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(self.client.get('/user/user-info/').status_code, 200)
+
+            # Checked against the cached row too, not only on a lookup
+            self.assertEqual(self.client.get('/user/user-info/').status_code, 200)
+            self.user.set_password('N3w-passw0rd!')
+            self.user.save()
+            self.assertEqual(self.client.get('/user/user-info/').status_code, 401)
+
+            token = RefreshToken.for_user(self.user).access_token
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.client.get('/user/user-info/')
+            response = self.assertMaxQueries(0, self.client.get, '/user/user-info/')
+            self.assertEqual(response.status_code, 200)
+
+    def test_logout(self):
+        self.client.force_login(self.user)
+        response = self.assertMaxQueries(4, self.client.get, '/user/logout/')
+        self.assertEqual(response.status_code, 200)
+
+
+class ImportUsersCommandTest(TestCase):
+
+    def setUp(self):
+        CustomUser.objects.create_user('existing', 'existing@example.com', 'Passw0rd!')
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.tempdir.name, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def run_import(self, path, **options):
+        errors = os.path.join(self.tempdir.name, 'errors.jsonl')
+        call_command('import_users', path, errors=errors, stdout=StringIO(), **options)
+        with open(errors, encoding='utf-8') as handle:
+            return [json.loads(line) for line in handle]
+
+    def test_csv_import_reports_bad_rows(self):
+        path = self.write('users.csv', '\n'.join([
+            'username,email,password',
+            'alice,alice@example.com,Passw0rd!',
+            'bob,bob@example.com,Passw0rd!',
+            'alice,alice2@example.com,Passw0rd!',
+            'existing,new@example.com,Passw0rd!',
+            'carol,existing@example.com,Passw0rd!',
+            'dave,not-an-email,Passw0rd!',
+            'erin,erin@example.com,weak',
+        ]))
+        errors = self.run_import(path, workers=0, batch_size=3)
+        self.assertEqual(sorted(error['line'] for error in errors), [4, 5, 6, 7, 8])
+        self.assertQuerySetEqual(
+            CustomUser.objects.exclude(username='existing').order_by('username').values_list('username', flat=True),
+            ['alice', 'bob'],
+        )
+        self.assertTrue(CustomUser.objects.get(username='alice').check_password('Passw0rd!'))
+
+    def test_jsonl_import_with_worker_processes(self):
+        path = self.write('users.jsonl', '\n'.join([
+            json.dumps({'username': f'bulk{i}', 'email': f'bulk{i}@example.com', 'password': 'Passw0rd!'})
+            for i in range(4)
+        ] + [
+            '{broken',
+            json.dumps({'username': 123, 'email': 'numeric@example.com', 'password': 'Passw0rd!'}),
+            json.dumps({'username': 'listed', 'email': ['listed@example.com'], 'password': 'Passw0rd!'}),
+        ]))
+        errors = self.run_import(path, workers=2)
+        self.assertEqual([error['line'] for error in errors], [5, 6, 7])
+        self.assertEqual(errors[1]['error'], 'username must be a string')
+        self.assertEqual(CustomUser.objects.filter(username__startswith='bulk').count(), 4)
+        self.assertTrue(CustomUser.objects.get(username='bulk3').check_password('Passw0rd!'))
@@ -3,6 +3,7 @@ from account import views
 
 urlpatterns = [
     path('register/', views.RegisterView.as_view()),
+    path('export/', views.UserExportView.as_view()),
     path('login/', views.LoginView.as_view()),
     path('logout/', views.LogoutView.as_view()),
     path('user-info/', views.UserInfoView.as_view()),
@@ -1,18 +1,72 @@
+import json
+from datetime import datetime, time
+
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import login, logout
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 from .models import CustomUser
-from .serializers import RegisterSerializer, LoginSerializer
+from .hashing import HashingBusy
+from .pagination import UserKeysetPagination
+from .serializers import RegisterSerializer, LoginSerializer, RefreshSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from account.authentication import CachedJWTAuthentication
 from rest_framework_simplejwt.views import TokenRefreshView
 
 
 
 
+EXPORT_FIELDS = ['id', 'username', 'email', 'is_active', 'is_staff', 'is_superuser', 'created_at', 'last_login']
+EXPORT_CHUNK_SIZE = 2000
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def _parse_bool(params, name):
+    value = params[name].lower()
+    if value not in BOOLEAN_VALUES:
+        raise ValidationError({name: 'Expected true or false'})
+    return BOOLEAN_VALUES[value]
+
+
+def _parse_moment(params, name):
+    # A bare date means midnight at the start of that day
+    value = params[name]
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: 'Expected an ISO 8601 date or datetime'})
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_users(params):
+    """
+    Users matching the ``is_active``, ``is_staff``, ``created_after`` (inclusive)
+    and ``created_before`` (exclusive) query parameters.
+    """
+    queryset = CustomUser.objects.all()
+    for name in ('is_active', 'is_staff'):
+        if name in params:
+            queryset = queryset.filter(**{name: _parse_bool(params, name)})
+    if 'created_after' in params:
+        queryset = queryset.filter(created_at__gte=_parse_moment(params, 'created_after'))
+    if 'created_before' in params:
+        queryset = queryset.filter(created_at__lt=_parse_moment(params, 'created_before'))
+    return queryset
+
+
 class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = RefreshSerializer
+
     def post(self, request, *args, **kwargs):
         return super().post(request, *args, **kwargs)
 
@@ -49,6 +103,12 @@ class RegisterView(APIView):
                 'user_id': serializer.data  # Assuming the primary key is `uuid`
             }, status=status.HTTP_201_CREATED)
 
+        except HashingBusy:
+            return Response({
+                'data': {},
+                'message': "Too many requests in progress, please retry",
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+
         except Exception as e:
             return Response({
                 'data': str(e),  # Convert exception to string
@@ -59,27 +119,63 @@ class RegisterView(APIView):
         
         try:
             self.check_permissions(request)
-            data = CustomUser.objects.all()
-            serializer = RegisterSerializer(data, many=True)
+            users = filter_users(request.query_params)
+
+            # One page at a time, resuming after the last id instead of loading every user
+            paginator = UserKeysetPagination()
+            page = paginator.paginate_queryset(users, request, view=self)
+            serializer = RegisterSerializer(page, many=True)
 
             return Response({
                 'data': serializer.data,  # Return serialized data
+                'next': paginator.get_next_link(),
             }, status=status.HTTP_200_OK)
 
+        except (ValidationError, NotFound) as e:
+            return Response({
+                'data': e.detail,
+                'message': "Something went wrong",
+            }, status=e.status_code)
+
         except Exception as e:
             return Response({
                 'data': str(e),  # Convert exception to string
                 'message': "Something went wrong",
             }, status=status.HTTP_400_BAD_REQUEST)
 
+class UserExportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            users = filter_users(request.query_params)
+        except ValidationError as e:
+            return Response({
+                'data': e.detail,
+                'message': "Something went wrong",
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Rows are fetched EXPORT_CHUNK_SIZE at a time as plain dicts and written
+        # out as they arrive, so memory stays flat however many users there are
+        rows = users.order_by('id').values(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        lines = (json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="users.jsonl"'
+        return response
+
+
 class LoginView(APIView):
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
-        if serializer.is_valid():
-            username = serializer.validated_data['username']
-            password = serializer.validated_data['password']
-            user = authenticate(request, username=username, password=password)
-            if user is not None:
+        try:
+            is_valid = serializer.is_valid()
+        except HashingBusy:
+            return Response({"error": "Too many logins in progress, please retry"},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+        if is_valid:
+            # The serializer already verified the password; don't hash it a second time
+            user = serializer.validated_data['user']
+            if user.is_active:
                 # login(request, user)
                 # If the credentials are valid, create JWT tokens
                 refresh = RefreshToken.for_user(user)
@@ -105,7 +201,7 @@ class LogoutView(APIView):
 
 class UserInfoView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
 
     def get(self, request):
         from django.middleware.csrf import get_token
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AlbumConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'album'
+
+    def ready(self):
+        from album import signals, tasks  # noqa: F401
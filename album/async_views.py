@@ -0,0 +1,69 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from rest_framework.pagination import LimitOffsetPagination
+from account.asyncapi import AsyncAPIView
+from album.cache import ainvalidate_sharelink
+from album.models import Album
+from album.serializers import AlbumSerializer
+
+# Async counterparts of the album views, for the ASGI entry point. Responses
+# match the DRF generic views; those stay in place for WSGI deployments.
+
+
+class AsyncAlbumListView(AsyncAPIView):
+
+    async def get(self, request, *args, **kwargs):
+        albums = Album.objects.live().filter(owner=request.user).select_related('owner', 'latest_media__blob').order_by('id')
+
+        # Same page shape as the DEFAULT_PAGINATION_CLASS the sync view uses
+        paginator = LimitOffsetPagination()
+        paginator.request = request
+        paginator.limit = paginator.get_limit(request)
+        paginator.offset = paginator.get_offset(request)
+        paginator.count = await albums.acount()
+        page = [album async for album in albums[paginator.offset:paginator.offset + paginator.limit]]
+        serializer = AlbumSerializer(page, many=True, context={'request': request})
+        return JsonResponse(paginator.get_paginated_response(serializer.data).data)
+
+
+class AsyncAlbumCreateView(AsyncAPIView):
+
+    async def post(self, request, *args, **kwargs):
+        serializer = AlbumSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+        await sync_to_async(serializer.save)(owner=request.user)
+        # The owner is the authenticated user, whose storage counters are not
+        # cached with it and load from the database as the album is serialized
+        data = await sync_to_async(lambda: serializer.data)()
+        return JsonResponse(data, status=201)
+
+
+class AsyncAlbumDetailView(AsyncAPIView):
+
+    async def get_object(self, request, pk):
+        album = await Album.objects.live().filter(owner=request.user, pk=pk).select_related('owner', 'latest_media__blob').afirst()
+        if album is None:
+            raise Http404
+        return album
+
+    async def get(self, request, *args, **kwargs):
+        album = await self.get_object(request, kwargs['pk'])
+        return JsonResponse(AlbumSerializer(album, context={'request': request}).data)
+
+    async def put(self, request, *args, partial=False, **kwargs):
+        album = await self.get_object(request, kwargs['pk'])
+        serializer = AlbumSerializer(album, data=request.data, partial=partial, context={'request': request})
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+        await sync_to_async(serializer.save)()
+        return JsonResponse(serializer.data)
+
+    async def patch(self, request, *args, **kwargs):
+        return await self.put(request, *args, partial=True, **kwargs)
+
+    async def delete(self, request, *args, **kwargs):
+        album = await self.get_object(request, kwargs['pk'])
+        await sync_to_async(Album.objects.tombstone)(album.pk)
+        await ainvalidate_sharelink(album.sharelink)
+        return JsonResponse({'message': 'Album scheduled for deletion'}, status=202)
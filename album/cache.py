@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.db import router
+from album.models import Album
+
+# Entries live in the cache shared by every worker (see CACHES) and are deleted
+# on every change to the album. A miss that read the row just before a change
+# can still store it after the delete, so a privacy flip or a deletion may be
+# missed for up to the TTL; MediaFileView relies on the cached privacy, so it
+# is kept short.
+SHARELINK_CACHE_TTL = 10  # seconds
+# Kept in model field order, which is how Album.from_db expects the values
+CACHED_FIELDS = tuple(
+    field.attname for field in Album._meta.concrete_fields
+    if field.attname in ('id', 'owner_id', 'title', 'privacy_settings', 'sharelink', 'updated_at')
+)
+
+
+def _cache_key(sharelink):
+    return f'sharelink:{sharelink}'
+
+
+def resolve_sharelink(sharelink):
+    """
+    Return the Album for a sharelink, or None if there is none or the album
+    has been deleted.
+
+    Only CACHED_FIELDS are loaded; the instance defers everything else, so the
+    upload and listing paths resolve a hot album from the shared cache without
+    touching the database.
+    """
+    key = _cache_key(sharelink)
+    values = cache.get(key)
+    if values is None:
+        queryset = Album.objects.live().filter(sharelink=sharelink)
+        values = queryset.values_list(*CACHED_FIELDS).first()
+        if values is None:
+            return None
+        cache.set(key, values, SHARELINK_CACHE_TTL)
+        return Album.from_db(queryset.db, CACHED_FIELDS, values)
+    return Album.from_db(router.db_for_read(Album), CACHED_FIELDS, values)
+
+
+async def aresolve_sharelink(sharelink):
+    """resolve_sharelink() for async views, through the async ORM on a miss."""
+    key = _cache_key(sharelink)
+    values = await cache.aget(key)
+    if values is None:
+        queryset = Album.objects.live().filter(sharelink=sharelink)
+        values = await queryset.values_list(*CACHED_FIELDS).afirst()
+        if values is None:
+            return None
+        await cache.aset(key, values, SHARELINK_CACHE_TTL)
+        return Album.from_db(queryset.db, CACHED_FIELDS, values)
+    return Album.from_db(router.db_for_read(Album), CACHED_FIELDS, values)
+
+
+def invalidate_sharelink(sharelink):
+    cache.delete(_cache_key(sharelink))
+
+
+async def ainvalidate_sharelink(sharelink):
+    await cache.adelete(_cache_key(sharelink))
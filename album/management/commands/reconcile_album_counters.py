@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from account.models import CustomUser
+from album.models import Album
+
+
+class Command(BaseCommand):
+    help = "Recount album media counters and users' storage totals, repairing any that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Albums or users recounted per query')
+        parser.add_argument('--album', type=int, action='append', dest='albums',
+                            help='Only check this album id (repeatable); skips the storage totals')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        verb = 'would be repaired' if options['dry_run'] else 'repaired'
+
+        albums = Album.objects.order_by('pk')
+        if options['albums']:
+            albums = albums.filter(pk__in=options['albums'])
+        checked, repaired = self.walk(albums, Album.objects.reconcile, options, lambda album: (
+            f'Album {album.pk}: {album.media_count} media, {album.pending_count} pending, '
+            f'{album.total_bytes} bytes, latest {album.latest_media_id}'
+        ))
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} albums, {repaired} {verb}'))
+
+        if not options['albums']:
+            checked, repaired = self.walk(
+                CustomUser.objects.order_by('pk'), CustomUser.objects.reconcile_storage, options,
+                lambda user: f'User {user.pk}: {user.storage_used} bytes stored, {user.storage_reserved} reserved',
+            )
+            self.stdout.write(self.style.SUCCESS(f'Checked {checked} users, {repaired} {verb}'))
+
+    def walk(self, queryset, reconcile, options, describe):
+        checked = repaired = 0
+        last_pk = 0
+        while True:
+            # Walk by primary key so memory stays flat on large tables
+            batch = list(queryset.filter(pk__gt=last_pk).values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                return checked, repaired
+            last_pk = batch[-1]
+            for row in reconcile(batch, save=not options['dry_run']):
+                self.stdout.write(describe(row))
+                repaired += 1
+            checked += len(batch)
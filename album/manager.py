@@ -0,0 +1,110 @@
+from django.db import models, transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from account.models import CustomUser
+from jobs.models import Job
+
+COUNTER_FIELDS = ('media_count', 'pending_count', 'total_bytes', 'latest_media_id')
+# Written only through the manager, never by Album.save()
+MANAGED_FIELDS = COUNTER_FIELDS + ('deleted_at',)
+
+
+class AlbumManager(models.Manager):
+    """
+    Keeps the denormalized media counters on Album, and the owner's
+    ``storage_used``, in step with the album's Media rows. Every change is a
+    relative UPDATE, so concurrent uploads never lose each other's increments
+    and no path has to count or sum the album's media.
+    """
+
+    def live(self):
+        """Albums that have not been deleted."""
+        return self.filter(deleted_at__isnull=True)
+
+    def tombstone(self, album_id):
+        """
+        Mark an album deleted and queue the album.purge job that removes its
+        media, files and finally the row. Returns False if it already was.
+        """
+        with transaction.atomic():
+            marked = self.live().filter(pk=album_id).update(deleted_at=timezone.now())
+            if marked:
+                Job.objects.enqueue('album.purge', {'album_id': album_id})
+        return bool(marked)
+
+    def charge_owner(self, album_id, size):
+        if size:
+            owner = self.filter(pk=album_id).values('owner_id')
+            CustomUser.objects.filter(pk=Subquery(owner)).update(storage_used=F('storage_used') + size)
+
+    def media_added(self, album_id, count=1, pending=0, size=0, latest_id=None):
+        changes = {
+            'media_count': F('media_count') + count,
+            'pending_count': F('pending_count') + pending,
+            'total_bytes': F('total_bytes') + size,
+        }
+        if latest_id is not None:
+            # Uploads may commit out of order; the highest id is the latest
+            changes['latest_media_id'] = Greatest(Coalesce('latest_media_id', 0), Value(latest_id))
+        self.filter(pk=album_id).update(**changes)
+        self.charge_owner(album_id, size)
+
+    def media_removed(self, album_id, media_id, pending=0, size=0):
+        from media.models import Media
+
+        newest = Media.objects.filter(album_id=album_id).order_by('-id').values('id')[:1]
+        self.filter(pk=album_id).update(
+            media_count=F('media_count') - 1,
+            pending_count=F('pending_count') - pending,
+            total_bytes=F('total_bytes') - size,
+            # Only look for the next newest item when the latest one went away
+            latest_media_id=Case(When(latest_media_id=media_id, then=Subquery(newest)), default=F('latest_media_id')),
+        )
+        self.charge_owner(album_id, -size)
+
+    def pending_changed(self, deltas):
+        """Apply ``{album_id: delta}`` to the pending counters in one UPDATE."""
+        deltas = {album_id: delta for album_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        self.filter(pk__in=list(deltas)).update(pending_count=F('pending_count') + Case(
+            *[When(pk=album_id, then=Value(delta)) for album_id, delta in deltas.items()],
+            default=Value(0), output_field=IntegerField(),
+        ))
+
+    def counted(self, album_ids):
+        """The counters recomputed from the Media rows of ``album_ids``."""
+        from media.models import Media
+
+        rows = (
+            Media.objects.filter(album_id__in=album_ids).order_by().values('album_id')
+            .annotate(
+                media_count=Count('id'),
+                pending_count=Count('id', filter=Q(approval_status='pending')),
+                total_bytes=Coalesce(Sum('size'), 0),
+                latest_media_id=Max('id'),
+            )
+        )
+        empty = {'media_count': 0, 'pending_count': 0, 'total_bytes': 0, 'latest_media_id': None}
+        counts = {album_id: dict(empty) for album_id in album_ids}
+        for row in rows:
+            counts[row.pop('album_id')] = row
+        return counts
+
+    def reconcile(self, album_ids, save=True):
+        """
+        Recount the given albums and rewrite those whose counters drifted
+        (unless ``save`` is false). Returns the drifted albums, corrected.
+        """
+        counts = self.counted(album_ids)
+        drifted = []
+        for album in self.filter(pk__in=album_ids).only('pk', *COUNTER_FIELDS):
+            actual = counts[album.pk]
+            if any(getattr(album, field) != actual[field] for field in COUNTER_FIELDS):
+                for field in COUNTER_FIELDS:
+                    setattr(album, field, actual[field])
+                drifted.append(album)
+        if save:
+            self.bulk_update(drifted, COUNTER_FIELDS)
+        return drifted
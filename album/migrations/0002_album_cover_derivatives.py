@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('album', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='cover_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
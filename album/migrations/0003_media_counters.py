@@ -0,0 +1,53 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+
+
+def backfill_counters(apps, schema_editor):
+    Album = apps.get_model('album', 'Album')
+    Media = apps.get_model('media', 'Media')
+    rows = (
+        Media.objects.order_by().values('album_id')
+        .annotate(count=Count('id'), pending=Count('id', filter=Q(approval_status='pending')),
+                  size=Sum('blob__size'), latest=Max('id'))
+        .iterator()
+    )
+    for row in rows:
+        Album.objects.filter(pk=row['album_id']).update(
+            media_count=row['count'], pending_count=row['pending'],
+            total_bytes=row['size'] or 0, latest_media_id=row['latest'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('album', '0002_album_cover_derivatives'),
+        ('media', '0008_media_pending_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='latest_media',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='media.media'),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='media_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='pending_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='total_bytes',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('album', '0003_media_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
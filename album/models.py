@@ -3,6 +3,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractBaseUser
 from django.utils import timezone
 from account.models import CustomUser
+from album.manager import MANAGED_FIELDS, AlbumManager
 
 class BaseModel(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
@@ -18,6 +19,35 @@ class Album(BaseModel):
     sharelink = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     privacy_settings = models.CharField(max_length=10, choices=[('public', 'Public'), ('private', 'Private')], default='private')
     cover_image = models.ImageField(upload_to='cover_images/', blank=True)
+    cover_derivatives = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Denormalized from the album's media by AlbumManager; repaired by the
+    # reconcile_album_counters command if they ever drift
+    media_count = models.IntegerField(default=0, editable=False)
+    pending_count = models.IntegerField(default=0, editable=False)
+    total_bytes = models.BigIntegerField(default=0, editable=False)
+    # No database constraint: deleting media fixes this up itself (see
+    # AlbumManager.media_removed) instead of through an ON DELETE cascade
+    latest_media = models.ForeignKey(
+        'media.Media', null=True, blank=True, editable=False, related_name='+',
+        on_delete=models.DO_NOTHING, db_constraint=False,
+    )
+    # Set when the album is deleted; the album.purge job then removes its
+    # media and files in the background, and the row last
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = AlbumManager()
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+    def save(self, *args, **kwargs):
+        # The counters and the tombstone only move through AlbumManager's
+        # UPDATEs; saving an instance loaded earlier must not write them back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in MANAGED_FIELDS and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
\ No newline at end of file
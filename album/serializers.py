@@ -1,15 +1,41 @@
 from rest_framework import serializers
 from .models import Album
+from media.derivatives import derivative_urls, media_file_url
 
 
 class AlbumSerializer(serializers.ModelSerializer):
     owner = serializers.SerializerMethodField()
     cover_image = serializers.ImageField(use_url=True)
+    cover_derivatives = serializers.SerializerMethodField()
+    latest_thumbnail = serializers.SerializerMethodField()
+    storage = serializers.SerializerMethodField()
     class Meta:
         model = Album
-        fields = ['id', 'title', 'description', 'cover_image', 'privacy_settings', 'sharelink', 'owner']
+        fields = ['id', 'title', 'description', 'cover_image', 'cover_derivatives', 'privacy_settings', 'sharelink', 'owner',
+                  'media_count', 'pending_count', 'total_bytes', 'latest_thumbnail', 'storage']
         read_only_fields = ['sharelink', 'owner_username', 'owner']
 
         
     def get_owner(self, obj):
         return obj.owner.username if obj.owner else None
+
+    def get_cover_derivatives(self, obj):
+        return derivative_urls(obj.cover_derivatives, obj.cover_image.storage, self.context.get('request'))
+
+    def get_latest_thumbnail(self, obj):
+        # Querysets that list albums select latest_media__blob along with them
+        media = obj.latest_media
+        if media is None or media.blob is None or 'thumbnail' not in media.blob.derivatives:
+            return None
+        return media_file_url(obj.sharelink, media.pk, 'thumbnail', self.context.get('request'))
+
+    def get_storage(self, obj):
+        # The owner's quota usage, read from the owner row the album was selected with
+        owner = obj.owner
+        return {'used': owner.storage_used, 'quota': owner.storage_limit}
+
+
+class PublicAlbumSerializer(AlbumSerializer):
+    """AlbumSerializer for albums shown to users other than the owner, without the owner's quota usage."""
+    class Meta(AlbumSerializer.Meta):
+        fields = [field for field in AlbumSerializer.Meta.fields if field != 'storage']
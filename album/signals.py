@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from album.cache import invalidate_sharelink
+from album.models import Album
+
+
+@receiver(post_save, sender=Album)
+@receiver(post_delete, sender=Album)
+def invalidate_album_sharelink(sender, instance, **kwargs):
+    invalidate_sharelink(instance.sharelink)
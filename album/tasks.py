@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from album.models import Album
+from jobs.models import Job
+from jobs.registry import task
+from media.models import Media
+from media.uploads import discard_upload
+
+
+@task('album.purge')
+def purge_album(album_id):
+    """
+    Remove a deleted album a batch of media at a time. Each run deletes at
+    most ALBUM_PURGE_BATCHES batches and queues the next, so no single job
+    outlives the visibility timeout however large the album is.
+    """
+    album = Album.objects.filter(pk=album_id, deleted_at__isnull=False).first()
+    if album is None:
+        return
+
+    for _ in range(settings.ALBUM_PURGE_BATCHES):
+        ids = list(
+            Media.objects.filter(album_id=album_id).order_by('pk')
+            .values_list('pk', flat=True)[:settings.ALBUM_PURGE_BATCH_SIZE]
+        )
+        if not ids:
+            break
+        # Through the ORM rather than raw SQL so the Media signals release
+        # blobs (and their files) and refund the owner's storage as usual
+        with transaction.atomic():
+            Media.objects.filter(pk__in=ids).delete()
+    else:
+        Job.objects.enqueue('album.purge', {'album_id': album_id})
+        return
+
+    for session in album.upload_sessions.all():
+        discard_upload(session)
+    names = []
+    if album.cover_image:
+        names.append(album.cover_image.name)
+        names += [name for kind, name in album.cover_derivatives.items() if kind != 'source']
+    with transaction.atomic():
+        album.delete()
+        if names:
+            Job.objects.enqueue('media.delete_files', {'names': names, 'released_at': time.time()})
@@ -1,3 +1,285 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import uuid
+from PIL import Image
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from account.models import CustomUser
+from album.cache import ainvalidate_sharelink, aresolve_sharelink, invalidate_sharelink, resolve_sharelink
+from album.models import Album
+from jobs.models import Job
+from jobs.registry import tasks
+from media.models import Blob, Media, UploadSession
+from Memory.testing import QueryBudgetMixin
 
 # Create your tests here.
+
+ALBUM_COUNT = 100
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(name='cover.png'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'white').save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AlbumQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """
+    Seeds many albums for one owner and fails if the album endpoints exceed a
+    fixed number of queries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        Album.objects.bulk_create([
+            Album(owner=cls.user, title=f'Album {i}') for i in range(ALBUM_COUNT)
+        ])
+        cls.album = Album.objects.filter(owner=cls.user).first()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_album_list(self):
+        response = self.assertMaxQueries(3, self.client.get, '/albums/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), ALBUM_COUNT)
+
+    def test_album_detail(self):
+        response = self.assertMaxQueries(2, self.client.get, f'/albums/{self.album.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_album_create(self):
+        response = self.assertMaxQueries(
+            4, self.client.post, '/albums/create/',
+            {'title': 'New', 'cover_image': make_image()}, format='multipart',
+        )
+        self.assertEqual(response.status_code, 201)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AsyncAlbumViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        Album.objects.bulk_create([
+            Album(owner=cls.user, title=f'Album {i}') for i in range(ALBUM_COUNT)
+        ])
+        cls.album = Album.objects.filter(owner=cls.user).first()
+        cls.headers = {'Authorization': f'Bearer {RefreshToken.for_user(cls.user).access_token}'}
+
+    async def test_list_matches_sync_view(self):
+        response = await self.async_client.get('/async/albums/', {'limit': 10, 'offset': 5}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(APIClient().get)(
+            '/albums/', {'limit': 10, 'offset': 5}, HTTP_AUTHORIZATION=self.headers['Authorization'],
+        )
+        self.assertEqual(response.json()['count'], ALBUM_COUNT)
+        self.assertEqual(
+            [album['id'] for album in response.json()['results']],
+            [album['id'] for album in expected.data['results']],
+        )
+
+    async def test_create_update_delete(self):
+        response = await self.async_client.post(
+            '/async/albums/create/', {'title': 'New', 'cover_image': make_image()}, headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        url = f"/async/albums/{response.json()['id']}/"
+
+        response = await self.async_client.patch(
+            url, {'title': 'Renamed'}, content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.json()['title'], 'Renamed')
+
+        response = await self.async_client.delete(url, headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        response = await self.async_client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(f'/async/albums/{self.album.pk}/')
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AlbumCounterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        cls.album = Album.objects.create(owner=cls.user, title='Trip')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def upload(self, content):
+        upload = SimpleUploadedFile('photo.jpg', content, content_type='image/jpeg')
+        response = APIClient().post(f'/sharelink/{self.album.sharelink}/', {'file': upload, 'media_type': 'image'})
+        self.assertEqual(response.status_code, 201, response.data)
+        return Media.objects.latest('id')
+
+    def stats(self):
+        album = self.client.get('/albums/').data['results'][0]
+        return album['media_count'], album['pending_count'], album['total_bytes']
+
+    def test_counters_follow_media_changes(self):
+        first = self.upload(b'\xff\xd8first\xff\xd9')
+        second = self.upload(b'\xff\xd8second\xff\xd9')
+        files = [SimpleUploadedFile(f'{i}.jpg', b'\xff\xd8' + bytes([i]) + b'\xff\xd9') for i in range(3)]
+        APIClient().post(f'/sharelink/{self.album.sharelink}/batch/', {'files': files})
+        self.assertEqual(self.stats(), (5, 5, 9 + 10 + 3 * 5))
+
+        self.client.post('/moderation/', {'action': 'approve', 'ids': [first.pk, second.pk]}, format='json')
+        self.assertEqual(self.stats(), (5, 3, 34))
+        second.refresh_from_db()
+        second.approval_status = 'pending'
+        second.save()
+        self.assertEqual(self.stats(), (5, 4, 34))
+
+        latest = Media.objects.latest('id')
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.latest_media_id, latest.pk)
+        latest.delete()
+        second.delete()
+        self.assertEqual(self.stats(), (3, 2, 9 + 2 * 5))
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.latest_media_id, Media.objects.latest('id').pk)
+
+    def test_album_save_keeps_counters(self):
+        stale = Album.objects.get(pk=self.album.pk)
+        self.upload(b'\xff\xd8photo\xff\xd9')
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertEqual(self.stats(), (1, 1, 9))
+
+    def test_reconcile_repairs_drift(self):
+        media = self.upload(b'\xff\xd8photo\xff\xd9')
+        Album.objects.filter(pk=self.album.pk).update(media_count=7, pending_count=0, total_bytes=0, latest_media=None)
+
+        out = io.StringIO()
+        call_command('reconcile_album_counters', '--dry-run', stdout=out)
+        self.assertIn('1 would be repaired', out.getvalue())
+        self.assertEqual(self.stats(), (7, 0, 0))
+
+        call_command('reconcile_album_counters', stdout=io.StringIO())
+        self.assertEqual(self.stats(), (1, 1, 9))
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.latest_media_id, media.pk)
+
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, ALBUM_PURGE_BATCH_SIZE=2, ALBUM_PURGE_BATCHES=1)
+class AlbumDeletionTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.album = Album.objects.create(owner=self.user, title='Trip', cover_image=make_image())
+        for i in range(3):
+            upload = SimpleUploadedFile(f'{i}.jpg', b'\xff\xd8' + bytes([i]) + b'\xff\xd9', content_type='image/jpeg')
+            APIClient().post(f'/sharelink/{self.album.sharelink}/', {'file': upload, 'media_type': 'image'})
+        self.session = UploadSession.objects.create(album=self.album, filename='big.mp4', media_type='video', size=10)
+
+    def run_jobs(self, *names):
+        runs = 0
+        while True:
+            job = Job.objects.filter(task__in=names, status='queued').order_by('id').first()
+            if job is None:
+                return runs
+            tasks[job.task](**job.payload)
+            Job.objects.filter(pk=job.pk).update(status='done')
+            runs += 1
+
+    def test_delete_hides_album_then_purges_in_batches(self):
+        files = [self.album.cover_image.path] + [blob.file.path for blob in Blob.objects.all()]
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk).storage_used, 15)
+
+        response = self.client.delete(f'/albums/{self.album.pk}/')
+        self.assertEqual(response.status_code, 202)
+        # Hidden everywhere at once, though nothing has been removed yet
+        self.assertEqual(self.client.get(f'/albums/{self.album.pk}/').status_code, 404)
+        self.assertEqual(self.client.get('/albums/').data['count'], 0)
+        self.assertEqual(self.client.get(f'/sharelink/{self.album.sharelink}/').status_code, 404)
+        self.assertEqual(APIClient().get(f'/sharelink/{self.album.sharelink}/uploads/{self.session.pk}/').status_code, 404)
+        self.assertEqual(self.client.delete(f'/albums/{self.album.pk}/').status_code, 404)
+        self.assertEqual(Media.objects.filter(album=self.album).count(), 3)
+
+        # Two media per run, one run per batch, then a last run for the album itself
+        self.assertEqual(self.run_jobs('album.purge'), 3)
+        self.assertFalse(Album.objects.filter(pk=self.album.pk).exists())
+        self.assertFalse(Media.objects.exists())
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk).storage_used, 0)
+
+        self.run_jobs('media.delete_files')
+        self.assertFalse(any(os.path.exists(path) for path in files))
+
+
+
+class SharelinkCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+
+    def setUp(self):
+        cache.clear()
+        self.album = Album.objects.create(owner=self.user, title='Trip')
+
+    def test_hits_skip_the_database(self):
+        with self.assertNumQueries(1):
+            resolve_sharelink(self.album.sharelink)
+            album = resolve_sharelink(str(self.album.sharelink))
+        self.assertEqual((album.pk, album.title, album._state.db), (self.album.pk, 'Trip', 'default'))
+        with self.assertNumQueries(1):
+            self.assertIsNone(resolve_sharelink(uuid.uuid4()))
+
+    def test_changes_invalidate_the_shared_entry(self):
+        resolve_sharelink(self.album.sharelink)
+        # Held in the shared cache, so every worker sees the invalidation
+        key = f'sharelink:{self.album.sharelink}'
+        self.assertIsNotNone(cache.get(key))
+
+        self.album.privacy_settings = 'public'
+        self.album.save()
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(resolve_sharelink(self.album.sharelink).privacy_settings, 'public')
+
+        Album.objects.tombstone(self.album.pk)
+        invalidate_sharelink(self.album.sharelink)
+        self.assertIsNone(resolve_sharelink(self.album.sharelink))
+
+    async def test_async_resolve(self):
+        album = await aresolve_sharelink(self.album.sharelink)
+        self.assertEqual(album.pk, self.album.pk)
+        await sync_to_async(Album.objects.tombstone)(self.album.pk)
+        await ainvalidate_sharelink(self.album.sharelink)
+        self.assertIsNone(await aresolve_sharelink(self.album.sharelink))
@@ -1,9 +1,12 @@
 from django.urls import path, include
-from album import views
+from album import async_views, views
 
 
 urlpatterns = [
     path('albums/', views.AlbumListView.as_view(), name='album-list'),
     path('albums/create/', views.AlbumCreateView.as_view(), name='album-create'),
     path('albums/<int:pk>/', views.AlbumDetailView.as_view(), name='album-detail'),
+    path('async/albums/', async_views.AsyncAlbumListView.as_view(), name='async-album-list'),
+    path('async/albums/create/', async_views.AsyncAlbumCreateView.as_view(), name='async-album-create'),
+    path('async/albums/<int:pk>/', async_views.AsyncAlbumDetailView.as_view(), name='async-album-detail'),
 ]
\ No newline at end of file
@@ -5,7 +5,8 @@ from album.models import Album
 from rest_framework import viewsets, generics
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from account.authentication import CachedJWTAuthentication
+from album.cache import invalidate_sharelink
 from rest_framework.permissions import IsAuthenticated
 
 
@@ -15,15 +16,15 @@ from rest_framework.permissions import IsAuthenticated
 
 class AlbumListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     serializer_class = AlbumSerializer
 
     def get_queryset(self):
-        return Album.objects.filter(owner=self.request.user)
+        return Album.objects.live().filter(owner=self.request.user).select_related('owner', 'latest_media__blob')
 
 class AlbumCreateView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     serializer_class = AlbumSerializer
 
     def perform_create(self, serializer):
@@ -31,8 +32,16 @@ class AlbumCreateView(generics.CreateAPIView):
 
 class AlbumDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     serializer_class = AlbumSerializer
 
     def get_queryset(self):
-        return Album.objects.filter(owner=self.request.user)
+        return Album.objects.live().filter(owner=self.request.user).select_related('owner', 'latest_media__blob')
+
+    def destroy(self, request, *args, **kwargs):
+        # Large albums take too long to delete inline: hide the album now and
+        # let the album.purge job remove its media and files in batches
+        album = self.get_object()
+        Album.objects.tombstone(album.pk)
+        invalidate_sharelink(album.sharelink)
+        return Response({'message': 'Album scheduled for deletion'}, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,116 @@
+"""
+Login throughput benchmark.
+
+    python -m benchmarks.login --users 20 --requests 200 --concurrency 8
+
+Runs LoginView through the test client against a throwaway SQLite database
+and prints JSON with throughput, latency percentiles and response statuses
+(503s show hashing admission control shedding load).
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import django
+
+PASSWORD = 'Passw0rd!'
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(users, requests, concurrency):
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        client = APIClient()
+        try:
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                data = {'username': f'bench{index % users}', 'password': PASSWORD}
+                started = time.perf_counter()
+                response = client.post('/user/login/', data)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[response.status_code] += 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'seconds': round(duration, 3),
+        'logins_per_second': round(statuses[200] / duration, 2),
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies) * 1000, 2),
+            'p50': round(percentile(latencies, 50) * 1000, 2),
+            'p95': round(percentile(latencies, 95) * 1000, 2),
+            'p99': round(percentile(latencies, 99) * 1000, 2),
+        },
+        'statuses': dict(statuses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Memory.settings')
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth.hashers import make_password
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from account.models import CustomUser
+
+    setup_test_environment()
+    # A file database so the client threads share it without table locks
+    connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        password = make_password(PASSWORD)
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'bench{i}', email=f'bench{i}@example.com', password=password)
+            for i in range(args.users)
+        ])
+        result = run(args.users, args.requests, args.concurrency)
+        result['hash_concurrency'] = settings.PASSWORD_HASH_CONCURRENCY
+        print(json.dumps(result, indent=2))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Slow client benchmark for the sync and async sharelink endpoints under ASGI.
+
+    python -m benchmarks.slow_clients --uploaders 50 --chunk-kb 256 --pieces 16 --delay 0.05
+
+Drives the ASGI application in-process against a throwaway SQLite database.
+Each uploader PUTs one chunk to its own resumable upload, trickling the body
+in ``--pieces`` parts ``--delay`` seconds apart like a phone on a poor
+connection, while ``--readers`` clients keep polling the album listing. The
+same load runs against the DRF views and the async views (/async/...), and
+the JSON output has upload and listing latency percentiles for each.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+import django
+
+from benchmarks.login import percentile
+
+
+def summarize(latencies):
+    if not latencies:
+        return None
+    return {
+        'count': len(latencies),
+        'mean': round(statistics.mean(latencies) * 1000, 2),
+        'p50': round(percentile(latencies, 50) * 1000, 2),
+        'p95': round(percentile(latencies, 95) * 1000, 2),
+        'p99': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def call(app, method, path, headers=None, pieces=(), delay=0.0, query=''):
+    """Send one request to the ASGI app, trickling the body, and return the status."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': query.encode(), 'root_path': '',
+        'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    pieces = list(pieces) or [b'']
+    sent = 0
+    status = None
+
+    async def receive():
+        nonlocal sent
+        if sent < len(pieces):
+            if sent and delay:
+                await asyncio.sleep(delay)
+            sent += 1
+            return {'type': 'http.request', 'body': pieces[sent - 1], 'more_body': sent < len(pieces)}
+        # Nothing more to read; the client stays connected until the response is done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run(app, prefix, album, sessions, token, args):
+    chunk = os.urandom(args.chunk_kb * 1024)
+    size = -(-len(chunk) // args.pieces)
+    pieces = [chunk[i:i + size] for i in range(0, len(chunk), size)]
+    auth = {'Authorization': f'Bearer {token}'}
+    upload_latencies, listing_latencies, statuses = [], [], {}
+    done = asyncio.Event()
+
+    async def uploader(session_id):
+        started = time.perf_counter()
+        status = await call(
+            app, 'PUT', f'{prefix}sharelink/{album.sharelink}/uploads/{session_id}/',
+            headers={'Content-Type': 'application/offset+octet-stream', 'Content-Length': str(len(chunk)),
+                     'Upload-Offset': '0'},
+            pieces=pieces, delay=args.delay,
+        )
+        upload_latencies.append(time.perf_counter() - started)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    async def reader():
+        while not done.is_set():
+            started = time.perf_counter()
+            await call(app, 'GET', f'{prefix}sharelink/{album.sharelink}/', headers=auth, query='limit=50')
+            listing_latencies.append(time.perf_counter() - started)
+
+    readers = [asyncio.create_task(reader()) for _ in range(args.readers)]
+    started = time.perf_counter()
+    await asyncio.gather(*(uploader(session_id) for session_id in sessions))
+    duration = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*readers)
+
+    return {
+        'seconds': round(duration, 3),
+        'upload_statuses': statuses,
+        'upload_latency_ms': summarize(upload_latencies),
+        'listing_latency_ms': summarize(listing_latencies),
+        'listings_per_second': round(len(listing_latencies) / duration, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploaders', type=int, default=50)
+    parser.add_argument('--chunk-kb', type=int, default=256)
+    parser.add_argument('--pieces', type=int, default=16)
+    parser.add_argument('--delay', type=float, default=0.05)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--media', type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Memory.settings')
+    django.setup()
+
+    from django.conf import settings
+    from django.core.asgi import get_asgi_application
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from account.models import CustomUser
+    from album.models import Album
+    from media.models import Media, UploadSession
+
+    setup_test_environment(debug=False)
+    scratch = tempfile.mkdtemp()
+    settings.MEDIA_ROOT = os.path.join(scratch, 'media')
+    settings.CHUNKED_UPLOAD_DIR = os.path.join(scratch, 'chunks')
+    # A file database so request threads share it without table locks
+    connection.settings_dict['TEST']['NAME'] = os.path.join(scratch, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = CustomUser.objects.create_user('bench', 'bench@example.com', 'Passw0rd!')
+        album = Album.objects.create(owner=user, title='Bench')
+        Media.objects.bulk_create([
+            Media(album=album, file=f'media/image/Bench/{i}.jpg', media_type='image')
+            for i in range(args.media)
+        ])
+        token = str(RefreshToken.for_user(user).access_token)
+        app = get_asgi_application()
+
+        result = {'uploaders': args.uploaders, 'chunk_kb': args.chunk_kb, 'pieces': args.pieces,
+                  'delay': args.delay, 'readers': args.readers}
+        for mode, prefix in (('sync', '/'), ('async', '/async/')):
+            sessions = UploadSession.objects.bulk_create([
+                UploadSession(id=uuid.uuid4(), album=album, filename='clip.mp4', media_type='video',
+                              size=args.chunk_kb * 1024)
+                for _ in range(args.uploaders)
+            ])
+            connection.close()
+            result[mode] = asyncio.run(run(app, prefix, album, [session.pk for session in sessions], token, args))
+        print(json.dumps(result, indent=2))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,543 @@
+"""
+Seeded load benchmark over every API route.
+
+    python -m benchmarks.suite --users 4 --albums 3 --media 200 --requests 100 --concurrency 8 \
+        --output results.json --baseline benchmarks/baselines/suite.json
+
+Builds a throwaway SQLite database from ``--seed``: users, albums per user
+and media per album backed by real JPEG files, so the same arguments always
+produce the same data. Each route in Memory/urls.py is then driven by
+``--concurrency`` test clients for ``--requests`` requests, and the JSON
+output has, per route, latency percentiles, throughput, status codes, the
+5xx error rate and the query count reported in the Server-Timing header of
+its non-5xx responses. The scratch database runs in WAL mode with immediate
+transactions, so concurrent writers queue instead of failing with "database
+is locked".
+
+With ``--baseline`` the run is compared against a stored result: a route
+regresses when its p95 grows by more than ``--tolerance`` plus ``--slack-ms``,
+its median query count goes up or its error rate does, and the command exits
+with status 1.
+Latency baselines only mean something on the machine that recorded them and
+are noisy on small ones; query counts are portable. ``--update-baseline``
+stores the run as the new baseline.
+
+The admin site and api-token-auth/ (its app is not installed) are left out,
+as are DELETE methods, which would eat into the seeded data.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+import django
+
+from benchmarks.login import PASSWORD, percentile
+from benchmarks.slow_clients import summarize
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+WORDS = [
+    'beach', 'sunset', 'family', 'mountain', 'city', 'party', 'garden', 'winter', 'concert', 'road',
+    'river', 'wedding', 'dog', 'forest', 'market', 'harbour', 'snow', 'birthday', 'museum', 'night',
+]
+BATCH_FILES = 5
+CHUNK_SIZE = 64 * 1024
+
+ROUTES = {}
+
+
+def route(name, prepare=None, admin=False):
+    """
+    Register a benchmarked route. ``send(client, ctx, index, item)`` makes one
+    request; ``prepare(ctx, rng, count)``, run before the clock starts, returns
+    the per-request items for routes that need fresh state (files, sessions).
+    ``admin`` routes get clients logged in to the staff user's session, since
+    the account admin views authenticate by session rather than JWT.
+    """
+    def register(send):
+        ROUTES[name] = (prepare, send, admin)
+        return send
+    return register
+
+
+def image_bytes(rng, size=256):
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x, y = rng.randrange(size), rng.randrange(size)
+        draw.rectangle([x, y, x + rng.randrange(8, size // 2), y + rng.randrange(8, size // 2)],
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def phrase(rng, words):
+    return ' '.join(rng.sample(WORDS, words))
+
+
+class Context:
+    """The seeded data the routes pick from, round-robin by request index."""
+
+    def __init__(self, users, admin, tokens, albums, media):
+        self.users = users
+        self.admin = admin
+        self.tokens = tokens
+        self.albums = albums
+        self.media = media
+
+    def user(self, index):
+        return self.users[index % len(self.users)]
+
+    def auth(self, index):
+        return {'HTTP_AUTHORIZATION': f'Bearer {self.tokens[self.user(index).pk]}'}
+
+    def album(self, index):
+        albums = self.albums[self.user(index).pk]
+        return albums[(index // len(self.users)) % len(albums)]
+
+
+def seed(rng, users, albums, media, image_size):
+    """Create the data set. The same ``rng`` seed always yields the same rows and files."""
+    from django.contrib.auth.hashers import make_password
+    from django.core.files.base import ContentFile
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from account.models import CustomUser
+    from album.models import Album
+    from media.metadata import file_metadata
+    from media.models import Blob, Media, MediaTag
+
+    password = make_password(PASSWORD)
+    people = CustomUser.objects.bulk_create([
+        CustomUser(username=f'bench{i}', email=f'bench{i}@example.com', password=password, is_staff=i == 0)
+        for i in range(users)
+    ])
+    owned = {}
+    media_ids = {}
+    for person in people:
+        owned[person.pk] = Album.objects.bulk_create([
+            Album(owner=person, title=f'{phrase(rng, 2).title()} {i}', description=phrase(rng, 8),
+                  privacy_settings=rng.choice(['public', 'private']),
+                  sharelink=uuid.UUID(int=rng.getrandbits(128), version=4))
+            for i in range(albums)
+        ])
+        for album in owned[person.pk]:
+            contents = [ContentFile(image_bytes(rng, image_size), name=f'{album.pk}-{i}.jpg') for i in range(media)]
+            metadata = [file_metadata(content) for content in contents]
+            items = Media.objects.bulk_create([
+                Media(album=album, blob=blob, file=blob.file.name, media_type='image', checksum=blob.checksum,
+                      approval_status=rng.choices(['pending', 'approved', 'rejected'], [3, 6, 1])[0],
+                      description=phrase(rng, 6), tags=', '.join(rng.sample(WORDS, 3)), **meta)
+                for blob, meta in zip(Blob.objects.acquire_many(contents), metadata)
+            ], batch_size=500)
+            MediaTag.objects.sync(items, created=True)
+            media_ids[album.pk] = [item.pk for item in items]
+        # bulk_create skips the signals that keep the album counters
+        Album.objects.reconcile([album.pk for album in owned[person.pk]])
+    CustomUser.objects.reconcile_storage([person.pk for person in people])
+
+    tokens = {person.pk: str(RefreshToken.for_user(person).access_token) for person in people}
+    return Context(people, people[0], tokens, owned, media_ids)
+
+
+def upload(rng, name='photo.jpg'):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    return SimpleUploadedFile(name, image_bytes(rng), content_type='image/jpeg')
+
+
+def images(ctx, rng, count):
+    return [upload(rng) for _ in range(count)]
+
+
+def batches(ctx, rng, count):
+    return [[upload(rng, f'photo{i}.jpg') for i in range(BATCH_FILES)] for _ in range(count)]
+
+
+def sessions(filled):
+    def prepare(ctx, rng, count):
+        from media.models import UploadSession
+        from media.uploads import append_chunk
+
+        created = UploadSession.objects.bulk_create([
+            UploadSession(album=ctx.album(i), filename='photo.jpg', media_type='image', size=CHUNK_SIZE)
+            for i in range(count)
+        ])
+        if filled:
+            for session in created:
+                append_chunk(session, io.BytesIO(rng.randbytes(CHUNK_SIZE)), CHUNK_SIZE)
+        return created
+    return prepare
+
+
+def refresh_tokens(ctx, rng, count):
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    return [str(RefreshToken.for_user(ctx.user(i))) for i in range(count)]
+
+
+# Account
+
+@route('register')
+def register(client, ctx, i, item):
+    return client.post('/user/register/', {'username': f'new{i}', 'email': f'new{i}@example.com', 'password': PASSWORD})
+
+
+@route('user-list', admin=True)
+def user_list(client, ctx, i, item):
+    return client.get('/user/register/', {'limit': 100})
+
+
+@route('user-export', admin=True)
+def user_export(client, ctx, i, item):
+    return client.get('/user/export/')
+
+
+@route('login')
+def login(client, ctx, i, item):
+    return client.post('/user/login/', {'username': ctx.user(i).username, 'password': PASSWORD})
+
+
+@route('refresh-token', prepare=refresh_tokens)
+def refresh_token(client, ctx, i, item):
+    return client.post('/user/refresh-token/', {'refresh': item})
+
+
+@route('user-info')
+def user_info(client, ctx, i, item):
+    return client.get('/user/user-info/', **ctx.auth(i))
+
+
+@route('logout')
+def logout(client, ctx, i, item):
+    return client.get('/user/logout/', **ctx.auth(i))
+
+
+# Albums
+
+@route('album-list')
+def album_list(client, ctx, i, item):
+    return client.get('/albums/', **ctx.auth(i))
+
+
+@route('album-create', prepare=images)
+def album_create(client, ctx, i, item):
+    return client.post('/albums/create/', {'title': f'New {i}', 'cover_image': item}, **ctx.auth(i))
+
+
+@route('album-detail')
+def album_detail(client, ctx, i, item):
+    return client.get(f'/albums/{ctx.album(i).pk}/', **ctx.auth(i))
+
+
+@route('async-album-list')
+def async_album_list(client, ctx, i, item):
+    return client.get('/async/albums/', **ctx.auth(i))
+
+
+@route('async-album-create', prepare=images)
+def async_album_create(client, ctx, i, item):
+    return client.post('/async/albums/create/', {'title': f'New {i}', 'cover_image': item}, **ctx.auth(i))
+
+
+@route('async-album-detail')
+def async_album_detail(client, ctx, i, item):
+    return client.get(f'/async/albums/{ctx.album(i).pk}/', **ctx.auth(i))
+
+
+# Media
+
+@route('media-list')
+def media_list(client, ctx, i, item):
+    # Every other poll filters by tag, so both listing paths are measured
+    params = {'limit': 50, 'tag': WORDS[i % len(WORDS)]} if i % 2 else {'limit': 50}
+    return client.get(f'/sharelink/{ctx.album(i).sharelink}/', params, **ctx.auth(i))
+
+
+@route('media-upload', prepare=images)
+def media_upload(client, ctx, i, item):
+    return client.post(f'/sharelink/{ctx.album(i).sharelink}/', {'file': item, 'media_type': 'image', 'tags': 'beach'})
+
+
+@route('media-file')
+def media_file(client, ctx, i, item):
+    album = ctx.album(i)
+    ids = ctx.media[album.pk]
+    return client.get(f'/sharelink/{album.sharelink}/files/{ids[i % len(ids)]}/', **ctx.auth(i))
+
+
+@route('media-batch', prepare=batches)
+def media_batch(client, ctx, i, item):
+    return client.post(f'/sharelink/{ctx.album(i).sharelink}/batch/', {'files': item, 'media_type': 'image'})
+
+
+@route('media-tags')
+def media_tags(client, ctx, i, item):
+    return client.get(f'/sharelink/{ctx.album(i).sharelink}/tags/', **ctx.auth(i))
+
+
+@route('moderation-list')
+def moderation_list(client, ctx, i, item):
+    return client.get('/moderation/', {'limit': 50}, **ctx.auth(i))
+
+
+@route('moderation-action')
+def moderation_action(client, ctx, i, item):
+    ids = ctx.media[ctx.album(i).pk]
+    start = (i * 50) % len(ids)
+    data = {'action': 'approve' if i % 2 else 'reject', 'ids': ids[start:start + 50]}
+    return client.post('/moderation/', data, content_type='application/json', **ctx.auth(i))
+
+
+@route('upload-start')
+def upload_start(client, ctx, i, item):
+    data = {'filename': 'clip.mp4', 'media_type': 'video', 'size': CHUNK_SIZE}
+    return client.post(f'/sharelink/{ctx.album(i).sharelink}/uploads/', data)
+
+
+@route('upload-status', prepare=sessions(filled=False))
+def upload_status(client, ctx, i, item):
+    return client.get(f'/sharelink/{item.album.sharelink}/uploads/{item.pk}/')
+
+
+@route('upload-chunk', prepare=sessions(filled=False))
+def upload_chunk(client, ctx, i, item):
+    return client.put(f'/sharelink/{item.album.sharelink}/uploads/{item.pk}/', os.urandom(CHUNK_SIZE),
+                      content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0')
+
+
+@route('upload-complete', prepare=sessions(filled=True))
+def upload_complete(client, ctx, i, item):
+    return client.post(f'/sharelink/{item.album.sharelink}/uploads/{item.pk}/complete/')
+
+
+@route('async-media-list')
+def async_media_list(client, ctx, i, item):
+    params = {'limit': 50, 'tag': WORDS[i % len(WORDS)]} if i % 2 else {'limit': 50}
+    return client.get(f'/async/sharelink/{ctx.album(i).sharelink}/', params, **ctx.auth(i))
+
+
+@route('async-upload-start')
+def async_upload_start(client, ctx, i, item):
+    data = {'filename': 'clip.mp4', 'media_type': 'video', 'size': CHUNK_SIZE}
+    return client.post(f'/async/sharelink/{ctx.album(i).sharelink}/uploads/', data)
+
+
+@route('async-upload-status', prepare=sessions(filled=False))
+def async_upload_status(client, ctx, i, item):
+    return client.get(f'/async/sharelink/{item.album.sharelink}/uploads/{item.pk}/')
+
+
+@route('async-upload-chunk', prepare=sessions(filled=False))
+def async_upload_chunk(client, ctx, i, item):
+    return client.put(f'/async/sharelink/{item.album.sharelink}/uploads/{item.pk}/', os.urandom(CHUNK_SIZE),
+                      content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0')
+
+
+@route('async-upload-complete', prepare=sessions(filled=True))
+def async_upload_complete(client, ctx, i, item):
+    return client.post(f'/async/sharelink/{item.album.sharelink}/uploads/{item.pk}/complete/')
+
+
+# Search and metrics
+
+@route('search')
+def search(client, ctx, i, item):
+    return client.get('/search/', {'q': WORDS[i % len(WORDS)]}, **ctx.auth(i))
+
+
+@route('metrics')
+def metrics(client, ctx, i, item):
+    return client.get('/metrics')
+
+
+def immediate_transactions(sender, connection, **kwargs):
+    """
+    Open the scratch database's transactions with BEGIN IMMEDIATE, as the
+    ``transaction_mode`` option of later Django versions does. A deferred
+    transaction that reads and then writes fails at once with "database is
+    locked" when another thread writes; an immediate one waits its turn.
+    """
+    connection._start_transaction_under_autocommit = lambda: connection.cursor().execute('BEGIN IMMEDIATE')
+
+
+def run_route(name, ctx, rng, requests, concurrency):
+    from django.db import connection
+    from django.test import Client
+
+    prepare, send, admin = ROUTES[name]
+    items = prepare(ctx, rng, requests) if prepare else [None] * requests
+    connection.close()
+
+    latencies, queries = [], []
+    statuses = Counter()
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        # Server errors come back as 500s to be counted, not raised
+        client = Client(raise_request_exception=False)
+        if admin:
+            client.force_login(ctx.admin)
+        try:
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                started = time.perf_counter()
+                response = send(client, ctx, index, items[index])
+                if response.streaming:
+                    # Exports and files are only done once the body is read
+                    for _ in response.streaming_content:
+                        pass
+                elapsed = time.perf_counter() - started
+                match = QUERIES_RE.search(response.get('Server-Timing', ''))
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[response.status_code] += 1
+                    # Error reports run queries of their own; only count real responses
+                    if match and response.status_code < 500:
+                        queries.append(int(match.group(1)))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    return {
+        'seconds': round(duration, 3),
+        'requests_per_second': round(requests / duration, 2),
+        'latency_ms': summarize(latencies),
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 2),
+            'p50': percentile(queries, 50),
+            'max': max(queries),
+        } if queries else None,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'error_rate': round(sum(count for code, count in statuses.items() if code >= 500) / requests, 4),
+    }
+
+
+def compare(result, baseline, tolerance, slack_ms):
+    """
+    Routes slower at p95 than the baseline allows, running more queries, or
+    failing more often with 5xx. Queries are compared at the median, so cold
+    caches on the first requests of a shorter run do not count as a
+    regression; they only cover successful responses, which is why errors
+    are checked on their own.
+    """
+    regressions = []
+    for name, current in result['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if not before:
+            continue
+        if current['error_rate'] > before.get('error_rate', 0):
+            regressions.append({'route': name, 'metric': 'error_rate', 'baseline': before.get('error_rate', 0),
+                                'current': current['error_rate']})
+        limit = before['latency_ms']['p95'] * (1 + tolerance) + slack_ms
+        if current['latency_ms']['p95'] > limit:
+            regressions.append({'route': name, 'metric': 'p95_ms', 'baseline': before['latency_ms']['p95'],
+                                'current': current['latency_ms']['p95']})
+        if before['queries'] and current['queries'] and current['queries']['p50'] > before['queries']['p50']:
+            regressions.append({'route': name, 'metric': 'queries', 'baseline': before['queries']['p50'],
+                                'current': current['queries']['p50']})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--albums', type=int, default=3, help='Albums per user')
+    parser.add_argument('--media', type=int, default=200, help='Media items per album')
+    parser.add_argument('--image-size', type=int, default=256, help='Edge of the seeded images in pixels')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--routes', help='Comma separated route names (default: all)')
+    parser.add_argument('--output', help='Write the JSON result here as well as to stdout')
+    parser.add_argument('--baseline', help='Compare against this stored result')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative p95 growth over the baseline')
+    parser.add_argument('--slack-ms', type=float, default=25, help='Allowed absolute p95 growth on top of --tolerance')
+    parser.add_argument('--update-baseline', action='store_true', help='Store this run as the baseline')
+    args = parser.parse_args()
+
+    names = args.routes.split(',') if args.routes else list(ROUTES)
+    unknown = set(names) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Memory.settings')
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment(debug=False)
+    scratch = tempfile.mkdtemp()
+    settings.MEDIA_ROOT = os.path.join(scratch, 'media')
+    settings.CHUNKED_UPLOAD_DIR = os.path.join(scratch, 'chunks')
+    # All client threads share one process, so password hashing queues rather
+    # than sheds load; otherwise 503s would depend on the machine's core count
+    settings.PASSWORD_HASH_WAIT = 60
+    # A file database so the client threads share it without table locks
+    connection.settings_dict['TEST']['NAME'] = os.path.join(scratch, 'bench.sqlite3')
+    connection.settings_dict['OPTIONS']['timeout'] = 60
+    connection_created.connect(immediate_transactions)
+    old_name = connection.creation.create_test_db(verbosity=0)
+    with connection.cursor() as cursor:
+        # Readers do not block the writer, nor the writer the readers
+        cursor.execute('PRAGMA journal_mode=WAL')
+    try:
+        rng = random.Random(args.seed)
+        ctx = seed(rng, args.users, args.albums, args.media, args.image_size)
+        config = {key: getattr(args, key) for key in
+                  ('seed', 'users', 'albums', 'media', 'image_size', 'requests', 'concurrency')}
+        result = {'config': config, 'routes': {}}
+        for name in names:
+            result['routes'][name] = run_route(name, ctx, rng, args.requests, args.concurrency)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    failed = False
+    if args.baseline and not args.update_baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        if baseline.get('config') != result['config']:
+            print('warning: baseline was recorded with different arguments', file=sys.stderr)
+        result['regressions'] = compare(result, baseline, args.tolerance, args.slack_ms)
+        failed = bool(result['regressions'])
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(output + '\n')
+    if args.update_baseline:
+        if not args.baseline:
+            parser.error('--update-baseline needs --baseline')
+        with open(args.baseline, 'w') as fh:
+            fh.write(output + '\n')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
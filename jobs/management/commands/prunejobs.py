@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Delete finished jobs older than JOB_RETENTION in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Jobs deleted per query')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Queue a recurring prune job for runjobs instead of pruning now')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        if options['schedule']:
+            if Job.objects.filter(task='jobs.prune', status='queued').exists():
+                self.stdout.write('A prune job is already queued')
+                return
+            Job.objects.enqueue('jobs.prune', {'chunk_size': options['chunk_size']})
+            self.stdout.write(self.style.SUCCESS('Queued a recurring prune job'))
+            return
+        deleted = Job.objects.prune(settings.JOB_RETENTION, options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} finished jobs'))
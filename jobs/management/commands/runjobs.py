@@ -0,0 +1,78 @@
+import logging
+import os
+import signal
+import socket
+import threading
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from jobs.models import Job
+from jobs.registry import tasks
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs queued in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2,
+                            help='Number of worker threads')
+        parser.add_argument('--visibility-timeout', type=int, default=300,
+                            help='Seconds a claimed job stays hidden before another worker may retry it')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the queue is empty instead of polling')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: self.stop.set())
+
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        threads = [
+            threading.Thread(target=self.work, args=(f'{prefix}:{i}', options), daemon=True)
+            for i in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+    def work(self, worker_id, options):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = Job.objects.claim(worker_id, options['visibility_timeout'])
+                if job is None:
+                    if options['burst']:
+                        return
+                    self.stop.wait(options['poll_interval'])
+                    continue
+                self.run(job)
+        finally:
+            connection.close()
+
+    def run(self, job):
+        handler = tasks.get(job.task)
+        if handler is None:
+            job.mark_failed(f'Unknown task {job.task!r}', retry=False)
+            return
+        if job.attempts > job.max_attempts:
+            # Only reachable when earlier attempts kept outliving the visibility timeout
+            job.mark_failed('Visibility timeout exceeded on every attempt', retry=False)
+            return
+        try:
+            handler(**job.payload)
+        except Exception:
+            logger.exception('Job %s failed on attempt %s', job, job.attempts)
+            job.mark_failed(traceback.format_exc())
+        else:
+            job.mark_done()
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+class JobManager(models.Manager):
+    def enqueue(self, task, payload=None, run_after=None, max_attempts=5):
+        """
+        Queue ``task`` with a JSON payload. Called inside a transaction, the
+        job only becomes visible to workers if that transaction commits.
+        """
+        return self.create(
+            task=task,
+            payload=payload or {},
+            run_after=run_after or timezone.now(),
+            max_attempts=max_attempts,
+        )
+
+    def claimable(self, now):
+        # Queued jobs that are due, plus running jobs whose worker let the
+        # visibility timeout lapse (crashed or stuck).
+        return self.filter(
+            Q(status='queued', run_after__lte=now) | Q(status='running', locked_until__lt=now)
+        )
+
+    def claim(self, worker_id, visibility_timeout, batch=10):
+        """
+        Lock the next due job for ``worker_id``. The conditional UPDATE means
+        only one worker wins a given row, without needing SELECT ... FOR UPDATE.
+        """
+        now = timezone.now()
+        candidates = self.claimable(now).order_by('run_after', 'id').values_list('pk', flat=True)[:batch]
+        for pk in candidates:
+            claimed = self.claimable(now).filter(pk=pk).update(
+                status='running',
+                locked_by=worker_id,
+                locked_until=now + timedelta(seconds=visibility_timeout),
+                attempts=F('attempts') + 1,
+                updated_at=now,
+            )
+            if claimed:
+                return self.get(pk=pk)
+        return None
+
+    def prune(self, max_age, chunk_size=1000):
+        """
+        Delete jobs that finished more than ``max_age`` seconds ago,
+        ``chunk_size`` at a time. Failed jobs are kept for inspection.
+        Returns how many were deleted.
+        """
+        cutoff = timezone.now() - timedelta(seconds=max_age)
+        deleted = 0
+        while True:
+            pks = list(
+                self.filter(status='done', updated_at__lt=cutoff).order_by('updated_at')
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not pks:
+                return deleted
+            deleted += self.filter(pk__in=pks).delete()[0]
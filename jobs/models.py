@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.db import models
+from django.utils import timezone
+from jobs.manager import JobManager
+
+
+class Job(models.Model):
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    )
+    RETRY_BACKOFF = 30  # seconds, doubled after every failed attempt
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = JobManager()
+
+    def __str__(self):
+        return f'{self.task} #{self.pk} ({self.status})'
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+            models.Index(fields=['status', 'locked_until'], name='job_status_locked_idx'),
+            models.Index(fields=['status', 'updated_at'], name='job_status_updated_idx'),
+        ]
+
+    def _owned(self):
+        # A worker that overran its visibility timeout may have lost the job
+        # to another worker; only the current holder may record the outcome.
+        return Job.objects.filter(pk=self.pk, status='running', locked_by=self.locked_by, attempts=self.attempts)
+
+    def mark_done(self):
+        return self._owned().update(
+            status='done', locked_by='', locked_until=None, last_error='', updated_at=timezone.now()
+        )
+
+    def mark_failed(self, error, retry=True):
+        now = timezone.now()
+        if not retry or self.attempts >= self.max_attempts:
+            return self._owned().update(
+                status='failed', locked_by='', locked_until=None, last_error=error, updated_at=now
+            )
+        delay = timedelta(seconds=self.RETRY_BACKOFF * 2 ** (self.attempts - 1))
+        return self._owned().update(
+            status='queued', locked_by='', locked_until=None, last_error=error,
+            run_after=now + delay, updated_at=now,
+        )
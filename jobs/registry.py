@@ -0,0 +1,9 @@
+tasks = {}
+
+
+def task(name):
+    """Register a function as the handler for jobs queued under ``name``."""
+    def decorator(func):
+        tasks[name] = func
+        return func
+    return decorator
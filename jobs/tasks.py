@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from jobs.models import Job
+from jobs.registry import task
+
+
+@task('jobs.prune')
+def prune_jobs(chunk_size=1000, reschedule=True):
+    Job.objects.prune(settings.JOB_RETENTION, chunk_size)
+    if reschedule and not Job.objects.filter(task='jobs.prune', status='queued').exists():
+        Job.objects.enqueue(
+            'jobs.prune',
+            {'chunk_size': chunk_size},
+            run_after=timezone.now() + timedelta(seconds=settings.JOB_PRUNE_INTERVAL),
+        )
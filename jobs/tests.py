@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from jobs.models import Job
+from jobs.registry import task
+
+# Create your tests here.
+
+calls = []
+
+
+@task('jobs.test_record')
+def record(value):
+    calls.append(value)
+
+
+@task('jobs.test_fail')
+def fail():
+    raise RuntimeError('task failed')
+
+
+class JobQueueTest(TestCase):
+
+    def test_claim_locks_the_job_for_one_worker(self):
+        queued = Job.objects.enqueue('jobs.test_record', {'value': 1})
+        Job.objects.enqueue('jobs.test_record', {'value': 2}, run_after=timezone.now() + timedelta(hours=1))
+
+        job = Job.objects.claim('worker-a', visibility_timeout=60)
+        self.assertEqual(job.pk, queued.pk)
+        self.assertEqual((job.status, job.locked_by, job.attempts), ('running', 'worker-a', 1))
+        # The other job is not due yet
+        self.assertIsNone(Job.objects.claim('worker-b', visibility_timeout=60))
+
+    def test_lapsed_visibility_timeout_is_reclaimed(self):
+        Job.objects.enqueue('jobs.test_record', {'value': 1})
+        stuck = Job.objects.claim('worker-a', visibility_timeout=60)
+        Job.objects.filter(pk=stuck.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        job = Job.objects.claim('worker-b', visibility_timeout=60)
+        self.assertEqual((job.pk, job.locked_by, job.attempts), (stuck.pk, 'worker-b', 2))
+        # Only the current holder may record the outcome
+        self.assertEqual(stuck.mark_done(), 0)
+        self.assertEqual(job.mark_done(), 1)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'done')
+
+    def test_failures_back_off_then_give_up(self):
+        Job.objects.enqueue('jobs.test_fail', max_attempts=2)
+        job = Job.objects.claim('worker', visibility_timeout=60)
+        job.mark_failed('first')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_error), ('queued', 'first'))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=Job.RETRY_BACKOFF - 5))
+        self.assertIsNone(Job.objects.claim('worker', visibility_timeout=60))
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        job = Job.objects.claim('worker', visibility_timeout=60)
+        job.mark_failed('second')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), ('failed', 2, 'second'))
+
+    def test_prune_keeps_recent_and_failed_jobs(self):
+        old = timezone.now() - timedelta(days=30)
+        done = Job.objects.enqueue('jobs.test_record', {'value': 1})
+        failed = Job.objects.enqueue('jobs.test_fail')
+        recent = Job.objects.enqueue('jobs.test_record', {'value': 2})
+        Job.objects.filter(pk__in=[done.pk, failed.pk]).update(updated_at=old)
+        Job.objects.filter(pk__in=[done.pk, recent.pk]).update(status='done')
+        Job.objects.filter(pk=failed.pk).update(status='failed')
+
+        self.assertEqual(Job.objects.prune(7 * 24 * 3600, chunk_size=1), 1)
+        self.assertEqual(set(Job.objects.values_list('pk', flat=True)), {failed.pk, recent.pk})
+
+
+class RunJobsTest(TransactionTestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_burst_runs_every_due_job(self):
+        ok = Job.objects.enqueue('jobs.test_record', {'value': 'ok'})
+        failing = Job.objects.enqueue('jobs.test_fail', max_attempts=1)
+        unknown = Job.objects.enqueue('jobs.missing')
+
+        with self.assertLogs('jobs.management.commands.runjobs', 'ERROR'):
+            call_command('runjobs', burst=True, concurrency=1)
+
+        self.assertEqual(calls, ['ok'])
+        statuses = dict(Job.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {ok.pk: 'done', failing.pk: 'failed', unknown.pk: 'failed'})
+        self.assertIn('RuntimeError: task failed', Job.objects.get(pk=failing.pk).last_error)
+        self.assertIn("Unknown task 'jobs.missing'", Job.objects.get(pk=unknown.pk).last_error)
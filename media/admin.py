@@ -1,5 +1,13 @@
 from django.contrib import admin
-from media.models import Media
+from media.models import Media, MediaTag
 # Register your models here.
 
-admin.site.register(Media)
+
+class MediaAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Keep the tag index in step with edits made here
+        MediaTag.objects.sync([obj], created=not change)
+
+
+admin.site.register(Media, MediaAdmin)
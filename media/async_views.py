@@ -0,0 +1,221 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from account.asyncapi import AsyncAPIView
+from album.cache import aresolve_sharelink
+from .cache import LISTING_TIMEOUT, amedia_listing_version, listing_cache_key
+from .manager import parse_tags
+from .models import Blob, Media, MediaTag, UploadSession
+from .pagination import MediaKeysetPagination
+from .serializers import MediaSerializer, UploadSessionSerializer
+from .metadata import file_metadata
+from .uploads import QUOTA_MESSAGE, aappend_chunk, discard_upload, finish_upload, release_quota, reserve_quota
+
+# Async counterparts of the sharelink and upload views in media.views, for the
+# ASGI entry point. They answer the same requests with the same payloads; the
+# sync views stay in place for WSGI deployments.
+
+
+class AsyncMediaView(AsyncAPIView):
+    public_methods = ('POST',)
+    pagination_class = MediaKeysetPagination
+
+    async def get(self, request, *args, **kwargs):
+        album = await aresolve_sharelink(kwargs.get('sharelink'))
+        if album is None:
+            return JsonResponse({'message': 'Album not found'}, status=404)
+
+        # Unchanged polls are answered from the album version alone
+        etag, last_modified = await amedia_listing_version(album)
+        etag = quote_etag(etag)
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified.timestamp())
+        )
+        if not_modified is not None:
+            return self.with_validators(not_modified, etag, last_modified)
+
+        cache_key = listing_cache_key(album, etag, request)
+        payload = await cache.aget(cache_key)
+        if payload is None:
+            all_media = Media.objects.filter(album=album).select_related('album', 'blob')
+            tags = parse_tags(request.query_params.get('tag'))
+            if tags:
+                all_media = all_media.filter(id__in=MediaTag.objects.tagged(album.pk, tags))
+
+            paginator = self.pagination_class()
+            page = await paginator.apaginate_queryset(all_media, request, view=self)
+            serializer = MediaSerializer(page, many=True, context={'request': request})
+            payload = {
+                'data': serializer.data,
+                'next': paginator.get_next_link(),
+                'message': 'Media content retrieved successfully'
+            }
+            await cache.aset(cache_key, payload, LISTING_TIMEOUT)
+
+        return self.with_validators(JsonResponse(payload, status=200), etag, last_modified)
+
+    def with_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    async def post(self, request, *args, **kwargs):
+        album = await aresolve_sharelink(kwargs.get('sharelink'))
+        if album is None:
+            return JsonResponse({'message': 'Album not found'}, status=404)
+        upload = request.FILES.get('file')
+        size = upload.size if upload is not None else 0
+        if not await sync_to_async(reserve_quota)(album, size):
+            return JsonResponse({'message': QUOTA_MESSAGE}, status=413)
+
+        # The body was already received without holding a thread; only
+        # validation, storing the file and the inserts run on one
+        try:
+            status, payload = await sync_to_async(self.create_media)(request, album)
+        finally:
+            await sync_to_async(release_quota)(album.pk, size)
+        return JsonResponse(payload, status=status)
+
+    def create_media(self, request, album):
+        serializer = MediaSerializer(data=request.data, context={'request': request, 'view': self})
+        if not serializer.is_valid():
+            return 400, serializer.errors
+        serializer.save(album=album)
+        return 201, {
+            'data': serializer.data,
+            'message': 'Media content added successfully'
+        }
+
+
+class AsyncUploadSessionView(AsyncAPIView):
+    public_methods = ('POST',)
+
+    async def post(self, request, *args, **kwargs):
+        album = await aresolve_sharelink(kwargs.get('sharelink'))
+        if album is None:
+            return JsonResponse({'message': 'Album not found'}, status=404)
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+        if not await sync_to_async(reserve_quota)(album, serializer.validated_data['size']):
+            return JsonResponse({'message': QUOTA_MESSAGE}, status=413)
+        serializer.instance = await UploadSession.objects.acreate(album=album, **serializer.validated_data)
+        return JsonResponse({
+            'data': serializer.data,
+            'message': 'Upload started'
+        }, status=201)
+
+
+class AsyncUploadChunkView(AsyncAPIView):
+    public_methods = ('GET', 'PUT', 'DELETE')
+
+    async def get_session(self, **kwargs):
+        return await UploadSession.objects.filter(
+            pk=kwargs.get('upload_id'), album__sharelink=kwargs.get('sharelink'),
+            album__deleted_at__isnull=True,
+        ).afirst()
+
+    async def get(self, request, *args, **kwargs):
+        session = await self.get_session(**kwargs)
+        if session is None:
+            return JsonResponse({'message': 'Upload not found'}, status=404)
+        response = JsonResponse({
+            'data': UploadSessionSerializer(session).data,
+            'message': 'Upload in progress'
+        }, status=200)
+        response['Upload-Offset'] = str(session.offset)
+        return response
+
+    async def put(self, request, *args, **kwargs):
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return JsonResponse({'message': 'Content-Length and Upload-Offset headers are required'}, status=400)
+
+        session = await self.get_session(**kwargs)
+        if session is None:
+            return JsonResponse({'message': 'Upload not found'}, status=404)
+        if offset == session.offset and session.offset + length > session.size:
+            return JsonResponse({'message': 'Chunk exceeds the declared file size'}, status=413)
+        # The body is streamed from the request onto the part file off the event loop
+        if offset != session.offset or await aappend_chunk(session, request._request, length) is None:
+            current = await UploadSession.objects.filter(pk=session.pk).values_list('offset', flat=True).afirst()
+            response = JsonResponse({
+                'data': {'offset': current},
+                'message': 'Upload-Offset does not match the stored offset'
+            }, status=409)
+            response['Upload-Offset'] = str(current)
+            return response
+
+        response = JsonResponse({
+            'data': UploadSessionSerializer(session).data,
+            'message': 'Chunk stored'
+        }, status=200)
+        response['Upload-Offset'] = str(session.offset)
+        return response
+
+    async def delete(self, request, *args, **kwargs):
+        session = await self.get_session(**kwargs)
+        if session is None:
+            return JsonResponse({'message': 'Upload not found'}, status=404)
+        await asyncio.to_thread(discard_upload, session)
+        await session.adelete()
+        return HttpResponse(status=204)
+
+
+class AsyncUploadCompleteView(AsyncAPIView):
+    public_methods = ('POST',)
+
+    async def post(self, request, *args, **kwargs):
+        session = await UploadSession.objects.filter(
+            pk=kwargs.get('upload_id'), album__sharelink=kwargs.get('sharelink'),
+            album__deleted_at__isnull=True,
+        ).afirst()
+        if session is None:
+            return JsonResponse({'message': 'Upload not found'}, status=404)
+        if not session.is_complete:
+            return JsonResponse({
+                'data': {'offset': session.offset, 'size': session.size},
+                'message': 'Upload is incomplete'
+            }, status=409)
+
+        # Re-hashing a part file that lost its cached digest is file work, not ORM work
+        checksum, upload = await asyncio.to_thread(finish_upload, session)
+        expected = request.data.get('checksum')
+        if expected and expected.lower() != checksum:
+            upload.close()
+            return JsonResponse({'message': 'Checksum mismatch'}, status=400)
+
+        try:
+            status, payload = await sync_to_async(self.create_media)(request, session, upload, checksum)
+        finally:
+            upload.close()
+        if status == 201:
+            await asyncio.to_thread(discard_upload, session)
+            await session.adelete()
+        return JsonResponse(payload, status=status)
+
+    def create_media(self, request, session, upload, checksum):
+        data = {
+            'file': upload,
+            'media_type': session.media_type,
+            'description': session.description,
+            'tags': session.tags,
+        }
+        serializer = MediaSerializer(data=data, context={'request': request, 'view': self})
+        if not serializer.is_valid():
+            return 400, serializer.errors
+        metadata = file_metadata(upload)
+        blob = Blob.objects.acquire(upload, checksum=checksum)
+        serializer.save(blob=blob, file=blob.file.name, **metadata)
+        return 201, {
+            'data': serializer.data,
+            'checksum': checksum,
+            'message': 'Media content added successfully'
+        }
@@ -0,0 +1,73 @@
+import hashlib
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+from media.models import Media
+
+LISTING_TIMEOUT = 300
+
+
+def _generation_key(album_id):
+    return f'media-listing:{album_id}:generation'
+
+
+def _changed_key(album_id):
+    return f'media-listing:{album_id}:changed'
+
+
+def invalidate_media_listing(album_id):
+    """
+    Orphan every cached listing of the album by moving it to a new generation,
+    and move its Last-Modified forward.
+    """
+    key = _generation_key(album_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+    # At least a second past the previous value, since HTTP dates drop the
+    # fraction: two changes within one second must still differ
+    changed = timezone.now()
+    previous = cache.get(_changed_key(album_id))
+    if previous is not None:
+        changed = max(changed, previous + timedelta(seconds=1))
+    cache.set(_changed_key(album_id), changed, None)
+
+
+def media_listing_version(album):
+    """
+    Return the (etag, last_modified) pair for an album's media listing.
+
+    The aggregate is answered from the (album, updated_at, id) index. Its count
+    catches deletes that leave the latest timestamp alone, and the generation
+    catches changes made without touching Media rows, like derivatives landing.
+    Last-Modified comes from the time of the last invalidation rather than the
+    rows, so deleting the newest item cannot move it backwards.
+    """
+    stats = Media.objects.filter(album=album).aggregate(latest=Max('updated_at'), count=Count('id'))
+    generation = cache.get_or_set(_generation_key(album.pk), 0, None)
+    changed = cache.get_or_set(_changed_key(album.pk), timezone.now, None)
+    return _version(album, stats, generation, changed)
+
+
+async def amedia_listing_version(album):
+    """media_listing_version() for async views."""
+    stats = await Media.objects.filter(album=album).aaggregate(latest=Max('updated_at'), count=Count('id'))
+    generation = await cache.aget_or_set(_generation_key(album.pk), 0, None)
+    changed = await cache.aget_or_set(_changed_key(album.pk), timezone.now, None)
+    return _version(album, stats, generation, changed)
+
+
+def _version(album, stats, generation, changed):
+    last_modified = max(album.updated_at, changed)
+    latest = stats['latest'].isoformat() if stats['latest'] else ''
+    raw = f"{album.pk}:{last_modified.isoformat()}:{latest}:{stats['count']}:{generation}"
+    return hashlib.md5(raw.encode()).hexdigest(), last_modified
+
+
+def listing_cache_key(album, etag, request):
+    # The page (cursor, limit) and the absolute URLs inside it depend on the full URI
+    uri = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'media-listing:{album.pk}:{etag}:{uri}'
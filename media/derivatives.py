@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+from django.dispatch import Signal
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+# Sent with the model class as sender and ``pk`` once a derivative is recorded
+derivatives_ready = Signal()
+
+# (name, bounding box, format) for every derivative generated from an image
+DERIVATIVE_SPECS = (
+    ('thumbnail', (320, 320), 'JPEG'),
+    ('medium', (1280, 1280), 'JPEG'),
+    ('webp', (1280, 1280), 'WEBP'),
+)
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+_executor = None
+_executor_lock = threading.Lock()
+_record_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn keeps the workers free of the parent's DB connections and threads
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.DERIVATIVE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def derivative_name(source_name, kind, fmt):
+    base = os.path.splitext(source_name)[0]
+    return os.path.join('derivatives', base, f'{kind}.{FORMAT_EXTENSIONS[fmt]}')
+
+
+def is_image(name):
+    return os.path.splitext(name)[1].lower() in Image.registered_extensions()
+
+
+def render_derivative(source_path, target_path, size, fmt):
+    """Resize one image into ``target_path``. Runs inside the worker processes."""
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size)
+        if fmt == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        temp_path = f'{target_path}.{os.getpid()}.tmp'
+        image.save(temp_path, fmt, quality=85)
+    os.replace(temp_path, target_path)
+    return target_path
+
+
+def record_derivative(model, pk, field, source, kind, name):
+    """Add a rendered derivative to the ``field`` JSON of the row. Returns False if it is gone."""
+    with _record_lock:
+        current = model.objects.filter(pk=pk).values_list(field, flat=True).first()
+        # The source may have been replaced while this derivative was rendering
+        if current is None or current.get('source') != source:
+            return False
+        current[kind] = name
+        model.objects.filter(pk=pk).update(**{field: current})
+    derivatives_ready.send(sender=model, pk=pk)
+    return True
+
+
+def generate_derivatives(instance, file_field, target_field):
+    """
+    Start rendering every derivative of ``instance.<file_field>``. Returns a
+    (kind, name, future) triple per render; the caller records each finished
+    one with record_derivative().
+    """
+    fieldfile = getattr(instance, file_field)
+    if not fieldfile or not is_image(fieldfile.name):
+        return []
+
+    storage = fieldfile.storage
+    source = fieldfile.name
+    type(instance).objects.filter(pk=instance.pk).update(**{target_field: {'source': source}})
+
+    renders = []
+    for kind, size, fmt in DERIVATIVE_SPECS:
+        name = derivative_name(source, kind, fmt)
+        args = (fieldfile.path, storage.path(name), size, fmt)
+        if settings.DERIVATIVE_WORKERS:
+            future = get_executor().submit(render_derivative, *args)
+        else:
+            future = Future()
+            try:
+                future.set_result(render_derivative(*args))
+            except Exception as exc:
+                future.set_exception(exc)
+        renders.append((kind, name, future))
+    return renders
+
+
+def media_file_url(sharelink, media_id, variant=None, request=None):
+    """
+    URL of a media file, or one of its derivatives, through MediaFileView, which
+    applies the album's privacy and the item's approval on every request.
+    """
+    url = reverse('sharelink-file', kwargs={'sharelink': sharelink, 'pk': media_id})
+    if variant:
+        url = f'{url}?variant={variant}'
+    return request.build_absolute_uri(url) if request else url
+
+
+def media_derivative_urls(sharelink, media_id, derivatives, request=None):
+    return {
+        kind: media_file_url(sharelink, media_id, kind, request)
+        for kind in (derivatives or {}) if kind != 'source'
+    }
+
+
+def derivative_urls(derivatives, storage, request=None):
+    urls = {}
+    for kind, name in (derivatives or {}).items():
+        if kind == 'source':
+            continue
+        url = storage.url(name)
+        urls[kind] = request.build_absolute_uri(url) if request else url
+    return urls
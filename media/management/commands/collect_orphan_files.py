@@ -0,0 +1,71 @@
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from media.reclaim import referenced_names, remove_unreferenced
+
+
+def stored_files(root, cutoff, skip=()):
+    """
+    Yield (path, size) for the files under ``root`` last modified
+    before ``cutoff``. Directories are read lazily, one level at a time, so
+    memory does not grow with the number of files.
+    """
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.path not in skip:
+                    yield from stored_files(entry.path, cutoff, skip)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime < cutoff:
+                    yield entry.path, stat.st_size
+
+
+class Command(BaseCommand):
+    help = 'Delete files under MEDIA_ROOT that no database row refers to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Files checked against the database per round of queries')
+        parser.add_argument('--min-age', type=int, default=24 * 3600,
+                            help='Seconds since a file was last modified before it may be reclaimed; '
+                                 'uploads are written before their rows commit')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report orphaned files without deleting them')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        if options['min_age'] < 0:
+            raise CommandError('--min-age must not be negative')
+        root = os.path.abspath(settings.MEDIA_ROOT)
+        if not os.path.isdir(root):
+            raise CommandError(f'MEDIA_ROOT {root} is not a directory')
+
+        # Partial uploads are named after their session, not a stored file
+        skip = {os.path.abspath(settings.CHUNKED_UPLOAD_DIR)}
+        cutoff = time.time() - options['min_age']
+        files = stored_files(root, cutoff, skip)
+        scanned = orphaned = reclaimed = 0
+        while True:
+            batch = list(islice(files, options['batch_size']))
+            if not batch:
+                break
+            scanned += len(batch)
+            names = {os.path.relpath(path, root).replace(os.sep, '/'): (path, size) for path, size in batch}
+            orphans = names.keys() - referenced_names(list(names))
+            if not options['dry_run']:
+                # Checked again once out of reach, in case an upload reused one meanwhile
+                orphans = remove_unreferenced({name: names[name][0] for name in orphans}, cutoff)
+            for name in orphans:
+                self.stdout.write(name)
+                orphaned += 1
+                reclaimed += names[name][1]
+
+        verb = 'would be reclaimed' if options['dry_run'] else 'reclaimed'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} files, {orphaned} orphaned, {reclaimed} bytes {verb}'
+        ))
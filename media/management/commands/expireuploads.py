@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from jobs.models import Job
+from media.uploads import expire_uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned resumable upload sessions and their part files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Sessions deleted per query')
+        parser.add_argument('--max-age', type=int, default=None,
+                            help='Seconds without a chunk before a session expires (default UPLOAD_SESSION_TTL)')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Queue a recurring expiry job for runjobs instead of expiring now')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        if options['schedule']:
+            if Job.objects.filter(task='media.expire_uploads', status='queued').exists():
+                self.stdout.write('An expiry job is already queued')
+                return
+            Job.objects.enqueue('media.expire_uploads', {'chunk_size': options['chunk_size']})
+            self.stdout.write(self.style.SUCCESS('Queued a recurring expiry job'))
+            return
+        max_age = settings.UPLOAD_SESSION_TTL if options['max_age'] is None else options['max_age']
+        if max_age < 0:
+            raise CommandError('--max-age must not be negative')
+        expired = expire_uploads(max_age, options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} upload sessions'))
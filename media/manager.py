@@ -0,0 +1,138 @@
+import time
+from collections import Counter
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.db.models.signals import post_save
+
+from jobs.models import Job
+from media.storage import hash_content
+
+TAG_MAX_LENGTH = 50
+
+
+def parse_tags(text):
+    """Split a comma separated tags string into unique, lowercased tag names."""
+    names = (name.strip().lower()[:TAG_MAX_LENGTH] for name in (text or '').split(','))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+class BlobManager(models.Manager):
+    def acquire(self, content, checksum=None):
+        """
+        Return the Blob holding ``content``, writing it to storage only if no
+        identical file is stored yet. Each call takes one reference.
+        """
+        checksum = checksum or hash_content(content)
+        if self.filter(checksum=checksum).update(ref_count=F('ref_count') + 1):
+            return self.get(checksum=checksum)
+
+        blob = self.model(checksum=checksum, size=content.size, ref_count=1)
+        blob.file.save(content.name, content, save=False)
+        try:
+            with transaction.atomic():
+                blob.save()
+        except IntegrityError:
+            # Another upload of the same bytes created the row first
+            self.filter(checksum=checksum).update(ref_count=F('ref_count') + 1)
+            return self.get(checksum=checksum)
+        return blob
+
+    def acquire_many(self, contents):
+        """
+        Batch form of ``acquire``: one lookup for all known checksums, one
+        UPDATE for their counts and one INSERT for the new ones. Returns a Blob
+        per content, or the exception that kept that content from being stored.
+        """
+        checksums = [hash_content(content) for content in contents]
+        counts = Counter(checksums)
+        results = self.in_bulk(list(counts), field_name='checksum')
+        if results:
+            self.filter(checksum__in=list(results)).update(ref_count=F('ref_count') + Case(
+                *[When(checksum=checksum, then=Value(counts[checksum])) for checksum in results],
+                default=Value(0), output_field=IntegerField(),
+            ))
+
+        new = []
+        for content, checksum in zip(contents, checksums):
+            if checksum in results:
+                continue
+            blob = self.model(checksum=checksum, size=content.size, ref_count=counts[checksum])
+            try:
+                blob.file.save(content.name, content, save=False)
+            except Exception as exc:
+                results[checksum] = exc
+                continue
+            results[checksum] = blob
+            new.append(blob)
+
+        try:
+            with transaction.atomic():
+                self.bulk_create(new)
+        except IntegrityError:
+            # A concurrent upload created some of these rows; settle them one by one
+            for blob in new:
+                if self.filter(checksum=blob.checksum).update(ref_count=F('ref_count') + counts[blob.checksum]):
+                    results[blob.checksum] = self.get(checksum=blob.checksum)
+                else:
+                    blob.save()
+        else:
+            # bulk_create skips post_save, which is what queues derivative rendering
+            for blob in new:
+                post_save.send(sender=self.model, instance=blob, created=True, update_fields=None, raw=False, using=self.db)
+
+        return [results[checksum] for checksum in checksums]
+
+    def release(self, pk):
+        """Drop one reference, removing the row and file once nothing uses them."""
+        with transaction.atomic():
+            self.filter(pk=pk).update(ref_count=F('ref_count') - 1)
+            blob = self.filter(pk=pk, ref_count__lte=0).first()
+            if blob is not None:
+                blob.delete()
+                Job.objects.enqueue('media.delete_files', {'names': blob.stored_names(), 'released_at': time.time()})
+
+
+class MediaTagManager(models.Manager):
+    def tagged(self, album_id, names):
+        """
+        Ids of the album's media carrying every tag in ``names``, as a subquery
+        over the tag index.
+        """
+        return (
+            self.filter(album_id=album_id, tag__name__in=names)
+            .values('media_id')
+            .annotate(matched=Count('tag_id'))
+            .filter(matched=len(names))
+            .values('media_id')
+        )
+
+    def sync(self, items, created=False):
+        """
+        Make the tag index of each Media item match its ``tags`` text. Costs a
+        fixed number of queries however many items and tags there are; pass
+        ``created=True`` for new items to skip looking up their old tags.
+        """
+        wanted = {media.pk: parse_tags(media.tags) for media in items}
+        names = {name for tags in wanted.values() for name in tags}
+        tag_ids = {}
+        if names:
+            Tag = self.model._meta.get_field('tag').related_model
+            Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+            tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+
+        desired = {(media.pk, tag_ids[name]) for media in items for name in wanted[media.pk]}
+        existing = set() if created else set(self.filter(media_id__in=wanted).values_list('media_id', 'tag_id'))
+
+        stale = existing - desired
+        if stale:
+            condition = Q()
+            for media_id, tag_id in stale:
+                condition |= Q(media_id=media_id, tag_id=tag_id)
+            self.filter(condition).delete()
+
+        album_ids = {media.pk: media.album_id for media in items}
+        self.bulk_create([
+            self.model(media_id=media_id, tag_id=tag_id, album_id=album_ids[media_id])
+            for media_id, tag_id in desired - existing
+        ])
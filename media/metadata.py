@@ -0,0 +1,30 @@
+import mimetypes
+
+from PIL import Image
+
+DEFAULT_MIME_TYPE = 'application/octet-stream'
+
+
+def file_metadata(content):
+    """
+    Size, MIME type and pixel dimensions of an uploaded file, read once at
+    upload time so nothing later has to open or stat the stored file. Images
+    are identified from their header; the pixel data is never decoded.
+    """
+    metadata = {
+        'size': content.size,
+        'mime_type': mimetypes.guess_type(content.name or '')[0] or DEFAULT_MIME_TYPE,
+        'width': None,
+        'height': None,
+    }
+    try:
+        content.seek(0)
+        with Image.open(content) as image:
+            metadata['width'], metadata['height'] = image.size
+            metadata['mime_type'] = Image.MIME.get(image.format, metadata['mime_type'])
+    except Exception:
+        # Videos, links and anything else PIL cannot identify keep the guess by name
+        pass
+    finally:
+        content.seek(0)
+    return metadata
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('album', '0001_initial'),
+        ('media', '0002_alter_media_options_alter_media_file'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='media',
+            options={'ordering': ['-updated_at', '-id'], 'verbose_name': 'Media Item', 'verbose_name_plural': 'Media Items'},
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(fields=['album', '-updated_at', '-id'], name='media_album_updated_idx'),
+        ),
+    ]
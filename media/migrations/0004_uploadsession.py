@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:02
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('album', '0001_initial'),
+        ('media', '0003_media_album_updated_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('media_type', models.CharField(choices=[('image', 'Image'), ('video', 'Video'), ('link', 'Link')], max_length=5)),
+                ('description', models.TextField(blank=True)),
+                ('tags', models.CharField(blank=True, max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('offset', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('album', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='album.album')),
+            ],
+        ),
+    ]
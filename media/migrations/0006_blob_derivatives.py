@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0005_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_tags(apps, schema_editor):
+    Media = apps.get_model('media', 'Media')
+    Tag = apps.get_model('media', 'Tag')
+    MediaTag = apps.get_model('media', 'MediaTag')
+    tag_ids = {}
+    links = []
+    for pk, album_id, text in Media.objects.exclude(tags='').values_list('id', 'album_id', 'tags').iterator():
+        names = dict.fromkeys(name.strip().lower()[:50] for name in text.split(','))
+        for name in filter(None, names):
+            if name not in tag_ids:
+                tag_ids[name] = Tag.objects.get_or_create(name=name)[0].pk
+            links.append(MediaTag(media_id=pk, album_id=album_id, tag_id=tag_ids[name]))
+        if len(links) >= 1000:
+            MediaTag.objects.bulk_create(links)
+            links = []
+    MediaTag.objects.bulk_create(links)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('album', '0002_album_cover_derivatives'),
+        ('media', '0006_blob_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MediaTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('album', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='album.album')),
+                ('media', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='media.media')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='media_links', to='media.tag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['album', 'tag', 'media'], name='media_tag_album_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mediatag',
+            constraint=models.UniqueConstraint(fields=('media', 'tag'), name='media_tag_unique'),
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('album', '0002_album_cover_derivatives'),
+        ('media', '0007_tag_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(condition=models.Q(('approval_status', 'pending')), fields=['album', '-updated_at', '-id'], name='media_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:48
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+
+from media.metadata import file_metadata
+
+
+def backfill_metadata(apps, schema_editor):
+    Blob = apps.get_model('media', 'Blob')
+    Media = apps.get_model('media', 'Media')
+    CustomUser = apps.get_model('account', 'CustomUser')
+
+    blobs = Blob.objects.filter(pk=OuterRef('blob_id'))
+    Media.objects.exclude(blob=None).update(
+        size=Subquery(blobs.values('size')), checksum=Subquery(blobs.values('checksum')),
+    )
+
+    # MIME type and dimensions need the file's header, read once here
+    batch = []
+    for media in Media.objects.only('id', 'file', 'size').iterator(chunk_size=500):
+        try:
+            with default_storage.open(media.file.name) as fh:
+                metadata = file_metadata(fh)
+        except OSError:
+            continue
+        for field, value in metadata.items():
+            setattr(media, field, value)
+        batch.append(media)
+        if len(batch) >= 500:
+            Media.objects.bulk_update(batch, ['size', 'mime_type', 'width', 'height'])
+            batch = []
+    Media.objects.bulk_update(batch, ['size', 'mime_type', 'width', 'height'])
+
+    totals = Media.objects.order_by().values('album__owner_id').annotate(total=Sum('size'))
+    for row in totals.iterator():
+        CustomUser.objects.filter(pk=row['album__owner_id']).update(storage_used=row['total'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0003_user_storage'),
+        ('media', '0008_media_pending_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='checksum',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='mime_type',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_metadata, migrations.RunPython.noop),
+    ]
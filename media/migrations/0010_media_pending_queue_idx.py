@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('album', '0004_album_deleted_at'),
+        ('media', '0009_media_file_metadata'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(condition=models.Q(('approval_status', 'pending')), fields=['-updated_at', '-id'], name='media_pending_queue_idx'),
+        ),
+    ]
@@ -1,7 +1,12 @@
 import os
+import uuid
+from django.conf import settings
 from django.db import models
 from album.models import Album
 from django.utils import timezone
+from media.manager import TAG_MAX_LENGTH, BlobManager, MediaTagManager
+from media.metadata import file_metadata
+from media.storage import ContentAddressedStorage, content_address
 
 def get_upload_path(instance, filename):
     # Get the file extension
@@ -11,6 +16,30 @@ def get_upload_path(instance, filename):
     # Return the full path
     return os.path.join('media', instance.media_type, instance.album.title, new_filename)
 
+def get_blob_path(instance, filename):
+    return content_address(instance.checksum, filename)
+
+class Blob(models.Model):
+    """
+    One stored file, shared by every Media item with identical bytes.
+    """
+    checksum = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=get_blob_path, storage=ContentAddressedStorage())
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = BlobManager()
+
+    def __str__(self):
+        return f'{self.checksum} ({self.ref_count} refs)'
+
+    def stored_names(self):
+        names = [self.file.name]
+        names += [name for kind, name in self.derivatives.items() if kind != 'source']
+        return names
+
 class Media(models.Model):
     MEDIA_TYPE_CHOICES = (
         ('image', 'Image'),
@@ -25,10 +54,18 @@ class Media(models.Model):
     
     album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='media')
     file = models.FileField(upload_to=get_upload_path)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='media')
     media_type = models.CharField(max_length=5, choices=MEDIA_TYPE_CHOICES)
     approval_status = models.CharField(max_length=10, choices=APPROVAL_STATUS, default='pending')
     description = models.TextField(blank=True)
     tags = models.CharField(max_length=255, blank=True)
+
+    # Recorded from the upload by file_metadata(), never read back from storage
+    size = models.PositiveBigIntegerField(default=0, editable=False)
+    mime_type = models.CharField(max_length=100, blank=True, editable=False)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    checksum = models.CharField(max_length=64, blank=True, editable=False)
     
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(default=timezone.now)
@@ -36,7 +73,102 @@ class Media(models.Model):
     def __str__(self):
         return f'{self.album.title} in {self.media_type.capitalize()}'
 
+    def save(self, *args, **kwargs):
+        # New uploads are stored by content; point the file at the shared blob
+        # so the FileField itself never writes.
+        if self.file and not self.file._committed and self.blob_id is None:
+            upload = self.file.file
+            for field, value in file_metadata(upload).items():
+                setattr(self, field, value)
+            self.blob = Blob.objects.acquire(upload)
+            self.file = self.blob.file.name
+        if not self.checksum and self.blob_id is not None:
+            self.checksum = self.blob.checksum
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored status, so a later save can tell the album's pending counter what changed
+        instance._saved_status = instance.__dict__.get('approval_status')
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._saved_status = self.__dict__.get('approval_status')
+
     class Meta:
         verbose_name = 'Media Item'
         verbose_name_plural = 'Media Items'
-        ordering = ['-updated_at']
\ No newline at end of file
+        ordering = ['-updated_at', '-id']
+        indexes = [
+            models.Index(fields=['album', '-updated_at', '-id'], name='media_album_updated_idx'),
+            # Only the moderation queue reads pending rows, so only they are indexed:
+            # per album with ?album=, and across all of the owner's albums by default
+            models.Index(
+                fields=['album', '-updated_at', '-id'], name='media_pending_idx',
+                condition=models.Q(approval_status='pending'),
+            ),
+            models.Index(
+                fields=['-updated_at', '-id'], name='media_pending_queue_idx',
+                condition=models.Q(approval_status='pending'),
+            ),
+        ]
+
+class Tag(models.Model):
+    name = models.CharField(max_length=TAG_MAX_LENGTH, unique=True)
+
+    def __str__(self):
+        return self.name
+
+class MediaTag(models.Model):
+    """
+    Inverted index from tags to media, rebuilt from ``Media.tags`` on save.
+    The album is copied here so filtering and counting an album's tags never
+    touches the media table.
+    """
+    # Both lead a composite index below, so they need no index of their own
+    media = models.ForeignKey(Media, on_delete=models.CASCADE, related_name='tag_links', db_index=False)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='media_links')
+    album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='+', db_index=False)
+
+    objects = MediaTagManager()
+
+    def __str__(self):
+        return f'{self.tag_id} on {self.media_id}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['media', 'tag'], name='media_tag_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['album', 'tag', 'media'], name='media_tag_album_idx'),
+        ]
+
+class UploadSession(models.Model):
+    """
+    A resumable upload in progress. Chunks are appended to ``part_path`` until
+    ``offset`` reaches the declared ``size``, then the file becomes a Media row.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    media_type = models.CharField(max_length=5, choices=Media.MEDIA_TYPE_CHOICES)
+    description = models.TextField(blank=True)
+    tags = models.CharField(max_length=255, blank=True)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset}/{self.size})'
+
+    @property
+    def part_path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{self.pk}.part')
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
@@ -0,0 +1,9 @@
+from Memory.pagination import KeysetPagination
+
+
+class MediaKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination over (updated_at, id), newest first, a range scan on the
+    (album, updated_at, id) index.
+    """
+    ordering = ('-updated_at', '-id')
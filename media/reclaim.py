@@ -0,0 +1,71 @@
+"""
+Removing stored files safely. Content-addressed files are shared: a new upload
+of the same bytes may reuse a file whose last reference is being dropped, so a
+name is only deleted after it is renamed out of reach and found unreferenced
+and untouched a second time.
+"""
+import os
+import uuid
+
+from account.models import CustomUser
+from album.models import Album
+from media.derivatives import DERIVATIVE_SPECS
+from media.models import Blob, Media
+
+# Every FileField whose stored names live under MEDIA_ROOT
+FILE_FIELDS = (
+    (Blob, 'file'),
+    (Media, 'file'),
+    (Album, 'cover_image'),
+    (CustomUser, 'profile_picture'),
+)
+DERIVATIVE_KINDS = tuple(kind for kind, _, _ in DERIVATIVE_SPECS)
+
+
+def referenced_names(names):
+    """The subset of ``names`` (storage names) that some row still refers to."""
+    found = set()
+    for model, field in FILE_FIELDS:
+        found.update(model._base_manager.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+
+    derived = [name for name in names if name.startswith('derivatives/')]
+    if derived:
+        # Blob derivatives sit in a directory named after the blob's checksum,
+        # so they are found through its index rather than by scanning the JSON
+        checksums = {name.split('/')[-2] for name in derived}
+        for derivatives in Blob.objects.filter(checksum__in=checksums).values_list('derivatives', flat=True):
+            found.update(derivatives.values())
+        for kind in DERIVATIVE_KINDS:
+            found.update(
+                Album._base_manager.filter(**{f'cover_derivatives__{kind}__in': derived})
+                .values_list(f'cover_derivatives__{kind}', flat=True)
+            )
+    return found.intersection(names)
+
+
+def remove_unreferenced(paths, cutoff=None):
+    """
+    Delete the files in ``paths`` ({storage name: path}) that no row refers
+    to, returning the names actually removed. Each file is renamed aside
+    first and then checked again; one a row now refers to, or modified at or
+    after ``cutoff`` (a reuse touches it, see ContentAddressedStorage._save),
+    is put back. Missing files are skipped, so running twice is harmless.
+    """
+    aside = {}
+    for name, path in paths.items():
+        temp = f'{path}.{uuid.uuid4().hex}.gc'
+        try:
+            os.rename(path, temp)
+        except FileNotFoundError:
+            continue
+        aside[name] = (path, temp)
+
+    referenced = referenced_names(list(aside))
+    removed = []
+    for name, (path, temp) in aside.items():
+        if name in referenced or (cutoff is not None and os.stat(temp).st_mtime >= cutoff):
+            os.replace(temp, path)
+            continue
+        os.remove(temp)
+        removed.append(name)
+    return removed
@@ -1,21 +1,34 @@
 from rest_framework import serializers
-from media.models import Media
-from album.models import Album
+from media.models import Media, MediaTag, UploadSession
+from album.cache import resolve_sharelink
+from media.derivatives import media_derivative_urls, media_file_url
+
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
 
 class MediaSerializer(serializers.ModelSerializer):
     album = serializers.SerializerMethodField()
+    derivatives = serializers.SerializerMethodField()
 
     class Meta:
         model = Media
-        fields = ['album', 'file', 'media_type', 'description', 'tags', 'approval_status']
+        fields = ['album', 'file', 'derivatives', 'media_type', 'description', 'tags', 'approval_status',
+                  'size', 'mime_type', 'width', 'height', 'checksum']
         read_only_fields = ['created_at', 'updated_at']
 
     def get_album(self, obj):
         return obj.album.title if obj.album else None
 
+    def get_derivatives(self, obj):
+        if not obj.blob:
+            return {}
+        return media_derivative_urls(obj.album.sharelink, obj.pk, obj.blob.derivatives, self.context.get('request'))
+
     def to_representation(self, instance):
         ret = super().to_representation(instance)
         request = self.context.get('request')        
+        # Served through MediaFileView rather than MEDIA_URL, so access is checked
+        if instance.file:
+            ret['file'] = media_file_url(instance.album.sharelink, instance.pk, request=request)
         if not request or not request.user.is_authenticated:
             ret.pop('approval_status', None)
         return ret
@@ -28,14 +41,24 @@ class MediaSerializer(serializers.ModelSerializer):
             ret.pop('approval_status', None)
         return ret
 
+    def create(self, validated_data):
+        media = super().create(validated_data)
+        MediaTag.objects.sync([media], created=True)
+        return media
+
+    def update(self, instance, validated_data):
+        media = super().update(instance, validated_data)
+        if 'tags' in validated_data:
+            MediaTag.objects.sync([media])
+        return media
+
     def validate(self, attrs):
         request = self.context.get('request')
         view = self.context.get('view')
         sharelink_uuid = view.kwargs.get('sharelink') if view else None
-        # Check if the album exists using the sharelink UUID
-        try:
-            album = Album.objects.get(sharelink=sharelink_uuid)
-        except Album.DoesNotExist:
+        # Resolve the album through the shared sharelink cache
+        album = resolve_sharelink(sharelink_uuid) if sharelink_uuid else None
+        if album is None:
             raise serializers.ValidationError('Album does not exist')
 
         # Check if the media file is in the allowed formats
@@ -44,11 +67,47 @@ class MediaSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Unsupported media type')
 
         # Check if the media file size is within the allowed limits
-        max_size = 10 * 1024 * 1024  # 10MB
-        if attrs.get('file') and attrs.get('file').size > max_size:
+        if attrs.get('file') and attrs.get('file').size > MAX_UPLOAD_SIZE:
             raise serializers.ValidationError('File size exceeds the allowed limit')
 
         # Attach the album to the attrs for saving later
         attrs['album'] = album
 
         return attrs
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['upload_id', 'filename', 'media_type', 'description', 'tags', 'size', 'offset']
+        read_only_fields = ['offset']
+
+    def validate_size(self, value):
+        # Reject on the declared size, before a single byte of the file is sent
+        if value > MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError('File size exceeds the allowed limit')
+        if value == 0:
+            raise serializers.ValidationError('File is empty')
+        return value
+
+
+class ModerationMediaSerializer(MediaSerializer):
+    class Meta(MediaSerializer.Meta):
+        fields = ['id'] + MediaSerializer.Meta.fields
+
+
+class ModerationActionSerializer(serializers.Serializer):
+    ACTIONS = {'approve': 'approved', 'reject': 'rejected'}
+    MAX_IDS = 5000
+
+    action = serializers.ChoiceField(choices=list(ACTIONS))
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=MAX_IDS)
+    album = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if not attrs.get('ids') and attrs.get('album') is None:
+            raise serializers.ValidationError('Send the media ids, or an album to moderate all of its pending media')
+        attrs['status'] = self.ACTIONS[attrs['action']]
+        return attrs
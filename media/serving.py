@@ -0,0 +1,113 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK_SIZE = 64 * 1024
+# Seconds a cache may reuse a served file before revalidating it
+FILE_MAX_AGE = 60
+
+
+class RangeFile:
+    """
+    Read-only view of ``length`` bytes of a file starting at ``start``. It has
+    no ``tell``/``fileno`` so neither FileResponse nor the WSGI file wrapper
+    mistake it for the whole file.
+    """
+
+    def __init__(self, path, start, length):
+        self.file = open(path, 'rb')
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single-range ``Range`` header, None to serve the
+    whole file, or False when the range cannot be satisfied. Multi-range
+    requests fall back to the whole file.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def serve_file(request, storage, name, etag, cache_control):
+    """
+    Build the response for a stored file: offloaded to the front proxy when
+    MEDIA_SENDFILE_HEADER is set, otherwise streamed with Range support.
+    """
+    path = storage.path(name)
+    stat = os.stat(path)
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is not None:
+        response['Cache-Control'] = cache_control
+        return response
+
+    sendfile_header = settings.MEDIA_SENDFILE_HEADER
+    if sendfile_header:
+        response = HttpResponse(content_type=content_type)
+        if sendfile_header == 'X-Accel-Redirect':
+            response[sendfile_header] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + name
+        else:
+            response[sendfile_header] = path
+    else:
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        # A stale If-Range means the client's partial copy is outdated: send it all
+        if not if_range or if_range in (etag, http_date(stat.st_mtime)):
+            byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416, content_type=content_type)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif byte_range is not None:
+            start, end = byte_range
+            response = FileResponse(
+                RangeFile(path, start, end - start + 1), status=206, content_type=content_type
+            )
+            response.block_size = STREAM_BLOCK_SIZE
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        else:
+            # Plain file object, so the WSGI server can use sendfile()
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+            response.block_size = STREAM_BLOCK_SIZE
+
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if etag:
+        response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
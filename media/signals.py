@@ -0,0 +1,79 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from album.models import Album
+from jobs.models import Job
+from media.cache import invalidate_media_listing
+from media.derivatives import derivatives_ready
+from media.models import Blob, Media, UploadSession
+from media.uploads import release_quota
+
+
+@receiver(post_save, sender=Media)
+def count_album_media(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    pending = int(instance.approval_status == 'pending')
+    if created:
+        Album.objects.media_added(instance.album_id, pending=pending, size=instance.size, latest_id=instance.pk)
+    else:
+        previous = getattr(instance, '_saved_status', None)
+        if previous is not None and previous != instance.approval_status:
+            Album.objects.pending_changed({instance.album_id: pending - int(previous == 'pending')})
+    instance._saved_status = instance.approval_status
+
+
+@receiver(post_delete, sender=Media)
+def uncount_album_media(sender, instance, **kwargs):
+    Album.objects.media_removed(
+        instance.album_id, instance.pk, pending=int(instance.approval_status == 'pending'), size=instance.size,
+    )
+
+
+@receiver(post_delete, sender=Media)
+def release_blob(sender, instance, **kwargs):
+    if instance.blob_id is not None:
+        Blob.objects.release(instance.blob_id)
+
+
+@receiver(post_save, sender=Media)
+@receiver(post_delete, sender=Media)
+def invalidate_album_listing(sender, instance, **kwargs):
+    invalidate_media_listing(instance.album_id)
+
+
+@receiver(derivatives_ready, sender=Blob)
+def invalidate_blob_listings(sender, pk, **kwargs):
+    album_ids = Media.objects.filter(blob_id=pk).values_list('album_id', flat=True).distinct()
+    for album_id in album_ids:
+        invalidate_media_listing(album_id)
+
+
+@receiver(post_save, sender=Blob)
+def render_blob_derivatives(sender, instance, created, **kwargs):
+    if created:
+        Job.objects.enqueue('media.generate_derivatives', {
+            'model': 'media.Blob', 'pk': instance.pk, 'file_field': 'file', 'target_field': 'derivatives',
+        })
+
+
+@receiver(post_save, sender=Album)
+def render_cover_derivatives(sender, instance, **kwargs):
+    source = instance.cover_image.name if instance.cover_image else None
+    if source == instance.cover_derivatives.get('source'):
+        return
+    if source:
+        # Mark the new source right away so a re-save before the job runs does not queue it twice
+        Album.objects.filter(pk=instance.pk).update(cover_derivatives={'source': source})
+        instance.cover_derivatives = {'source': source}
+        Job.objects.enqueue('media.generate_derivatives', {
+            'model': 'album.Album', 'pk': instance.pk, 'file_field': 'cover_image', 'target_field': 'cover_derivatives',
+        })
+    else:
+        Album.objects.filter(pk=instance.pk).update(cover_derivatives={})
+
+
+@receiver(post_delete, sender=UploadSession)
+def release_session_quota(sender, instance, **kwargs):
+    # However the session ends (completed, cancelled, expired or purged with
+    # its album), the bytes it held against the owner's quota are given back
+    release_quota(instance.album_id, instance.size)
@@ -0,0 +1,47 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_address(checksum, filename):
+    # Fan out on the first bytes of the digest so no directory gets too large
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join('cas', checksum[:2], checksum[2:4], f'{checksum}{ext}')
+
+
+def hash_content(content):
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Filesystem storage for names derived from the file's SHA-256. A name that
+    already exists holds the same bytes, so saving it again only refreshes its
+    modification time and no alternative name is ever probed for.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        try:
+            # Reusing the stored file: touch it so collect_orphan_files, which
+            # spares recently modified files, does not reclaim it under us
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        # Write under a private name and rename into place so readers never
+        # see a half-written file and concurrent writers of the same bytes
+        # simply replace each other.
+        temp_name = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+from jobs.models import Job
+from jobs.registry import task
+from media.derivatives import generate_derivatives, record_derivative
+from media.models import Blob
+from media.reclaim import remove_unreferenced
+from media.uploads import expire_uploads
+
+
+@task('media.generate_derivatives')
+def generate_derivatives_task(model, pk, file_field, target_field):
+    model = apps.get_model(model)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    source = getattr(instance, file_field).name
+    # Renders run in the derivative process pool but are recorded here, so the
+    # job only finishes once every derivative is saved and a failed render is
+    # retried by the queue.
+    error = None
+    for kind, name, future in generate_derivatives(instance, file_field, target_field):
+        try:
+            future.result()
+        except Exception as exc:
+            error = error or exc
+            continue
+        record_derivative(model, pk, target_field, source, kind, name)
+    if error is not None:
+        raise error
+
+
+@task('media.delete_files')
+def delete_files(names, released_at=None):
+    """
+    Remove files whose last reference went away. The same bytes may have been
+    uploaded again since, reusing the file, so names a row refers to by now,
+    or touched since ``released_at`` (a timestamp), are kept.
+    """
+    storage = Blob._meta.get_field('file').storage
+    remove_unreferenced({name: storage.path(name) for name in names}, released_at)
+
+
+@task('media.expire_uploads')
+def expire_uploads_task(chunk_size=500, reschedule=True):
+    expire_uploads(settings.UPLOAD_SESSION_TTL, chunk_size)
+    if reschedule and not Job.objects.filter(task='media.expire_uploads', status='queued').exists():
+        Job.objects.enqueue(
+            'media.expire_uploads',
+            {'chunk_size': chunk_size},
+            run_after=timezone.now() + timedelta(seconds=settings.UPLOAD_EXPIRY_INTERVAL),
+        )
@@ -1,3 +1,929 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import time
+import tempfile
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from account.models import CustomUser
+from album.models import Album
+from jobs.models import Job
+from jobs.registry import tasks
+from media import uploads
+from media.derivatives import derivative_name
+from media.models import Blob, Media, MediaTag, UploadSession
+from media.serializers import MediaSerializer
+from media.management.commands import collect_orphan_files
+from media.storage import ContentAddressedStorage, content_address
+from media.views import ModerationView
+from Memory.testing import QueryBudgetMixin
 
 # Create your tests here.
+
+ALBUM_SIZE = 250
+MEDIA_ROOT = tempfile.mkdtemp()
+CHUNKED_UPLOAD_DIR = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHUNKED_UPLOAD_DIR=CHUNKED_UPLOAD_DIR)
+class MediaQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """
+    Seeds a large album and fails if the sharelink endpoints exceed a fixed
+    number of queries, so a per-row lookup sneaking back in shows up here.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        cls.album = Album.objects.create(owner=cls.user, title='Wedding')
+        Media.objects.bulk_create([
+            Media(album=cls.album, file=f'media/image/Wedding/{i}.jpg', media_type='image')
+            for i in range(ALBUM_SIZE)
+        ])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(CHUNKED_UPLOAD_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_sharelink_list(self):
+        url = f'/sharelink/{self.album.sharelink}/?limit=500'
+        response = self.assertMaxQueries(4, self.client.get, url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['data']), ALBUM_SIZE)
+
+        # A repeat poll is served from the response cache
+        response = self.assertMaxQueries(3, self.client.get, url)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.assertMaxQueries(3, self.client.get, url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_sharelink_upload(self):
+        upload = SimpleUploadedFile('photo.jpg', b'\xff\xd8\xff\xd9', content_type='image/jpeg')
+        response = self.assertMaxQueries(
+            11, APIClient().post, f'/sharelink/{self.album.sharelink}/',
+            {'file': upload, 'media_type': 'image'}, format='multipart',
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_chunked_upload(self):
+        client = APIClient()
+        payload = b'\xff\xd8' + b'\x00' * 4096 + b'\xff\xd9'
+        base = f'/sharelink/{self.album.sharelink}/uploads/'
+
+        response = self.assertMaxQueries(
+            3, client.post, base, {'filename': 'photo.jpg', 'size': len(payload), 'media_type': 'image'},
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        url = f"{base}{response.data['data']['upload_id']}/"
+
+        response = self.assertMaxQueries(
+            4, client.generic, 'PUT', url, payload,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+
+        response = self.assertMaxQueries(11, client.post, f'{url}complete/')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_batch_upload(self):
+        # Query count must not grow with the number of files, only with new contents
+        files = [
+            SimpleUploadedFile(f'photo{i}.jpg', b'\xff\xd8' + bytes([i % 2]) + b'\xff\xd9', content_type='image/jpeg')
+            for i in range(40)
+        ]
+        response = self.assertMaxQueries(
+            14, APIClient().post, f'/sharelink/{self.album.sharelink}/batch/',
+            {'files': files}, format='multipart',
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data['data']), 40)
+
+    def test_file_range(self):
+        upload = SimpleUploadedFile('clip.mp4', bytes(range(256)) * 16, content_type='video/mp4')
+        APIClient().post(f'/sharelink/{self.album.sharelink}/', {'file': upload, 'media_type': 'video'}, format='multipart')
+        media = Media.objects.filter(media_type='video').get()
+        cache.clear()
+
+        response = self.assertMaxQueries(
+            3, self.client.get, f'/sharelink/{self.album.sharelink}/files/{media.pk}/', HTTP_RANGE='bytes=0-99',
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(100)))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHUNKED_UPLOAD_DIR=CHUNKED_UPLOAD_DIR)
+class MediaPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        cls.album = Album.objects.create(owner=cls.user, title='Wedding')
+        media = Media.objects.bulk_create([
+            Media(album=cls.album, file=f'media/image/Wedding/{i}.jpg', media_type='image') for i in range(25)
+        ])
+        # Most rows share one timestamp, so pages have to break ties on id
+        tied = timezone.now()
+        Media.objects.filter(pk__in=[item.pk for item in media[:18]]).update(updated_at=tied)
+        for offset, item in enumerate(media[18:], 1):
+            Media.objects.filter(pk=item.pk).update(updated_at=tied + timedelta(seconds=offset))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_cursor_walks_every_row_once(self):
+        names, url, pages = [], f'/sharelink/{self.album.sharelink}/?limit=7', 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            names += [item['file'] for item in response.data['data']]
+            url = response.data['next']
+            pages += 1
+
+        expected = Media.objects.filter(album=self.album).order_by('-updated_at', '-id').values_list('id', flat=True)
+        self.assertEqual(names, [f'http://testserver/sharelink/{self.album.sharelink}/files/{pk}/' for pk in expected])
+        self.assertEqual(pages, 4)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'/sharelink/{self.album.sharelink}/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHUNKED_UPLOAD_DIR=CHUNKED_UPLOAD_DIR)
+class MediaFileAccessTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        cls.other = CustomUser.objects.create_user('other', 'other@example.com', 'Passw0rd!')
+
+    def setUp(self):
+        cache.clear()
+        self.album = Album.objects.create(owner=self.user, title='Trip')
+        upload = SimpleUploadedFile('clip.mp4', b'\x00' * 64, content_type='video/mp4')
+        APIClient().post(f'/sharelink/{self.album.sharelink}/', {'file': upload, 'media_type': 'video'})
+        self.media = Media.objects.get()
+        self.url = f'/sharelink/{self.album.sharelink}/files/{self.media.pk}/'
+
+    def get(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client.get(self.url)
+
+    def set_status(self, status):
+        Media.objects.filter(pk=self.media.pk).update(approval_status=status)
+
+    def test_private_albums_serve_only_their_owner(self):
+        self.set_status('approved')
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get(self.other).status_code, 403)
+        response = self.get(self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=60, must-revalidate')
+
+    def test_unapproved_media_is_hidden_from_everyone_else(self):
+        self.album.privacy_settings = 'public'
+        self.album.save()
+        for status in ('pending', 'rejected'):
+            self.set_status(status)
+            self.assertEqual(self.get().status_code, 404)
+            self.assertEqual(self.get(self.other).status_code, 404)
+            response = self.get(self.user)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Cache-Control'].startswith('private'))
+
+        self.set_status('approved')
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        # Short and revalidated, so going private later takes effect quickly
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60, must-revalidate')
+
+    def test_listing_links_to_the_checked_route(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        item = client.get(f'/sharelink/{self.album.sharelink}/').data['data'][0]
+        self.assertEqual(item['file'], f'http://testserver{self.url}')
+        # The link carries no access of its own: the album is still private
+        self.assertEqual(APIClient().get(item['file']).status_code, 401)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHUNKED_UPLOAD_DIR=CHUNKED_UPLOAD_DIR)
+class MediaListingValidatorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        cls.album = Album.objects.create(owner=cls.user, title='Trip')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/sharelink/{self.album.sharelink}/'
+
+    def upload(self, content):
+        upload = SimpleUploadedFile('photo.jpg', content, content_type='image/jpeg')
+        APIClient().post(self.url, {'file': upload, 'media_type': 'image'})
+        return Media.objects.latest('id')
+
+    def assertChanged(self, response):
+        # Each validator on its own must see the change
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        fresh = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=fresh['Last-Modified']).status_code, 304)
+        return fresh
+
+    def test_validators_follow_saves_and_deletes(self):
+        self.upload(b'\xff\xd8first\xff\xd9')
+        response = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        newest = self.upload(b'\xff\xd8second\xff\xd9')
+        response = self.assertChanged(response)
+        self.assertEqual(len(response.data['data']), 2)
+
+        newest.description = 'Edited'
+        newest.save()
+        response = self.assertChanged(response)
+
+        # Deleting the newest item must not move Last-Modified backwards
+        newest.delete()
+        response = self.assertChanged(response)
+        self.assertEqual(len(response.data['data']), 1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHUNKED_UPLOAD_DIR=CHUNKED_UPLOAD_DIR)
+class ChunkedUploadTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        cls.album = Album.objects.create(owner=cls.user, title='Trip')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.payload = os.urandom(3000)
+        response = self.client.post(
+            f'/sharelink/{self.album.sharelink}/uploads/',
+            {'filename': 'clip.mp4', 'size': len(self.payload), 'media_type': 'video'},
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.session = UploadSession.objects.get(pk=response.data['data']['upload_id'])
+        self.url = f'/sharelink/{self.album.sharelink}/uploads/{self.session.pk}/'
+
+    def put(self, data, offset):
+        return self.client.generic(
+            'PUT', self.url, data, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_resume_after_interruption(self):
+        self.assertEqual(self.put(self.payload[:1000], 0).status_code, 200)
+        # Another worker, with no cached hash state, picks the upload up
+        uploads._hashers.clear()
+        response = self.client.get(self.url)
+        self.assertEqual(response['Upload-Offset'], '1000')
+        self.assertEqual(self.client.post(f'{self.url}complete/').status_code, 409)
+
+        self.assertEqual(self.put(self.payload[1000:], 1000).status_code, 200)
+        checksum = hashlib.sha256(self.payload).hexdigest()
+        response = self.client.post(f'{self.url}complete/', {'checksum': checksum})
+        self.assertEqual(response.status_code, 201, response.data)
+        media = Media.objects.get(album=self.album)
+        self.assertEqual((media.checksum, media.file.read()), (checksum, self.payload))
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_offset_mismatch(self):
+        self.put(self.payload[:1000], 0)
+        response = self.put(self.payload[:1000], 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '1000')
+        self.assertEqual(self.put(self.payload[2000:], 2000).status_code, 409)
+
+    def test_oversize_chunk(self):
+        response = self.put(self.payload + b'extra', 0)
+        self.assertEqual(response.status_code, 413)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.offset, 0)
+
+    def test_abandoned_sessions_expire(self):
+        self.put(self.payload[:1000], 0)
+        stray = os.path.join(CHUNKED_UPLOAD_DIR, f'{uuid.uuid4()}.part')
+        with open(stray, 'wb') as f:
+            f.write(b'left over')
+        old = time.time() - 7200
+        os.utime(stray, (old, old))
+
+        out = io.StringIO()
+        call_command('expireuploads', '--max-age', '3600', stdout=out)
+        self.assertIn('Expired 0 upload sessions', out.getvalue())
+        self.assertTrue(os.path.exists(self.session.part_path))
+        self.assertFalse(os.path.exists(stray))
+
+        UploadSession.objects.filter(pk=self.session.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+        call_command('expireuploads', '--max-age', '3600', stdout=out)
+        self.assertIn('Expired 1 upload sessions', out.getvalue())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(self.session.part_path))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_competing_chunks(self):
+        first, retry = self.session, UploadSession.objects.get(pk=self.session.pk)
+        other = io.BytesIO(os.urandom(1000))
+        competing = []
+
+        class Stream(io.BytesIO):
+            def read(self, size=-1):
+                # A second chunk for the same offset arrives mid-write
+                if not competing:
+                    competing.append(uploads.append_chunk(retry, other, 1000))
+                return super().read(size)
+
+        self.assertEqual(uploads.append_chunk(first, Stream(self.payload[:1000]), 1000), 1000)
+        self.assertEqual(competing, [None])
+        # Once the first is recorded, a chunk with the stale offset still loses
+        self.assertIsNone(uploads.append_chunk(retry, other, 1000))
+        with open(self.session.part_path, 'rb') as f:
+            self.assertEqual(f.read(), self.payload[:1000])
+
+        self.assertEqual(self.put(self.payload[1000:], 1000).status_code, 200)
+        checksum = hashlib.sha256(self.payload).hexdigest()
+        response = self.client.post(f'{self.url}complete/', {'checksum': checksum})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Media.objects.get(album=self.album).file.read(), self.payload)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHUNKED_UPLOAD_DIR=CHUNKED_UPLOAD_DIR)
+class BlobStorageTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        cls.album = Album.objects.create(owner=cls.user, title='Trip')
+
+    def setUp(self):
+        cache.clear()
+
+    def upload(self, content, name='photo.jpg'):
+        upload = SimpleUploadedFile(name, content, content_type='image/jpeg')
+        response = APIClient().post(f'/sharelink/{self.album.sharelink}/', {'file': upload, 'media_type': 'image'})
+        self.assertEqual(response.status_code, 201, response.data)
+        return Media.objects.latest('id')
+
+    def test_identical_bytes_share_one_file(self):
+        content = b'\xff\xd8same bytes\xff\xd9'
+        first = self.upload(content)
+        blob = Blob.objects.get()
+        self.assertEqual(blob.checksum, hashlib.sha256(content).hexdigest())
+        self.assertEqual(blob.ref_count, 1)
+
+        with mock.patch.object(ContentAddressedStorage, 'save') as save:
+            second = self.upload(content, name='copy.jpg')
+        save.assert_not_called()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual((first.blob_id, second.blob_id), (blob.pk, blob.pk))
+        self.assertEqual(second.file.name, blob.file.name)
+
+        first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(os.path.exists(blob.file.path))
+
+        # The last release drops the row and queues the file's removal
+        second.delete()
+        self.assertFalse(Blob.objects.exists())
+        job = Job.objects.get(task='media.delete_files')
+        tasks[job.task](**job.payload)
+        self.assertFalse(os.path.exists(blob.file.path))
+        # Running it again finds nothing left to do
+        tasks[job.task](**job.payload)
+
+    def test_reupload_before_delete_job_keeps_file(self):
+        content = b'\xff\xd8back again\xff\xd9'
+        self.upload(content).delete()
+        job = Job.objects.get(task='media.delete_files')
+
+        # The same bytes arrive while the delete is still queued
+        media = self.upload(content, name='again.jpg')
+        tasks[job.task](**job.payload)
+        self.assertEqual(media.blob.file.read(), content)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHUNKED_UPLOAD_DIR=CHUNKED_UPLOAD_DIR, DERIVATIVE_WORKERS=0)
+class DeleteFilesJobTest(TransactionTestCase):
+
+    def test_reupload_before_runjobs_keeps_file(self):
+        user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        album = Album.objects.create(owner=user, title='Trip')
+        content = b'\xff\xd8queued delete\xff\xd9'
+
+        def upload(name):
+            upload = SimpleUploadedFile(name, content, content_type='image/jpeg')
+            response = APIClient().post(f'/sharelink/{album.sharelink}/', {'file': upload, 'media_type': 'image'})
+            self.assertEqual(response.status_code, 201, response.data)
+            return Media.objects.select_related('blob').latest('id')
+
+        upload('photo.jpg').delete()
+        media = upload('again.jpg')
+        call_command('runjobs', burst=True, concurrency=1)
+
+        self.assertEqual(Job.objects.get(task='media.delete_files').status, 'done')
+        self.assertEqual(media.blob.file.read(), content)
+
+        # Once nothing refers to it any more, the next release does remove it
+        path = media.blob.file.path
+        media.delete()
+        call_command('runjobs', burst=True, concurrency=1)
+        self.assertFalse(os.path.exists(path))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHUNKED_UPLOAD_DIR=CHUNKED_UPLOAD_DIR, DERIVATIVE_WORKERS=0)
+class DerivativeTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        cls.album = Album.objects.create(owner=cls.user, title='Trip')
+
+    def setUp(self):
+        cache.clear()
+
+    def png(self, name='photo.png'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (900, 600), 'red').save(buffer, format='PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def run_render_jobs(self):
+        for job in Job.objects.filter(task='media.generate_derivatives'):
+            tasks[job.task](**job.payload)
+
+    def test_uploads_and_covers_get_derivatives(self):
+        APIClient().post(f'/sharelink/{self.album.sharelink}/', {'file': self.png(), 'media_type': 'image'})
+        self.album.cover_image = self.png('cover.png')
+        self.album.save()
+        self.run_render_jobs()
+
+        blob = Blob.objects.get()
+        self.album.refresh_from_db()
+        for derivatives, source in ((blob.derivatives, blob.file.name), (self.album.cover_derivatives, self.album.cover_image.name)):
+            self.assertEqual(set(derivatives), {'source', 'thumbnail', 'medium', 'webp'})
+            self.assertEqual(derivatives['source'], source)
+            with Image.open(blob.file.storage.path(derivatives['thumbnail'])) as thumbnail:
+                self.assertEqual((thumbnail.format, thumbnail.size), ('JPEG', (320, 213)))
+            with Image.open(blob.file.storage.path(derivatives['webp'])) as webp:
+                self.assertEqual((webp.format, webp.size), ('WEBP', (900, 600)))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        item = client.get(f'/sharelink/{self.album.sharelink}/').data['data'][0]
+        self.assertEqual(set(item['derivatives']), {'thumbnail', 'medium', 'webp'})
+
+    def test_non_images_are_skipped(self):
+        upload = SimpleUploadedFile('clip.mp4', b'\x00' * 64, content_type='video/mp4')
+        APIClient().post(f'/sharelink/{self.album.sharelink}/', {'file': upload, 'media_type': 'video'})
+        self.run_render_jobs()
+        self.assertEqual(Blob.objects.get().derivatives, {})
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHUNKED_UPLOAD_DIR=CHUNKED_UPLOAD_DIR)
+class MediaTagTest(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        cls.album = Album.objects.create(owner=cls.user, title='Trip')
+        media = Media.objects.bulk_create([
+            Media(album=cls.album, file=f'media/image/Trip/{i}.jpg', media_type='image',
+                  tags='beach, Sunset' if i % 2 else 'beach')
+            for i in range(ALBUM_SIZE)
+        ])
+        MediaTag.objects.sync(media, created=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_upload_indexes_tags(self):
+        upload = SimpleUploadedFile('photo.jpg', b'\xff\xd8\xff\xd9', content_type='image/jpeg')
+        response = APIClient().post(
+            f'/sharelink/{self.album.sharelink}/',
+            {'file': upload, 'media_type': 'image', 'tags': 'Dog, dog ,  park'}, format='multipart',
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        media = Media.objects.get(file__endswith='.jpg', tags__icontains='dog')
+        self.assertEqual(sorted(media.tag_links.values_list('tag__name', flat=True)), ['dog', 'park'])
+
+        view = SimpleNamespace(kwargs={'sharelink': self.album.sharelink})
+        serializer = MediaSerializer(media, data={'tags': 'park, night'}, partial=True, context={'view': view})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(sorted(media.tag_links.values_list('tag__name', flat=True)), ['night', 'park'])
+
+    def test_tag_filter(self):
+        response = self.client.get(f'/sharelink/{self.album.sharelink}/', {'tag': 'SUNSET', 'limit': 500})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['data']), ALBUM_SIZE // 2)
+
+        response = self.client.get(f'/sharelink/{self.album.sharelink}/', {'tag': 'missing'})
+        self.assertEqual(response.data['data'], [])
+
+    def test_tag_filter_matches_all_tags(self):
+        response = self.client.get(f'/sharelink/{self.album.sharelink}/', {'tag': 'beach,sunset', 'limit': 500})
+        self.assertEqual(len(response.data['data']), ALBUM_SIZE // 2)
+        self.assertTrue(all('Sunset' in item['tags'] for item in response.data['data']))
+
+        response = self.client.get(f'/sharelink/{self.album.sharelink}/', {'tag': 'beach,missing'})
+        self.assertEqual(response.data['data'], [])
+
+    def test_tag_facets(self):
+        response = self.assertMaxQueries(3, self.client.get, f'/sharelink/{self.album.sharelink}/tags/')
+        self.assertEqual(response.data['data'], [
+            {'tag': 'beach', 'count': ALBUM_SIZE},
+            {'tag': 'sunset', 'count': ALBUM_SIZE // 2},
+        ])
+
+
+class ModerationTest(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        cls.other = CustomUser.objects.create_user('other', 'other@example.com', 'Passw0rd!')
+        cls.first = Album.objects.create(owner=cls.user, title='Ceremony')
+        cls.second = Album.objects.create(owner=cls.user, title='Party')
+        cls.foreign = Album.objects.create(owner=cls.other, title='Elsewhere')
+        Media.objects.bulk_create([
+            Media(album=album, file=f'media/image/{album.title}/{i}.jpg', media_type='image', approval_status=status)
+            for album in (cls.first, cls.second, cls.foreign)
+            for i, status in enumerate(['pending'] * ALBUM_SIZE + ['approved'] * 10)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_pending_queue(self):
+        response = self.assertMaxQueries(3, self.client.get, '/moderation/', {'limit': 200})
+        self.assertEqual(response.status_code, 200)
+        seen = [item['id'] for item in response.data['data']]
+        while response.data['next']:
+            response = self.assertMaxQueries(3, self.client.get, response.data['next'])
+            seen += [item['id'] for item in response.data['data']]
+        self.assertEqual(len(set(seen)), ALBUM_SIZE * 2)
+        self.assertFalse(Media.objects.filter(pk__in=seen, album=self.foreign).exists())
+
+    def test_pending_queue_reads_in_index_order(self):
+        # Pages come straight off the index instead of sorting every pending row
+        queue = ModerationView().pending_queue(self.user).order_by('-updated_at', '-id')[:50]
+        plan = queue.explain()
+        self.assertIn('media_pending_queue_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+        response = self.client.get('/moderation/', {'album': self.second.pk, 'limit': 500})
+        self.assertEqual({item['album'] for item in response.data['data']}, {'Party'})
+
+    def test_bulk_approve_and_reject(self):
+        listing = f'/sharelink/{self.first.sharelink}/'
+        etag = self.client.get(listing)['ETag']
+
+        ids = list(Media.objects.filter(approval_status='pending').values_list('id', flat=True))
+        # One UPDATE per album touched, so each counter moves by the rows it actually changed
+        response = self.assertMaxQueries(6, self.client.post, '/moderation/', {'action': 'approve', 'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        # Only the caller's own media changed
+        self.assertEqual(response.data['data']['updated'], ALBUM_SIZE * 2)
+        self.assertEqual(Media.objects.filter(album=self.foreign, approval_status='pending').count(), ALBUM_SIZE)
+        self.assertNotEqual(self.client.get(listing)['ETag'], etag)
+
+        response = self.client.post('/moderation/', {'action': 'reject', 'album': self.foreign.pk}, format='json')
+        self.assertEqual(response.data['data']['updated'], 0)
+        response = self.client.post('/moderation/', {'action': 'reject'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_overlapping_actions_keep_pending_count(self):
+        # bulk_create skipped the counters
+        Album.objects.reconcile([self.first.pk])
+        ids = list(Media.objects.filter(album=self.first, approval_status='pending').values_list('id', flat=True))
+        self.client.post('/moderation/', {'action': 'approve', 'ids': ids[:10]}, format='json')
+        # A second moderator acting on the same items only moves those still pending
+        self.client.post('/moderation/', {'action': 'approve', 'ids': ids[:20]}, format='json')
+        self.client.post('/moderation/', {'action': 'reject', 'ids': ids[:30]}, format='json')
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.pending_count, ALBUM_SIZE - 30)
+        self.assertEqual(
+            self.first.pending_count, Media.objects.filter(album=self.first, approval_status='pending').count(),
+        )
+
+    def test_interleaved_actions_keep_pending_count(self):
+        Album.objects.reconcile([self.first.pk])
+        ids = list(Media.objects.filter(album=self.first, approval_status='pending').values_list('id', flat=True))
+        read_targets = ModerationView.read_targets
+
+        def racing_read(view, targets):
+            # A second moderator rejects half of the same items between this read and its write
+            rows = read_targets(view, targets)
+            with mock.patch.object(ModerationView, 'read_targets', read_targets):
+                self.client.post('/moderation/', {'action': 'reject', 'ids': ids[:10]}, format='json')
+            return rows
+
+        with mock.patch.object(ModerationView, 'read_targets', racing_read):
+            response = self.client.post('/moderation/', {'action': 'approve', 'ids': ids[:20]}, format='json')
+        self.assertEqual(response.data['data']['updated'], 10)
+        self.assertEqual(Media.objects.filter(pk__in=ids[:10], approval_status='rejected').count(), 10)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.pending_count, ALBUM_SIZE - 20)
+        self.assertEqual(
+            self.first.pending_count, Media.objects.filter(album=self.first, approval_status='pending').count(),
+        )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHUNKED_UPLOAD_DIR=CHUNKED_UPLOAD_DIR)
+class StorageQuotaTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!', storage_quota=2000)
+        cls.album = Album.objects.create(owner=cls.user, title='Trip')
+
+    def setUp(self):
+        cache.clear()
+        self.url = f'/sharelink/{self.album.sharelink}/'
+
+    def png(self, width, height, name='photo.png'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), 'white').save(buffer, format='PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def used(self):
+        return CustomUser.objects.get(pk=self.user.pk).storage_used
+
+    def reserved(self):
+        return CustomUser.objects.get(pk=self.user.pk).storage_reserved
+
+    def test_metadata_recorded_at_upload(self):
+        upload = self.png(12, 7, name='photo.jpg')
+        response = APIClient().post(self.url, {'file': upload, 'media_type': 'image'})
+        self.assertEqual(response.status_code, 201, response.data)
+        media = Media.objects.select_related('blob').get()
+        # The header wins over the misleading extension
+        self.assertEqual((media.mime_type, media.width, media.height), ('image/png', 12, 7))
+        self.assertEqual((media.size, media.checksum), (upload.size, media.blob.checksum))
+        self.assertEqual(response.data['data']['width'], 12)
+
+        files = [self.png(3, 4, name=f'{i}.png') for i in range(2)] + [SimpleUploadedFile('clip.mp4', b'\x00' * 10, content_type='video/mp4')]
+        APIClient().post(f'{self.url}batch/', {'files': files})
+        clip = Media.objects.get(mime_type='video/mp4')
+        self.assertEqual((clip.size, clip.width, clip.height, clip.media_type), (10, None, None, 'video'))
+        self.assertEqual(Media.objects.filter(width=3, height=4).count(), 2)
+
+    def test_quota_tracks_and_limits_uploads(self):
+        response = APIClient().post(self.url, {'file': SimpleUploadedFile('a.bin', b'\x00' * 1500), 'media_type': 'video'})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.used(), 1500)
+
+        response = APIClient().post(self.url, {'file': SimpleUploadedFile('b.bin', b'\x01' * 600), 'media_type': 'video'})
+        self.assertEqual(response.status_code, 413)
+        response = APIClient().post(f'{self.url}uploads/', {'filename': 'c.mp4', 'size': 600, 'media_type': 'video'})
+        self.assertEqual(response.status_code, 413)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        album = client.get('/albums/').data['results'][0]
+        self.assertEqual(album['storage'], {'used': 1500, 'quota': 2000})
+
+        Media.objects.get().delete()
+        self.assertEqual(self.used(), 0)
+        self.assertEqual(self.reserved(), 0)
+
+    def test_open_sessions_hold_quota(self):
+        client = APIClient()
+        sessions = []
+        for name in ('a.mp4', 'b.mp4', 'c.mp4'):
+            response = client.post(f'{self.url}uploads/', {'filename': name, 'size': 800, 'media_type': 'video'})
+            sessions.append(response)
+        # Two sessions fit the 2000 byte quota; the third would not, though nothing is stored yet
+        self.assertEqual([response.status_code for response in sessions], [201, 201, 413])
+        self.assertEqual((self.used(), self.reserved()), (0, 1600))
+        self.assertEqual(APIClient().post(self.url, {'file': SimpleUploadedFile('d.bin', b'\x00' * 500)}).status_code, 413)
+
+        first, second = (f"{self.url}uploads/{response.data['data']['upload_id']}/" for response in sessions[:2])
+        payload = b'\x00' * 800
+        client.generic('PUT', first, payload, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual(client.post(f'{first}complete/').status_code, 201)
+        self.assertEqual((self.used(), self.reserved()), (800, 800))
+
+        # Cancelling gives the held bytes back
+        self.assertEqual(client.delete(second).status_code, 204)
+        self.assertEqual((self.used(), self.reserved()), (800, 0))
+        response = client.post(f'{self.url}uploads/', {'filename': 'e.mp4', 'size': 1200, 'media_type': 'video'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_failed_upload_releases_quota(self):
+        response = APIClient().post(self.url, {'file': SimpleUploadedFile('a.bin', b'\x00' * 500), 'media_type': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((self.used(), self.reserved()), (0, 0))
+
+    def test_saving_a_stale_user_keeps_counters(self):
+        stale = CustomUser.objects.get(pk=self.user.pk)
+        APIClient().post(self.url, {'file': SimpleUploadedFile('a.bin', b'\x00' * 700), 'media_type': 'video'})
+        APIClient().post(f'{self.url}uploads/', {'filename': 'b.mp4', 'size': 300, 'media_type': 'video'})
+        stale.email = 'renamed@example.com'
+        stale.save()
+        self.assertEqual((self.used(), self.reserved()), (700, 300))
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk).email, 'renamed@example.com')
+
+    def test_reconcile_repairs_storage_total(self):
+        APIClient().post(self.url, {'file': SimpleUploadedFile('a.bin', b'\x00' * 700), 'media_type': 'video'})
+        APIClient().post(f'{self.url}uploads/', {'filename': 'b.mp4', 'size': 300, 'media_type': 'video'})
+        CustomUser.objects.filter(pk=self.user.pk).update(storage_used=5, storage_reserved=9)
+        out = io.StringIO()
+        call_command('reconcile_album_counters', stdout=out)
+        self.assertIn('Checked 1 users, 1 repaired', out.getvalue())
+        self.assertEqual((self.used(), self.reserved()), (700, 300))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHUNKED_UPLOAD_DIR=CHUNKED_UPLOAD_DIR)
+class AsyncMediaViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        cls.album = Album.objects.create(owner=cls.user, title='Wedding')
+        Media.objects.bulk_create([
+            Media(album=cls.album, file=f'media/image/Wedding/{i}.jpg', media_type='image')
+            for i in range(ALBUM_SIZE)
+        ])
+        cls.headers = {'Authorization': f'Bearer {RefreshToken.for_user(cls.user).access_token}'}
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_listing_matches_sync_view(self):
+        url = f'/async/sharelink/{self.album.sharelink}/'
+        response = await self.async_client.get(url, {'limit': 50}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(APIClient().get)(
+            f'/sharelink/{self.album.sharelink}/', {'limit': 50}, HTTP_AUTHORIZATION=self.headers['Authorization'],
+        )
+        self.assertEqual(response['ETag'], expected['ETag'])
+        self.assertEqual(response.json()['data'], expected.json()['data'])
+
+        response = await self.async_client.get(
+            url, {'limit': 50}, headers={**self.headers, 'If-None-Match': response['ETag']},
+        )
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 401)
+
+    async def test_upload(self):
+        upload = SimpleUploadedFile('photo.jpg', b'\xff\xd8async\xff\xd9', content_type='image/jpeg')
+        response = await self.async_client.post(
+            f'/async/sharelink/{self.album.sharelink}/', {'file': upload, 'media_type': 'image', 'tags': 'party'},
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(await MediaTag.objects.filter(tag__name='party').acount(), 1)
+
+    async def test_chunked_upload(self):
+        payload = b'\xff\xd8' + bytes(range(256)) * 64 + b'\xff\xd9'
+        base = f'/async/sharelink/{self.album.sharelink}/uploads/'
+        response = await self.async_client.post(base, {'filename': 'photo.jpg', 'size': len(payload), 'media_type': 'image'})
+        self.assertEqual(response.status_code, 201, response.content)
+        url = f"{base}{response.json()['data']['upload_id']}/"
+
+        half = len(payload) // 2
+        for offset, chunk in ((0, payload[:half]), (half, payload[half:])):
+            response = await self.async_client.put(
+                url, chunk, content_type='application/offset+octet-stream', headers={'Upload-Offset': str(offset)},
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response['Upload-Offset'], str(len(payload)))
+
+        # A stale offset is refused with the stored one
+        response = await self.async_client.put(
+            url, b'x', content_type='application/offset+octet-stream', headers={'Upload-Offset': '0'},
+        )
+        self.assertEqual(response.status_code, 409)
+
+        response = await self.async_client.post(f'{url}complete/', {'checksum': hashlib.sha256(payload).hexdigest()})
+        self.assertEqual(response.status_code, 201, response.content)
+        media = await Media.objects.select_related('blob').aget(blob__checksum=response.json()['checksum'])
+        self.assertEqual(media.blob.size, len(payload))
+        self.assertEqual((media.size, media.checksum), (len(payload), media.blob.checksum))
+
+
+
+@override_settings(CHUNKED_UPLOAD_DIR=CHUNKED_UPLOAD_DIR)
+class OrphanFileCollectionTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings = self.settings(MEDIA_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        user = CustomUser.objects.create_user('owner', 'owner@example.com', 'Passw0rd!')
+        album = Album.objects.create(owner=user, title='Trip')
+        upload = SimpleUploadedFile('photo.jpg', b'\xff\xd8photo\xff\xd9', content_type='image/jpeg')
+        APIClient().post(f'/sharelink/{album.sharelink}/', {'file': upload, 'media_type': 'image'})
+        blob = Blob.objects.get()
+        thumbnail = derivative_name(blob.file.name, 'thumbnail', 'JPEG')
+        Blob.objects.filter(pk=blob.pk).update(derivatives={'source': blob.file.name, 'thumbnail': thumbnail})
+        cover = derivative_name('cover_images/cover.png', 'medium', 'JPEG')
+        Album.objects.filter(pk=album.pk).update(cover_image='cover_images/cover.png', cover_derivatives={
+            'source': 'cover_images/cover.png', 'medium': cover,
+        })
+
+        self.kept = [blob.file.name, thumbnail, 'cover_images/cover.png', cover]
+        self.orphans = [
+            'cas/00/00/0000.jpg', 'cover_images/old.png', 'media/image/Trip/image.jpg',
+            derivative_name('cas/ab/cd/abcd.jpg', 'thumbnail', 'JPEG'),
+            derivative_name('cover_images/gone.png', 'medium', 'JPEG'),
+        ]
+        for name in self.kept[1:] + self.orphans + ['cover_images/fresh.png']:
+            self.write(name)
+        # Everything but the fresh file is past the grace period
+        old = time.time() - 7 * 24 * 3600
+        for name in self.kept + self.orphans:
+            os.utime(os.path.join(self.root, name), (old, old))
+
+    def write(self, name):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'data')
+
+    def existing(self, names):
+        return [name for name in names if os.path.exists(os.path.join(self.root, name))]
+
+    def test_reclaims_only_unreferenced_old_files(self):
+        out = io.StringIO()
+        call_command('collect_orphan_files', '--dry-run', stdout=out)
+        self.assertIn('Scanned 9 files, 5 orphaned, 20 bytes would be reclaimed', out.getvalue())
+        self.assertEqual(self.existing(self.orphans), self.orphans)
+
+        out = io.StringIO()
+        call_command('collect_orphan_files', '--batch-size', '2', stdout=out)
+        self.assertEqual(sorted(out.getvalue().splitlines()[:-1]), sorted(self.orphans))
+        self.assertEqual(self.existing(self.orphans), [])
+        self.assertEqual(self.existing(self.kept + ['cover_images/fresh.png']), self.kept + ['cover_images/fresh.png'])
+
+        out = io.StringIO()
+        call_command('collect_orphan_files', '--min-age', '0', stdout=out)
+        self.assertIn('Scanned 5 files, 1 orphaned', out.getvalue())
+
+    def test_reused_file_survives_collection(self):
+        content = b'\xff\xd8again\xff\xd9'
+        name = content_address(hashlib.sha256(content).hexdigest(), 'again.jpg')
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(content)
+        old = time.time() - 7 * 24 * 3600
+        os.utime(path, (old, old))
+
+        def referenced_then_reused(names, real=collect_orphan_files.referenced_names):
+            found = real(names)
+            if name in names and not Blob.objects.filter(file=name).exists():
+                # The same bytes are uploaded again right after the first check
+                Blob.objects.acquire(SimpleUploadedFile('again.jpg', content))
+            return found
+
+        out = io.StringIO()
+        with mock.patch.object(collect_orphan_files, 'referenced_names', side_effect=referenced_then_reused):
+            call_command('collect_orphan_files', stdout=out)
+        self.assertNotIn(name, out.getvalue())
+        self.assertEqual(Blob.objects.get(file=name).file.read(), content)
+        self.assertGreater(os.stat(path).st_mtime, old)
+        self.assertEqual(self.existing(self.orphans), [])
@@ -0,0 +1,236 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import Subquery
+from django.utils import timezone
+from account.models import CustomUser
+from album.models import Album
+from media.models import UploadSession
+
+READ_BLOCK_SIZE = 64 * 1024
+QUOTA_MESSAGE = 'Storage quota exceeded'
+MAX_CACHED_HASHERS = 256
+
+# Running SHA-256 state per upload session so each chunk is hashed once as it
+# streams in. hashlib objects cannot be persisted, so a session that lands on a
+# different worker (or outlives the cache) rebuilds its state from the part file.
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+def reserve_quota(album, size):
+    """
+    Hold ``size`` bytes of the album owner's storage quota for an upload. False
+    if they would take the owner over it. Every successful call must be paired
+    with release_quota() once the upload is stored or given up; for upload
+    sessions, deleting the session does that.
+    """
+    return CustomUser.objects.reserve_storage(album.owner_id, size)
+
+
+def release_quota(album_id, size):
+    owner = Album.objects.filter(pk=album_id).values('owner_id')
+    CustomUser.objects.release_storage(Subquery(owner), size)
+
+
+class PartialUploadFile(UploadedFile):
+    """
+    Wraps a finished part file so FileSystemStorage moves it into place
+    instead of copying it byte by byte.
+    """
+
+    def __init__(self, path, name, size, content_type=None):
+        super().__init__(open(path, 'rb'), name, content_type, size)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def _hash_part_file(path, length):
+    hasher = hashlib.sha256()
+    if length and os.path.exists(path):
+        with open(path, 'rb') as fh:
+            remaining = length
+            while remaining:
+                block = fh.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+    return hasher
+
+
+def _get_hasher(session):
+    with _hashers_lock:
+        cached = _hashers.pop(session.pk, None)
+    if cached is not None and cached[0] == session.offset:
+        return cached[1]
+    return _hash_part_file(session.part_path, session.offset)
+
+
+def _store_hasher(session, hasher):
+    with _hashers_lock:
+        _hashers[session.pk] = (session.offset, hasher)
+        while len(_hashers) > MAX_CACHED_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def append_chunk(session, stream, length):
+    """
+    Stream ``length`` bytes from ``stream`` onto the session's part file,
+    hashing as it goes. Returns the number of bytes actually written; a client
+    that disconnects mid-chunk keeps what was received and resumes from there.
+
+    No transaction is held while the body is copied. Instead the part file
+    is locked for the whole write and its offset re-read under the lock, so a
+    competing chunk for the same session loses cleanly and None is returned
+    to it, without touching the file.
+    """
+    fh = _lock_part_file(session)
+    if fh is None:
+        return None
+    with fh:
+        if _stored_offset(session).first() != session.offset:
+            return None
+        written, hasher = _write_chunk(fh, session, stream, length)
+        moved = type(session).objects.filter(pk=session.pk, offset=session.offset).update(
+            offset=session.offset + written, updated_at=timezone.now(),
+        )
+        return _chunk_recorded(session, moved, written, hasher)
+
+
+async def aappend_chunk(session, stream, length):
+    """append_chunk() for async views; the file work runs in a worker thread."""
+    fh = await asyncio.to_thread(_lock_part_file, session)
+    if fh is None:
+        return None
+    with fh:
+        if await _stored_offset(session).afirst() != session.offset:
+            return None
+        written, hasher = await asyncio.to_thread(_write_chunk, fh, session, stream, length)
+        moved = await type(session).objects.filter(pk=session.pk, offset=session.offset).aupdate(
+            offset=session.offset + written, updated_at=timezone.now(),
+        )
+        return _chunk_recorded(session, moved, written, hasher)
+
+
+def _lock_part_file(session):
+    """
+    Open the session's part file for appending, holding an exclusive lock
+    that is released when it is closed. None if another chunk holds it.
+    """
+    os.makedirs(os.path.dirname(session.part_path), exist_ok=True)
+    fh = open(session.part_path, 'ab')
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        fh.close()
+        return None
+    return fh
+
+
+def _stored_offset(session):
+    return type(session).objects.filter(pk=session.pk).values_list('offset', flat=True)
+
+
+def _chunk_recorded(session, moved, written, hasher):
+    if not moved:
+        return None
+    session.offset += written
+    _store_hasher(session, hasher)
+    return written
+
+
+def _write_chunk(fh, session, stream, length):
+    hasher = _get_hasher(session)
+    written = 0
+    # Drop any tail left behind by a write that never got recorded
+    fh.truncate(session.offset)
+    while stream is not None and written < length:
+        block = stream.read(min(READ_BLOCK_SIZE, length - written))
+        if not block:
+            break
+        fh.write(block)
+        hasher.update(block)
+        written += len(block)
+    fh.flush()
+    return written, hasher
+
+
+def finish_upload(session):
+    """Return the SHA-256 hex digest and a storage-ready file for a complete session."""
+    digest = _get_hasher(session).hexdigest()
+    upload = PartialUploadFile(session.part_path, session.filename, session.size)
+    return digest, upload
+
+
+def discard_upload(session):
+    with _hashers_lock:
+        _hashers.pop(session.pk, None)
+    try:
+        os.remove(session.part_path)
+    except FileNotFoundError:
+        pass
+
+
+def expire_uploads(max_age, chunk_size=500):
+    """
+    Delete upload sessions that have not received a chunk for ``max_age``
+    seconds, with their part files, ``chunk_size`` at a time. Part files left
+    without a session are swept too. Returns the number of sessions removed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    expired = 0
+    while True:
+        batch = list(UploadSession.objects.filter(updated_at__lt=cutoff).order_by('updated_at')[:chunk_size])
+        if not batch:
+            break
+        ids = [session.pk for session in batch]
+        # Rows first: a session that took a chunk meanwhile keeps its part file
+        expired += UploadSession.objects.filter(pk__in=ids, updated_at__lt=cutoff).delete()[0]
+        resumed = set(UploadSession.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        for session in batch:
+            if session.pk not in resumed:
+                discard_upload(session)
+        if len(batch) < chunk_size:
+            break
+
+    try:
+        entries = os.scandir(settings.CHUNKED_UPLOAD_DIR)
+    except FileNotFoundError:
+        return expired
+    stale = time.time() - max_age
+    with entries:
+        orphans = {}
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext == '.part' and entry.is_file() and entry.stat().st_mtime < stale:
+                try:
+                    orphans[uuid.UUID(stem)] = entry.path
+                except ValueError:
+                    continue
+            if len(orphans) >= chunk_size:
+                _remove_orphan_parts(orphans)
+                orphans = {}
+        _remove_orphan_parts(orphans)
+    return expired
+
+
+def _remove_orphan_parts(orphans):
+    live = set(UploadSession.objects.filter(pk__in=list(orphans)).values_list('pk', flat=True))
+    for pk, path in orphans.items():
+        if pk not in live:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
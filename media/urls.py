@@ -1,8 +1,19 @@
 from django.urls import path
-from media import views
+from media import async_views, views
 
 
 
 urlpatterns = [
+    path('moderation/', views.ModerationView.as_view(), name='moderation'),
     path('sharelink/<uuid:sharelink>/', views.MediaView.as_view(), name='sharelink'),
+    path('sharelink/<uuid:sharelink>/files/<int:pk>/', views.MediaFileView.as_view(), name='sharelink-file'),
+    path('sharelink/<uuid:sharelink>/batch/', views.MediaBatchView.as_view(), name='sharelink-batch'),
+    path('sharelink/<uuid:sharelink>/tags/', views.MediaTagsView.as_view(), name='sharelink-tags'),
+    path('sharelink/<uuid:sharelink>/uploads/', views.UploadSessionView.as_view(), name='upload-start'),
+    path('sharelink/<uuid:sharelink>/uploads/<uuid:upload_id>/', views.UploadChunkView.as_view(), name='upload-chunk'),
+    path('sharelink/<uuid:sharelink>/uploads/<uuid:upload_id>/complete/', views.UploadCompleteView.as_view(), name='upload-complete'),
+    path('async/sharelink/<uuid:sharelink>/', async_views.AsyncMediaView.as_view(), name='async-sharelink'),
+    path('async/sharelink/<uuid:sharelink>/uploads/', async_views.AsyncUploadSessionView.as_view(), name='async-upload-start'),
+    path('async/sharelink/<uuid:sharelink>/uploads/<uuid:upload_id>/', async_views.AsyncUploadChunkView.as_view(), name='async-upload-chunk'),
+    path('async/sharelink/<uuid:sharelink>/uploads/<uuid:upload_id>/complete/', async_views.AsyncUploadCompleteView.as_view(), name='async-upload-complete'),
 ]
\ No newline at end of file
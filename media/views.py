@@ -1,13 +1,31 @@
+from collections import Counter, defaultdict
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from account.authentication import CachedJWTAuthentication
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Subquery
 from django.shortcuts import get_object_or_404
-from .models import Album, Media
-from .serializers import MediaSerializer
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from album.cache import resolve_sharelink
+from .cache import LISTING_TIMEOUT, invalidate_media_listing, listing_cache_key, media_listing_version
+from .manager import parse_tags
+from .models import Album, Blob, Media, MediaTag, UploadSession
+from .pagination import MediaKeysetPagination
+from .serializers import (
+    MediaSerializer, ModerationActionSerializer, ModerationMediaSerializer, UploadSessionSerializer,
+)
+from .serving import FILE_MAX_AGE, serve_file
+from .metadata import file_metadata
+from .uploads import QUOTA_MESSAGE, append_chunk, discard_upload, finish_upload, release_quota, reserve_quota
 
 class MediaView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
+    pagination_class = MediaKeysetPagination
 
     def get_permissions(self):
         if self.request.method == 'GET':
@@ -20,36 +38,466 @@ class MediaView(APIView):
         try:
             sharelink_uuid = kwargs.get('sharelink')
             if sharelink_uuid:
-                albums = get_object_or_404(Album, sharelink=sharelink_uuid)
-                all_media = Media.objects.filter(album=albums)
+                albums = resolve_sharelink(sharelink_uuid)
+                if albums is None:
+                    return Response({'message': 'Album not found'}, status=404)
+
+                # Unchanged polls are answered from the album version alone
+                etag, last_modified = media_listing_version(albums)
+                etag = quote_etag(etag)
+                not_modified = get_conditional_response(
+                    request, etag=etag, last_modified=int(last_modified.timestamp())
+                )
+                if not_modified is not None:
+                    return self.with_validators(not_modified, etag, last_modified)
+
+                cache_key = listing_cache_key(albums, etag, request)
+                payload = cache.get(cache_key)
+                if payload is None:
+                    all_media = Media.objects.filter(album=albums).select_related('album', 'blob')
+                    tags = parse_tags(request.query_params.get('tag'))
+                    if tags:
+                        # Resolved through the tag index instead of scanning the tags text;
+                        # several tags must all be present
+                        all_media = all_media.filter(id__in=MediaTag.objects.tagged(albums.pk, tags))
+
+                    # Page through the album with a keyset cursor rather than returning every row
+                    paginator = self.pagination_class()
+                    page = paginator.paginate_queryset(all_media, request, view=self)
+
+                    # Create the serializer directly with the page
+                    serializer = MediaSerializer(page, many=True, context={'request': request})
 
-                # Create the serializer directly with the queryset
-                serializer = MediaSerializer(all_media, many=True, context={'request': request})
+                    # The serializer is automatically valid because it just serializes the data
+                    payload = {
+                        'data': serializer.data,
+                        'next': paginator.get_next_link(),
+                        'message': 'Media content retrieved successfully'
+                    }
+                    cache.set(cache_key, payload, LISTING_TIMEOUT)
 
-                # The serializer is automatically valid because it just serializes the data
-                return Response({
-                    'data': serializer.data,
-                    'message': 'Media content retrieved successfully'
-                }, status=200)
+                return self.with_validators(Response(payload, status=200), etag, last_modified)
 
         except Album.DoesNotExist:
             return Response({'message': 'Album not found'}, status=404)
 
+    def with_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Clients may keep the listing but must revalidate it on every poll
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
     def post(self, request, *args, **kwargs):
         try:
             data = request.data
             sharelink_uuid = kwargs.get('sharelink')
-            albums = get_object_or_404(Album, sharelink=sharelink_uuid)
+            albums = resolve_sharelink(sharelink_uuid)
+            if albums is None:
+                return Response({'message': 'Album not found'}, status=404)
+            upload = request.FILES.get('file')
+            size = upload.size if upload is not None else 0
+            if not reserve_quota(albums, size):
+                return Response({'message': QUOTA_MESSAGE}, status=413)
 
             serializer = MediaSerializer(data=data, context={'request': request, 'view': self})
 
+            try:
+                if serializer.is_valid():
+                    serializer.save(album=albums)
+                    return Response({
+                        'data': serializer.data,
+                        'message': 'Media content added successfully'
+                    }, status=201)
+                else:
+                    return Response(serializer.errors, status=400)
+            finally:
+                # Stored bytes now count as used, so the hold is no longer needed
+                release_quota(albums.pk, size)
+        except Album.DoesNotExist:
+            return Response({'message': 'Album not found'}, status=404)
+
+
+class MediaBatchView(APIView):
+    """
+    Uploads many files to a sharelink in one request. Every file is validated
+    on its own and all valid ones are inserted together; the response reports
+    the outcome per file, so one bad file does not sink the rest.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [AllowAny]
+    max_files = 100
+
+    def post(self, request, *args, **kwargs):
+        album = resolve_sharelink(kwargs.get('sharelink'))
+        if album is None:
+            return Response({'message': 'Album not found'}, status=404)
+
+        files = request.FILES.getlist('files')
+        if not files:
+            return Response({'message': 'No files were sent'}, status=400)
+        if len(files) > self.max_files:
+            return Response({'message': f'At most {self.max_files} files per request'}, status=400)
+        size = sum(upload.size for upload in files)
+        if not reserve_quota(album, size):
+            return Response({'message': QUOTA_MESSAGE}, status=413)
+        try:
+            return self.create_media(request, album, files)
+        finally:
+            release_quota(album.pk, size)
+
+    def create_media(self, request, album, files):
+
+        results = [None] * len(files)
+        pending = []
+        context = {'request': request, 'view': self}
+        for index, upload in enumerate(files):
+            data = {
+                'file': upload,
+                'media_type': request.data.get('media_type') or self.guess_media_type(upload),
+                'description': request.data.get('description', ''),
+                'tags': request.data.get('tags', ''),
+            }
+            serializer = MediaSerializer(data=data, context=context)
             if serializer.is_valid():
-                serializer.save(album=albums)
-                return Response({
-                    'data': serializer.data,
-                    'message': 'Media content added successfully'
-                }, status=201)
+                pending.append((index, serializer.validated_data))
             else:
-                return Response(serializer.errors, status=400)
-        except Album.DoesNotExist:
+                results[index] = {'file': upload.name, 'status': 'error', 'errors': serializer.errors}
+
+        created = []
+        with transaction.atomic():
+            uploads = [validated.pop('file') for _, validated in pending]
+            metadata = [file_metadata(upload) for upload in uploads]
+            blobs = Blob.objects.acquire_many(uploads)
+            for (index, validated), upload, blob, meta in zip(pending, uploads, blobs, metadata):
+                if isinstance(blob, Exception):
+                    results[index] = {'file': upload.name, 'status': 'error', 'errors': [str(blob)]}
+                    continue
+                media = Media(blob=blob, file=blob.file.name, checksum=blob.checksum, **meta, **validated)
+                created.append((index, upload.name, media))
+            items = Media.objects.bulk_create([media for _, _, media in created])
+            MediaTag.objects.sync(items, created=True)
+            if items:
+                # bulk_create sends no post_save, so count the new items here
+                Album.objects.media_added(
+                    album.pk, count=len(items),
+                    pending=sum(media.approval_status == 'pending' for media in items),
+                    size=sum(media.size for media in items),
+                    latest_id=max(media.pk for media in items),
+                )
+
+        if created:
+            # ...and drop the cached listings
+            invalidate_media_listing(album.pk)
+
+        serialized = MediaSerializer([media for _, _, media in created], many=True, context=context).data
+        for (index, name, _), item in zip(created, serialized):
+            results[index] = {'file': name, 'status': 'created', 'data': item}
+
+        if not created:
+            status, message = 400, 'No media content was added'
+        elif len(created) < len(files):
+            status, message = 207, 'Some media content could not be added'
+        else:
+            status, message = 201, 'Media content added successfully'
+        return Response({'data': results, 'message': message}, status=status)
+
+    @staticmethod
+    def guess_media_type(upload):
+        content_type = getattr(upload, 'content_type', '') or ''
+        return 'video' if content_type.startswith('video/') else 'image'
+
+
+class MediaTagsView(APIView):
+    """
+    Tag facet counts for an album, most used first. Counted from the
+    (album, tag, media) index, so the media rows are never read.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    max_tags = 500
+
+    def get(self, request, *args, **kwargs):
+        album = resolve_sharelink(kwargs.get('sharelink'))
+        if album is None:
             return Response({'message': 'Album not found'}, status=404)
+
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', self.max_tags)), self.max_tags))
+        except ValueError:
+            limit = self.max_tags
+        facets = (
+            MediaTag.objects.filter(album_id=album.pk)
+            .values('tag__name')
+            .annotate(count=Count('media'))
+            .order_by('-count', 'tag__name')[:limit]
+        )
+        return Response({
+            'data': [{'tag': facet['tag__name'], 'count': facet['count']} for facet in facets],
+            'message': 'Tags retrieved successfully'
+        }, status=200)
+
+
+class ModerationView(APIView):
+    """
+    Moderation queue for album owners. GET lists pending media across all of
+    the caller's albums (or one, with ``?album=``), newest first, keyset
+    paginated over the pending-only index. POST approves or rejects media in
+    bulk; each row moves only if it still has the status it was read with, so
+    overlapping moderators never count the same item twice.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    pagination_class = MediaKeysetPagination
+    # Ids per UPDATE when a whole album is moderated, within SQLite's parameter limit
+    update_batch_size = ModerationActionSerializer.MAX_IDS
+
+    def owned_media(self, request):
+        return Media.objects.filter(album__owner=request.user, album__deleted_at__isnull=True)
+
+    def read_targets(self, targets):
+        """``(id, album_id, approval_status)`` of each media item to moderate."""
+        return list(targets.order_by().values_list('id', 'album_id', 'approval_status'))
+
+    def pending_queue(self, user, album_id=None):
+        """The caller's pending media, in one album or across all of them."""
+        pending = Media.objects.filter(approval_status='pending').select_related('album', 'blob')
+        if album_id is not None:
+            return pending.filter(album_id=album_id, album__owner=user, album__deleted_at__isnull=True)
+        # Across albums, "+ 0" keeps SQLite from fetching the rows album by album
+        # through media_pending_idx and sorting all of them for every page;
+        # media_pending_queue_idx hands them over already in page order
+        owned = Album.objects.live().filter(owner=user).values('pk')
+        return pending.alias(queue_album=F('album_id') + 0).filter(queue_album__in=Subquery(owned))
+
+    def get(self, request, *args, **kwargs):
+        album_id = request.query_params.get('album')
+        if album_id and not album_id.isdigit():
+            return Response({'message': 'album must be an album id'}, status=400)
+        pending = self.pending_queue(request.user, album_id or None)
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(pending, request, view=self)
+        serializer = ModerationMediaSerializer(page, many=True, context={'request': request})
+        return Response({
+            'data': serializer.data,
+            'next': paginator.get_next_link(),
+            'message': 'Pending media retrieved successfully'
+        }, status=200)
+
+    def post(self, request, *args, **kwargs):
+        serializer = ModerationActionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        action = serializer.validated_data
+
+        targets = self.owned_media(request).exclude(approval_status=action['status'])
+        if action.get('ids'):
+            targets = targets.filter(pk__in=action['ids'])
+        else:
+            # A whole album at once: everything still waiting in it
+            targets = targets.filter(album_id=action['album'], approval_status='pending')
+
+        # Group the targets by album and the status they were read with
+        groups = defaultdict(list)
+        for pk, album_id, status in self.read_targets(targets):
+            groups[album_id, status].append(pk)
+
+        leaving = Counter()
+        updated = 0
+        with transaction.atomic():
+            for (album_id, status), ids in groups.items():
+                for start in range(0, len(ids), self.update_batch_size):
+                    # Compare-and-set: rows another moderator moved since the read
+                    # no longer match and are left to that moderator's count
+                    moved = Media.objects.filter(
+                        pk__in=ids[start:start + self.update_batch_size], approval_status=status,
+                    ).update(approval_status=action['status'], updated_at=timezone.now())
+                    updated += moved
+                    if status == 'pending':
+                        leaving[album_id] += moved
+            # update() sends no post_save, so settle the counters and cached listings here
+            Album.objects.pending_changed({album_id: -pending for album_id, pending in leaving.items()})
+
+        albums = {album_id for album_id, _ in groups}
+
+        for album_id in albums:
+            invalidate_media_listing(album_id)
+        return Response({
+            'data': {'updated': updated},
+            'message': f"{updated} media items {action['status']}"
+        }, status=200)
+
+
+class MediaFileView(APIView):
+    """
+    Serves a media file, or one of its derivatives with ``?variant=``, to
+    whoever may see the album: anyone holding the sharelink of a public album,
+    only the owner for a private one. Media awaiting or refused approval is
+    served to the owner alone. Supports Range and conditional requests, and
+    hands the transfer to the proxy when MEDIA_SENDFILE_HEADER is configured.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        album = resolve_sharelink(kwargs.get('sharelink'))
+        if album is None:
+            return Response({'message': 'Album not found'}, status=404)
+        is_public = album.privacy_settings == 'public'
+        is_owner = request.user.is_authenticated and request.user.pk == album.owner_id
+        if not is_public and not is_owner:
+            if not request.user.is_authenticated:
+                return Response({'message': 'Authentication required'}, status=401)
+            return Response({'message': 'You do not have access to this album'}, status=403)
+
+        media = Media.objects.filter(pk=kwargs.get('pk'), album_id=album.pk).select_related('blob').first()
+        if media is None or not media.file or (media.approval_status != 'approved' and not is_owner):
+            return Response({'message': 'Media not found'}, status=404)
+
+        name = media.file.name
+        variant = request.query_params.get('variant')
+        if variant:
+            name = media.blob.derivatives.get(variant) if media.blob else None
+            if not name or variant == 'source':
+                return Response({'message': 'Variant not available'}, status=404)
+
+        # Content-addressed files never change, so their checksum is a strong
+        # validator. Access to them can, when the album goes private or the
+        # item is rejected, so caches must come back and revalidate soon.
+        etag = quote_etag(f'{media.blob.checksum}-{variant or "original"}') if media.blob else None
+        scope = 'public' if is_public and media.approval_status == 'approved' else 'private'
+        cache_control = f'{scope}, max-age={FILE_MAX_AGE}, must-revalidate'
+        try:
+            return serve_file(request, media.file.storage, name, etag, cache_control)
+        except FileNotFoundError:
+            return Response({'message': 'Media file is missing'}, status=404)
+
+
+class UploadSessionView(APIView):
+    """
+    Starts a resumable upload. The client declares the file size up front so an
+    oversized file is rejected before any of it is transferred.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        album = resolve_sharelink(kwargs.get('sharelink'))
+        if album is None:
+            return Response({'message': 'Album not found'}, status=404)
+        serializer = UploadSessionSerializer(data=request.data)
+
+        if serializer.is_valid():
+            # The declared size is enforced by the chunk view, so holding it
+            # until the session is deleted covers the whole upload
+            if not reserve_quota(album, serializer.validated_data['size']):
+                return Response({'message': QUOTA_MESSAGE}, status=413)
+            serializer.save(album=album)
+            return Response({
+                'data': serializer.data,
+                'message': 'Upload started'
+            }, status=201)
+        return Response(serializer.errors, status=400)
+
+
+class UploadChunkView(APIView):
+    """
+    Appends raw request bodies to an upload. Each PUT carries an
+    ``Upload-Offset`` header that must match the bytes already stored; after a
+    reconnect the client asks with GET where to resume from.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [AllowAny]
+
+    def get_session(self, **kwargs):
+        return get_object_or_404(
+            UploadSession, pk=kwargs.get('upload_id'), album__sharelink=kwargs.get('sharelink'),
+            album__deleted_at__isnull=True,
+        )
+
+    def get(self, request, *args, **kwargs):
+        session = self.get_session(**kwargs)
+        return Response({
+            'data': UploadSessionSerializer(session).data,
+            'message': 'Upload in progress'
+        }, status=200, headers={'Upload-Offset': str(session.offset)})
+
+    def put(self, request, *args, **kwargs):
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return Response({'message': 'Content-Length and Upload-Offset headers are required'}, status=400)
+
+        session = self.get_session(**kwargs)
+        if offset == session.offset and session.offset + length > session.size:
+            return Response({'message': 'Chunk exceeds the declared file size'}, status=413)
+        if offset != session.offset or append_chunk(session, request.stream, length) is None:
+            current = UploadSession.objects.filter(pk=session.pk).values_list('offset', flat=True).first()
+            return Response({
+                'data': {'offset': current},
+                'message': 'Upload-Offset does not match the stored offset'
+            }, status=409, headers={'Upload-Offset': str(current)})
+
+        return Response({
+            'data': UploadSessionSerializer(session).data,
+            'message': 'Chunk stored'
+        }, status=200, headers={'Upload-Offset': str(session.offset)})
+
+    def delete(self, request, *args, **kwargs):
+        session = self.get_session(**kwargs)
+        discard_upload(session)
+        session.delete()
+        return Response({'message': 'Upload cancelled'}, status=204)
+
+
+class UploadCompleteView(APIView):
+    """
+    Turns a fully received upload into a Media item. An optional ``checksum``
+    (SHA-256 hex) is compared against the digest computed while streaming.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        session = get_object_or_404(
+            UploadSession, pk=kwargs.get('upload_id'), album__sharelink=kwargs.get('sharelink'),
+            album__deleted_at__isnull=True,
+        )
+        if not session.is_complete:
+            return Response({
+                'data': {'offset': session.offset, 'size': session.size},
+                'message': 'Upload is incomplete'
+            }, status=409)
+
+        checksum, upload = finish_upload(session)
+        expected = request.data.get('checksum')
+        if expected and expected.lower() != checksum:
+            upload.close()
+            return Response({'message': 'Checksum mismatch'}, status=400)
+
+        data = {
+            'file': upload,
+            'media_type': session.media_type,
+            'description': session.description,
+            'tags': session.tags,
+        }
+        serializer = MediaSerializer(data=data, context={'request': request, 'view': self})
+        try:
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=400)
+            # The digest is already known from streaming, so skip re-hashing
+            metadata = file_metadata(upload)
+            blob = Blob.objects.acquire(upload, checksum=checksum)
+            serializer.save(blob=blob, file=blob.file.name, **metadata)
+        finally:
+            upload.close()
+
+        discard_upload(session)
+        session.delete()
+        return Response({
+            'data': serializer.data,
+            'checksum': checksum,
+            'message': 'Media content added successfully'
+        }, status=201)
@@ -0,0 +1,92 @@
+from django.db import migrations
+
+# Albums and media share one FTS5 table. Row ids are derived from the source
+# row (album id * 2, media id * 2 + 1) so the triggers can replace an entry by
+# rowid, which FTS5 looks up directly. The triggers see every write, including
+# bulk_create and queryset update() that send no signals.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE search_index USING fts5(
+        title, body, tags,
+        kind UNINDEXED, object_id UNINDEXED, album_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER search_album_insert AFTER INSERT ON album_album BEGIN
+        INSERT INTO search_index (rowid, title, body, tags, kind, object_id, album_id)
+        VALUES (new.id * 2, new.title, new.description, '', 'album', new.id, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER search_album_update AFTER UPDATE OF title, description ON album_album BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2;
+        INSERT INTO search_index (rowid, title, body, tags, kind, object_id, album_id)
+        VALUES (new.id * 2, new.title, new.description, '', 'album', new.id, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER search_album_delete AFTER DELETE ON album_album BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER search_media_insert AFTER INSERT ON media_media BEGIN
+        INSERT INTO search_index (rowid, title, body, tags, kind, object_id, album_id)
+        VALUES (new.id * 2 + 1, '', new.description, new.tags, 'media', new.id, new.album_id);
+    END
+    """,
+    """
+    CREATE TRIGGER search_media_update AFTER UPDATE OF description, tags, album_id ON media_media BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+        INSERT INTO search_index (rowid, title, body, tags, kind, object_id, album_id)
+        VALUES (new.id * 2 + 1, '', new.description, new.tags, 'media', new.id, new.album_id);
+    END
+    """,
+    """
+    CREATE TRIGGER search_media_delete AFTER DELETE ON media_media BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+    """
+    INSERT INTO search_index (rowid, title, body, tags, kind, object_id, album_id)
+    SELECT id * 2, title, description, '', 'album', id, id FROM album_album
+    """,
+    """
+    INSERT INTO search_index (rowid, title, body, tags, kind, object_id, album_id)
+    SELECT id * 2 + 1, '', description, tags, 'media', id, album_id FROM media_media
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS search_album_insert',
+    'DROP TRIGGER IF EXISTS search_album_update',
+    'DROP TRIGGER IF EXISTS search_album_delete',
+    'DROP TRIGGER IF EXISTS search_media_insert',
+    'DROP TRIGGER IF EXISTS search_media_update',
+    'DROP TRIGGER IF EXISTS search_media_delete',
+    'DROP TABLE IF EXISTS search_index',
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        # FTS5 is SQLite only; other backends simply get no search index
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('album', '0002_album_cover_derivatives'),
+        ('media', '0007_tag_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
@@ -0,0 +1,44 @@
+import re
+
+from django.db import connections, router
+from album.models import Album
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# bm25 column weights for (title, body, tags); the unindexed columns get 0
+RANK_WEIGHTS = '10.0, 1.0, 5.0, 0.0, 0.0, 0.0'
+
+SEARCH_SQL = f"""
+    SELECT search_index.kind, search_index.object_id, bm25(search_index, {RANK_WEIGHTS}) AS rank,
+           snippet(search_index, -1, '[', ']', '...', 12)
+    FROM search_index
+    JOIN album_album ON album_album.id = search_index.album_id
+    WHERE search_index MATCH %s
+      AND album_album.deleted_at IS NULL
+      AND (album_album.owner_id = %s OR album_album.privacy_settings = 'public')
+    ORDER BY rank
+    LIMIT %s OFFSET %s
+"""
+
+
+def match_expression(text):
+    """
+    Turn free text into an FTS5 query: every word must match, each as a
+    prefix. Words are quoted, so operators and stray punctuation in the input
+    can never make the query invalid.
+    """
+    words = WORD_RE.findall(text or '')
+    return ' '.join(f'"{word}"*' for word in words[:16])
+
+
+def search(user, text, limit, offset=0):
+    """
+    Return up to ``limit`` (kind, object_id, rank, snippet) rows, best first,
+    among the albums ``user`` owns and all public albums, and their media.
+    """
+    expression = match_expression(text)
+    if not expression:
+        return []
+    with connections[router.db_for_read(Album)].cursor() as cursor:
+        cursor.execute(SEARCH_SQL, [expression, user.pk, limit, offset])
+        return cursor.fetchall()
@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from account.models import CustomUser
+from album.models import Album
+from media.models import Media
+
+# Create your tests here.
+
+
+class SearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = CustomUser.objects.create_user('alice', 'alice@example.com', 'Passw0rd!')
+        cls.bob = CustomUser.objects.create_user('bob', 'bob@example.com', 'Passw0rd!')
+        cls.own = Album.objects.create(owner=cls.alice, title='Beach party', description='Summer with friends')
+        cls.hidden = Album.objects.create(owner=cls.bob, title='Beach secrets')
+        cls.public = Album.objects.create(
+            owner=cls.bob, title='Mountains', description='A beach on the way', privacy_settings='public',
+        )
+        Media.objects.bulk_create([
+            Media(album=cls.own, file=f'media/image/Beach party/{i}.jpg', media_type='image',
+                  description=f'Photo {i}', tags='sunset, beach')
+            for i in range(30)
+        ])
+        Media.objects.create(album=cls.hidden, file='media/image/Beach secrets/1.jpg', media_type='image',
+                             tags='sunset')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.alice).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def search(self, **params):
+        response = self.client.get('/search/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response
+
+    def test_results_are_ranked_and_limited_to_visible_albums(self):
+        response = self.search(q='beach', limit=100)
+        albums = [item['data']['title'] for item in response.data['data'] if item['type'] == 'album']
+        # A title match outranks a description match; bob's private album never shows
+        self.assertEqual(albums, ['Beach party', 'Mountains'])
+        # Another user's quota usage is not shown with their public album
+        self.assertFalse(any('storage' in item['data'] for item in response.data['data'] if item['type'] == 'album'))
+        media = [item for item in response.data['data'] if item['type'] == 'media']
+        self.assertEqual(len(media), 30)
+
+        response = self.search(q='sunset', limit=100)
+        self.assertEqual({item['data']['sharelink'] for item in response.data['data']}, {self.own.sharelink})
+
+    def test_prefix_and_pagination(self):
+        response = self.search(q='sun', limit=20)
+        self.assertEqual(len(response.data['data']), 20)
+        self.assertIsNotNone(response.data['next'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['data']), 10)
+        self.assertIsNone(response.data['next'])
+
+    def test_index_follows_writes(self):
+        Album.objects.filter(pk=self.own.pk).update(title='Lake weekend')
+        self.assertEqual(self.search(q='lake').data['data'][0]['data']['id'], self.own.pk)
+
+        Media.objects.filter(album=self.own).delete()
+        self.assertEqual(self.search(q='sunset').data['data'], [])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search(q='"beach" OR NOT (').status_code, 200)
+        self.assertEqual(self.client.get('/search/', {'q': '  '}).status_code, 400)
@@ -0,0 +1,69 @@
+from django.db import connection
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+from account.authentication import CachedJWTAuthentication
+from album.models import Album
+from album.serializers import PublicAlbumSerializer
+from media.models import Media
+from media.serializers import MediaSerializer
+from search.query import search
+
+# Create your views here.
+
+
+class SearchView(APIView):
+    """
+    Ranked full-text search over album titles and descriptions and media
+    descriptions and tags, restricted to the caller's albums and public ones.
+    """
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedJWTAuthentication]
+    page_size = 20
+    max_page_size = 100
+
+    def get(self, request):
+        if connection.vendor != 'sqlite':
+            return Response({'message': 'Search is not available on this database'}, status=501)
+
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'message': 'Enter something to search for'}, status=400)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', self.page_size)), self.max_page_size))
+            offset = max(0, int(request.query_params.get('offset', 0)))
+        except ValueError:
+            return Response({'message': 'limit and offset must be integers'}, status=400)
+
+        # One extra row tells whether there is a next page
+        rows = search(request.user, text, limit + 1, offset)
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+
+        album_ids = [object_id for kind, object_id, _, _ in rows if kind == 'album']
+        media_ids = [object_id for kind, object_id, _, _ in rows if kind == 'media']
+        albums = Album.objects.select_related('owner').in_bulk(album_ids) if album_ids else {}
+        media = Media.objects.select_related('album', 'blob').in_bulk(media_ids) if media_ids else {}
+
+        context = {'request': request}
+        results = []
+        for kind, object_id, rank, snippet in rows:
+            if kind == 'album' and object_id in albums:
+                data = PublicAlbumSerializer(albums[object_id], context=context).data
+            elif kind == 'media' and object_id in media:
+                data = MediaSerializer(media[object_id], context=context).data
+                data['id'] = object_id
+                data['sharelink'] = media[object_id].album.sharelink
+            else:
+                continue
+            results.append({'type': kind, 'rank': rank, 'snippet': snippet, 'data': data})
+
+        next_url = None
+        if has_next:
+            next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
+        return Response({
+            'data': results,
+            'next': next_url,
+            'message': 'Search results retrieved successfully'
+        }, status=200)